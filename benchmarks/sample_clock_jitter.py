@@ -0,0 +1,83 @@
+"""Measure the achieved rate and tick jitter of the rigecu SampleClock.
+
+Runs the clock at one or more sample rates while optional background threads
+burn CPU, and prints a JSON report per rate.
+
+    python benchmarks/sample_clock_jitter.py --rates 20 100 1000 --duration 5 --load-threads 2
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rigecu"))
+
+from sample_clock import SampleClock  # noqa: E402
+
+
+def burn_cpu(stop_event):
+    while not stop_event.is_set():
+        sum(i * i for i in range(1000))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(rate_hz, duration, work_us):
+    clock = SampleClock(1000 / rate_hz, tick_limit=int(duration * rate_hz))
+    start = time.monotonic()
+    lateness_ms = []
+
+    while True:
+        tick = clock.wait_next()
+        if tick is None:
+            break
+        now = time.monotonic()
+        lateness_ms.append((now - start - tick * clock.interval) * 1000)
+        if work_us:
+            busy_until = time.perf_counter() + work_us / 1_000_000
+            while time.perf_counter() < busy_until:
+                pass
+
+    lateness_ms.sort()
+    stats = clock.stats()
+    return {
+        "target_rate_hz": rate_hz,
+        "achieved_rate_hz": round(len(lateness_ms) / duration, 2),
+        "ticks": len(lateness_ms),
+        "missed_ticks": stats["missed_ticks"],
+        "lateness_p50_ms": round(percentile(lateness_ms, 0.50), 4),
+        "lateness_p99_ms": round(percentile(lateness_ms, 0.99), 4),
+        "lateness_max_ms": round(lateness_ms[-1] if lateness_ms else 0.0, 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", type=float, nargs="+", default=[20, 100, 1000], help="sample rates to test, in Hz")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run each rate for")
+    parser.add_argument("--load-threads", type=int, default=0, help="number of CPU-burning background threads")
+    parser.add_argument("--work-us", type=float, default=0.0, help="simulated per-tick work, in microseconds")
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    load = [threading.Thread(target=burn_cpu, args=(stop_event,), daemon=True) for _ in range(args.load_threads)]
+    for thread in load:
+        thread.start()
+
+    try:
+        results = [measure(rate, args.duration, args.work_us) for rate in args.rates]
+    finally:
+        stop_event.set()
+
+    print(json.dumps({"load_threads": args.load_threads, "work_us": args.work_us, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""Load and latency benchmark for labview-sim and rigecu against local stand-ins.
+
+The service under test runs in a subprocess, served by waitress on a free
+port, with TEST_API_URL, ECU_API_URL and data_api_endpoint pointed at stub
+servers in this process (see stubs.py). Requests are driven at a fixed
+concurrency and the report records throughput, latency percentiles,
+sample-clock jitter (from rigecu's /metrics) and the service's CPU time and
+memory. Reports can be saved as JSON baselines and later runs compared
+against them:
+
+    python benchmarks/service_load.py submit --requests 2000 --concurrency 16
+    python benchmarks/service_load.py ecu --runs 50 --rate-hz 100 --duration-ms 5000
+    python benchmarks/service_load.py all --save benchmarks/baselines/local.json
+    python benchmarks/service_load.py all --compare benchmarks/baselines/local.json
+
+With --data-sink the ecu scenario posts to a real datasink service instead of
+the stub, and also reports how fast it stored what rigecu sent.
+
+Process stats are read from /proc, so CPU and memory are only reported on Linux.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stubs import StubServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Serve the app's Flask object with waitress, like main.py does, on the given port
+BOOTSTRAP = """
+import sys
+sys.path.insert(0, sys.argv[1])
+import main
+from waitress import serve
+serve(main.app, host="127.0.0.1", port=int(sys.argv[2]), threads=int(sys.argv[3]), _quiet=True)
+"""
+
+# Metrics compared against a baseline, and whether higher values are better
+TRACKED = {
+    "submit": {
+        "throughput_rps": True,
+        "latency_p50_ms": False,
+        "latency_p99_ms": False,
+        "delivered_per_s": True,
+        "cpu_ms_per_request": False
+    },
+    "ecu": {
+        "start_latency_p99_ms": False,
+        "samples_per_s": True,
+        "missed_ticks": False,
+        "tick_lateness_mean_ms": False,
+        "cpu_ms_per_1k_samples": False
+    }
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ServiceProcess:
+    def __init__(self, app, env, threads):
+        self.app_dir = os.path.join(ROOT, app)
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._workdir = tempfile.TemporaryDirectory(prefix=f"bench-{app}-")
+        self._env = dict(os.environ, LOG_LEVEL="WARNING", **env)
+        self._threads = threads
+        self._process = None
+
+    def start(self, timeout=30):
+        self._process = subprocess.Popen(
+            [sys.executable, "-c", BOOTSTRAP, self.app_dir, str(self.port), str(self._threads)],
+            cwd=self._workdir.name, env=self._env
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"{self.app_dir} exited with code {self._process.returncode}")
+            try:
+                requests.get(f"{self.url}/metrics", timeout=1)
+                return self
+            except requests.exceptions.RequestException:
+                time.sleep(0.1)
+        raise RuntimeError(f"{self.app_dir} did not start within {timeout}s")
+
+    def usage(self):
+        """CPU seconds used and current/peak RSS in MB, or None where /proc is unavailable."""
+        try:
+            with open(f"/proc/{self._process.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self._process.pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            return None
+        ticks = os.sysconf("SC_CLK_TCK")
+        return {
+            "cpu_s": (int(fields[11]) + int(fields[12])) / ticks,
+            "rss_mb": int(status["VmRSS"].split()[0]) / 1024,
+            "peak_rss_mb": int(status["VmHWM"].split()[0]) / 1024
+        }
+
+    def metrics(self):
+        """Parse the service's Prometheus text into {series: value}."""
+        values = {}
+        for line in requests.get(f"{self.url}/metrics", timeout=10).text.splitlines():
+            if line and not line.startswith("#"):
+                series, _, value = line.rpartition(" ")
+                values[series] = float(value)
+        return values
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._workdir.cleanup()
+
+
+def drive(url, make_payload, total, concurrency):
+    """POST `total` requests with `concurrency` in flight; returns latency and status stats."""
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        local_latencies = []
+        local_statuses = {}
+        while True:
+            index = next(counter)
+            if index >= total:
+                break
+            started = time.perf_counter()
+            try:
+                status = session.post(url, json=make_payload(index), timeout=30).status_code
+            except requests.exceptions.RequestException:
+                status = "error"
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50), 2),
+        "latency_p90_ms": round(percentile(latencies, 0.90), 2),
+        "latency_p99_ms": round(percentile(latencies, 0.99), 2),
+        "latency_max_ms": round(latencies[-1] if latencies else 0.0, 2)
+    }
+
+
+def histogram_quantile(metrics, name, fraction, labels=""):
+    """Upper bound of the histogram bucket holding the given quantile."""
+    prefix = f"{name}_bucket{{{labels + ',' if labels else ''}le=\""
+    buckets = sorted(
+        (float(series[len(prefix):-2]), count) for series, count in metrics.items() if series.startswith(prefix)
+    )
+    if not buckets or buckets[-1][1] == 0:
+        return 0.0
+    target = fraction * buckets[-1][1]
+    return next(bound for bound, count in buckets if count >= target)
+
+
+def usage_delta(before, after, units):
+    if before is None or after is None:
+        return {}
+    cpu_s = after["cpu_s"] - before["cpu_s"]
+    return {
+        "cpu_s": round(cpu_s, 3),
+        "rss_mb": round(after["rss_mb"], 1),
+        "peak_rss_mb": round(after["peak_rss_mb"], 1),
+        "cpu_per_unit_ms": round(cpu_s * 1000 / units, 4) if units else 0.0
+    }
+
+
+def bench_submit(args):
+    test_api = StubServer("tests", args.stub_latency_ms).start()
+    ecu_api = StubServer("ecu", args.stub_latency_ms).start()
+    service = ServiceProcess("labview-sim", {"TEST_API_URL": test_api.url, "ECU_API_URL": ecu_api.url},
+                             args.server_threads).start()
+    try:
+        form = {"campaignid": "BENCH", "sampleid": "S1", "environmentid": "E1", "batteryid": "B1", "fanid": "F1",
+                "motorid": "M1", "shroudid": "SH1", "throttle": "50", "operator": "bench", "holdtime": "1000"}
+        before = service.usage()
+        started = time.perf_counter()
+        result = drive(f"{service.url}/api/submit-test", lambda index: form, args.requests, args.concurrency)
+        accepted = sum(count for status, count in result["statuses"].items() if status.startswith("2"))
+        delivered = ecu_api.wait_for(accepted, args.drain_timeout)
+        drained = (ecu_api.last_at or started) - started
+        usage = usage_delta(before, service.usage(), args.requests)
+
+        result.update({
+            "concurrency": args.concurrency,
+            "delivered": ecu_api.requests,
+            "all_delivered": delivered,
+            "delivered_per_s": round(ecu_api.requests / drained, 1) if drained > 0 else 0.0,
+            "cpu_ms_per_request": usage.pop("cpu_per_unit_ms", None)
+        })
+        if usage:
+            usage["cpu_percent"] = round(100 * usage["cpu_s"] / max(drained, result["elapsed_s"]), 1)
+        result["process"] = usage
+        return result
+    finally:
+        service.stop()
+        test_api.stop()
+        ecu_api.stop()
+
+
+def bench_ecu(args):
+    if args.data_sink:
+        data_api = None
+        sink = ServiceProcess("datasink", {}, args.server_threads).start()
+        data_api_url = f"{sink.url}/data"
+    else:
+        data_api = StubServer("data", args.stub_latency_ms).start()
+        sink = None
+        data_api_url = data_api.url
+    service = ServiceProcess("rigecu", {
+        "Quix__Deployment__Network__PublicUrl": "http://127.0.0.1",
+        "data_api_endpoint": data_api_url,
+        "max_concurrent_runs": str(args.runs),
+        "max_queued_runs": str(args.runs)
+    }, args.server_threads).start()
+    try:
+        def make_payload(index):
+            return {"test_id": f"BENCH-{index:04d}", "speeds": [50], "ramp_delay": args.duration_ms,
+                    "sample_rate_hz": args.rate_hz, "seed": index}
+
+        before = service.usage()
+        sink_before = sink.usage() if sink is not None else None
+        started = time.perf_counter()
+        result = drive(f"{service.url}/ecu/start", make_payload, args.runs, args.concurrency)
+
+        # Wait for every run to finish generating
+        deadline = time.monotonic() + args.duration_ms / 1000 + args.drain_timeout
+        while time.monotonic() < deadline:
+            runs = requests.get(f"{service.url}/ecu/runs", timeout=10).json()
+            if all(run["status"] not in ("queued", "running") for run in runs):
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+        metrics = service.metrics()
+        samples = metrics.get("rigecu_samples_total", 0)
+        usage = usage_delta(before, service.usage(), samples / 1000)
+        if usage:
+            usage["cpu_percent"] = round(100 * usage["cpu_s"] / elapsed, 1)
+
+        lateness = 'clock="real"'
+        report = {
+            "runs": args.runs,
+            "rate_hz": args.rate_hz,
+            "duration_ms": args.duration_ms,
+            "start_latency_p50_ms": result["latency_p50_ms"],
+            "start_latency_p99_ms": result["latency_p99_ms"],
+            "start_statuses": result["statuses"],
+            "samples": int(samples),
+            "samples_per_s": round(samples / elapsed, 1),
+            "expected_samples_per_s": round(args.runs * args.rate_hz, 1),
+            "missed_ticks": int(metrics.get("rigecu_missed_ticks_total", 0)),
+            "tick_lateness_mean_ms": round(1000 * metrics.get(f"rigecu_tick_lateness_seconds_sum{{{lateness}}}", 0)
+                                           / max(1, metrics.get(f"rigecu_tick_lateness_seconds_count{{{lateness}}}", 0)), 3),
+            "tick_lateness_p50_ms": histogram_quantile(metrics, "rigecu_tick_lateness_seconds", 0.5, lateness) * 1000,
+            "tick_lateness_p99_ms": histogram_quantile(metrics, "rigecu_tick_lateness_seconds", 0.99, lateness) * 1000,
+            "cpu_ms_per_1k_samples": usage.pop("cpu_per_unit_ms", None),
+            "process": usage
+        }
+        if data_api is not None:
+            report.update({"chunks_received": data_api.requests, "bytes_received": data_api.bytes})
+        else:
+            report["data_sink"] = bench_sink_ingest(sink, sink_before, samples, started, args.drain_timeout)
+        return report
+    finally:
+        service.stop()
+        if data_api is not None:
+            data_api.stop()
+        if sink is not None:
+            sink.stop()
+
+
+def bench_sink_ingest(sink, before, samples, started, timeout):
+    """Wait until the datasink has stored `samples` rows and report its ingest rate and cost."""
+    deadline = time.monotonic() + timeout
+    while True:
+        metrics = sink.metrics()
+        rows = metrics.get('datasink_rows_total{table="samples"}', 0)
+        if rows >= samples or time.monotonic() >= deadline:
+            break
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - started
+    chunks = metrics.get('datasink_chunks_total{table="samples"}', 0)
+    ingest_count = metrics.get("datasink_ingest_seconds_count", 0)
+    usage = usage_delta(before, sink.usage(), rows / 1000)
+    usage.pop("cpu_per_unit_ms", None)
+    return {
+        "rows_stored": int(rows),
+        "all_stored": rows >= samples,
+        "chunks_stored": int(chunks),
+        "bytes_received": int(metrics.get("datasink_bytes_total", 0)),
+        "rows_per_s": round(rows / elapsed, 1),
+        "ingest_mean_ms": round(1000 * metrics.get("datasink_ingest_seconds_sum", 0) / max(1, ingest_count), 3),
+        "ingest_p99_ms": histogram_quantile(metrics, "datasink_ingest_seconds", 0.99) * 1000,
+        "rejected_chunks": int(metrics.get("datasink_rejected_chunks_total", 0)),
+        "process": usage
+    }
+
+
+def compare(report, baseline, tolerance):
+    """List the tracked metrics that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for scenario, keys in TRACKED.items():
+        current, previous = report["scenarios"].get(scenario), baseline["scenarios"].get(scenario)
+        if not current or not previous:
+            continue
+        for key, higher_is_better in keys.items():
+            new, old = current.get(key), previous.get(key)
+            if new is None or old is None or old == 0:
+                continue
+            change = (new - old) / abs(old)
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append({"scenario": scenario, "metric": key, "baseline": old, "current": new,
+                                    "change_percent": round(change * 100, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenario", choices=["submit", "ecu", "all"])
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight from the load generator")
+    parser.add_argument("--requests", type=int, default=1000, help="test submissions to send (submit)")
+    parser.add_argument("--runs", type=int, default=20, help="ECU runs to start (ecu)")
+    parser.add_argument("--rate-hz", type=float, default=100, help="sample rate of each ECU run")
+    parser.add_argument("--duration-ms", type=int, default=5000, help="length of each ECU run")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="delay added by each upstream stub")
+    parser.add_argument("--data-sink", action="store_true", help="post ECU data to a datasink service instead of a stub")
+    parser.add_argument("--server-threads", type=int, default=4, help="waitress threads in the service under test")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="seconds to wait for background delivery")
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    scenarios = ["submit", "ecu"] if args.scenario == "all" else [args.scenario]
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("save", "compare", "scenario")},
+        "scenarios": {}
+    }
+    for scenario in scenarios:
+        report["scenarios"][scenario] = {"submit": bench_submit, "ecu": bench_ecu}[scenario](args)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            f.write(output + "\n")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
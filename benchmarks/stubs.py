@@ -0,0 +1,90 @@
+"""In-process stand-ins for the upstream APIs the services call.
+
+Each StubServer accepts any POST, optionally waits `latency_ms` to mimic a
+remote backend, answers with a small JSON body and counts requests and
+bytes so a benchmark can tell when everything it sent has been delivered.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40 ms to every response
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        stub = self.server.stub
+        if stub.latency_ms:
+            time.sleep(stub.latency_ms / 1000)
+        stub.record(length)
+        self._reply(stub.status, {"ok": True, "run_id": "stub"})
+
+    def do_GET(self):
+        self._reply(200, {"ok": True})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubServer:
+    def __init__(self, name, latency_ms=0.0, status=201):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.status = status
+        self.requests = 0
+        self.bytes = 0
+        self.first_at = None
+        self.last_at = None
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"stub-{name}", daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/{self.name}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def record(self, length):
+        now = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            self.bytes += length
+            if self.first_at is None:
+                self.first_at = now
+            self.last_at = now
+
+    def wait_for(self, count, timeout):
+        """Wait until `count` requests have arrived; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self.requests < count:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,114 @@
+import gzip
+import json
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+ROWS_JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.rigecu.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.rigecu.columnar+msgpack"
+
+# Keys of a columnar payload that describe the chunk rather than hold a column
+COLUMNAR_KEYS = ("format", "count", "timestamp_base", "timestamp_deltas")
+
+
+def accepted_types():
+    return [COLUMNAR_MSGPACK] * (msgpack is not None) + [COLUMNAR_JSON, ROWS_JSON]
+
+
+def accepted_encodings():
+    return ["zstd"] * (zstandard is not None) + ["gzip"]
+
+
+def decompress(body, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(body)
+    if encoding:
+        raise ValueError(f"Unsupported Content-Encoding '{encoding}'")
+    return body
+
+
+def _flatten(values, prefix, out):
+    for key, value in values.items():
+        if isinstance(value, dict):
+            # Summary payloads nest per-channel statistics under "channels"
+            _flatten(value, prefix if key == "channels" else f"{prefix}{key}_", out)
+        else:
+            out[prefix + key] = value
+
+
+def _columns(flat, count):
+    columns = {}
+    for name, value in flat.items():
+        if isinstance(value, list):
+            if len(value) != count:
+                raise ValueError(f"Column {name} has {len(value)} values, expected {count}")
+            columns[name] = np.asarray(value, dtype=np.float64)
+        elif isinstance(value, (int, float)):
+            # Constant columns (e.g. set_speed) are sent once per chunk
+            columns[name] = np.full(count, float(value))
+    return columns
+
+
+def from_columnar(payload):
+    count = payload["count"]
+    timestamps = np.cumsum(payload["timestamp_deltas"], dtype=np.int64) + payload["timestamp_base"]
+    if len(timestamps) != count:
+        raise ValueError(f"Chunk has {len(timestamps)} timestamps, expected {count}")
+    flat = {}
+    _flatten({key: value for key, value in payload.items() if key not in COLUMNAR_KEYS}, "", flat)
+    if "samples" in flat:
+        # Summaries name the per-window sample count "samples" in columnar form and "count" in rows
+        flat["count"] = flat.pop("samples")
+    return timestamps, _columns(flat, count)
+
+
+def from_rows(rows):
+    flat_rows = []
+    for row in rows:
+        flat = {}
+        _flatten(row, "", flat)
+        flat_rows.append(flat)
+    timestamps = np.array([flat.pop("timestamp") for flat in flat_rows], dtype=np.int64)
+    names = {name: None for flat in flat_rows for name in flat}
+    columns = {}
+    for name in names:
+        values = [flat.get(name) for flat in flat_rows]
+        if all(isinstance(value, (int, float)) for value in values if value is not None):
+            columns[name] = np.array([np.nan if value is None else float(value) for value in values])
+    return timestamps, columns
+
+
+def decode(body, content_type=ROWS_JSON, content_encoding=None):
+    """Decode a chunk in any rigecu encoding into (timestamps, {column: float64 array}).
+
+    Nested fields are flattened with underscores, e.g. ina260.voltage_v
+    becomes ina260_voltage_v.
+    """
+    body = decompress(body, (content_encoding or "").strip().lower() or None)
+    content_type = (content_type or ROWS_JSON).split(";")[0].strip().lower()
+    if content_type == COLUMNAR_MSGPACK:
+        if msgpack is None:
+            raise ValueError("The columnar-msgpack format requires the msgpack package")
+        return from_columnar(msgpack.unpackb(body))
+    payload = json.loads(body)
+    if isinstance(payload, dict) and payload.get("format") in ("columnar", "summary"):
+        return from_columnar(payload)
+    rows = payload["data"] if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise ValueError("Expected a list of rows in 'data'")
+    return from_rows(rows)
@@ -0,0 +1,176 @@
+import os
+import time
+from flask import Flask, request, Response, jsonify
+from flask_cors import CORS
+from waitress import serve
+from setup_logging import get_logger
+from store import ColumnStore
+from chunks import decode, accepted_types, accepted_encodings
+from metrics import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE
+
+# for local dev, load env vars from a .env file
+from dotenv import load_dotenv
+load_dotenv()
+
+data_dir = os.getenv("data_dir", "state/datasink")  # On the state volume so data survives restarts
+max_chunk_bytes = int(os.getenv("max_chunk_bytes", str(16 * 1024 * 1024)))
+max_open_files = int(os.getenv("max_open_files", "512"))  # Column files kept open between chunks, across all tests
+storage_retry_after = int(os.getenv("storage_retry_after", "5"))  # Seconds clients wait after a storage error
+query_limit = int(os.getenv("query_limit", "100000"))  # Most rows one query returns
+web_threads = int(os.getenv("WEB_THREADS", "8"))
+
+SAMPLES = "samples"
+SUMMARIES = "summaries"
+
+logger = get_logger()
+
+app = Flask(__name__)
+
+# Enable CORS for all routes and origins by default
+CORS(app)
+
+store = ColumnStore(data_dir, max_open_files=max_open_files)
+
+chunks_received = Counter("datasink_chunks_total", "Chunks accepted, by table", ("table",))
+rows_received = Counter("datasink_rows_total", "Rows appended, by table", ("table",))
+bytes_received = Counter("datasink_bytes_total", "Request body bytes of accepted chunks")
+chunks_rejected = Counter("datasink_rejected_chunks_total", "Chunks that could not be decoded or stored")
+ingest_seconds = Histogram("datasink_ingest_seconds", "Time to decode and append one chunk",
+                           buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+Gauge("datasink_tests", "Tests with stored samples", lambda: len(store.tests(SAMPLES)))
+Gauge("datasink_open_files", "Column files held open for appends", lambda: store.files.open_files)
+
+
+def ingest(table, test_id):
+    """Append the chunk in the request body to the test's series in `table`."""
+    body = request.get_data()
+    if len(body) > max_chunk_bytes:
+        chunks_rejected.inc()
+        return jsonify({"error": f"Chunk exceeds {max_chunk_bytes} bytes"}), 413
+    started = time.perf_counter()
+    try:
+        timestamps, columns = decode(body, request.headers.get("Content-Type"), request.headers.get("Content-Encoding"))
+        rows = store.append(table, test_id, timestamps, columns)
+    except (ValueError, KeyError, TypeError) as e:
+        chunks_rejected.inc()
+        logger.warning("Rejected chunk for %s: %s", test_id, e)
+        return jsonify({"error": f"Invalid chunk: {str(e)}"}), 400
+    except OSError:
+        chunks_rejected.inc()
+        raise
+    ingest_seconds.observe(time.perf_counter() - started)
+    chunks_received.labels(table).inc()
+    rows_received.labels(table).inc(rows)
+    bytes_received.inc(len(body))
+    logger.debug("Stored %d %s rows for %s", rows, table, test_id)
+    return jsonify({"test_id": test_id, "rows": rows}), 201
+
+
+def advertise():
+    """Answer rigecu's encoding negotiation with the formats this sink decodes."""
+    response = Response(status=204)
+    response.headers["Allow"] = "GET, POST, DELETE, OPTIONS"
+    response.headers["Accept"] = ", ".join(accepted_types())
+    response.headers["Accept-Encoding"] = ", ".join(accepted_encodings())
+    return response
+
+
+def query(table, test_id):
+    """Rows of a test between ?from= and ?to= (ms, end exclusive), optionally only some ?columns=a,b."""
+    series = store.series(table, test_id)
+    if series is None:
+        return jsonify({"error": f"No data for test {test_id}"}), 404
+    try:
+        start = int(request.args["from"]) if "from" in request.args else None
+        end = int(request.args["to"]) if "to" in request.args else None
+        limit = min(int(request.args.get("limit", query_limit)), query_limit)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameters: {str(e)}"}), 400
+    columns = [name for name in request.args.get("columns", "").split(",") if name] or None
+
+    timestamps, values, truncated = series.query(start, end, columns, limit)
+    # Stored NaN marks values a chunk did not carry
+    return jsonify({
+        "test_id": test_id,
+        "count": len(timestamps),
+        "truncated": truncated,
+        "timestamp": timestamps.tolist(),
+        "columns": {name: [None if value != value else value for value in column.tolist()]
+                    for name, column in values.items()}
+    }), 200
+
+
+def delete(table, test_id):
+    if not store.delete(table, test_id):
+        return jsonify({"error": f"No data for test {test_id}"}), 404
+    logger.info(f"Deleted {table} of test {test_id}")
+    return "", 204
+
+
+def handle(table, test_id):
+    try:
+        if request.method == "POST":
+            return ingest(table, test_id)
+        if request.method == "OPTIONS":
+            return advertise()
+        if request.method == "DELETE":
+            return delete(table, test_id)
+        return query(table, test_id)
+    except ValueError as e:
+        # Only raised for test IDs that cannot name a directory
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/data/summary/<test_id>", methods=['GET', 'POST', 'DELETE', 'OPTIONS'], provide_automatic_options=False)
+def summary_data(test_id):
+    return handle(SUMMARIES, test_id)
+
+
+@app.route("/data/<test_id>", methods=['GET', 'POST', 'DELETE', 'OPTIONS'], provide_automatic_options=False)
+def sample_data(test_id):
+    return handle(SAMPLES, test_id)
+
+
+@app.route("/tests", methods=['GET'])
+def list_tests():
+    """Stored tests with their row counts, time span and size on disk."""
+    tests = []
+    for test_id in store.tests(SAMPLES):
+        series = store.series(SAMPLES, test_id)
+        if series is not None:
+            tests.append({"test_id": test_id, **series.summary()})
+    return jsonify(tests), 200
+
+
+@app.route("/tests/<test_id>", methods=['GET'])
+def get_test(test_id):
+    result = {"test_id": test_id}
+    for table in (SAMPLES, SUMMARIES):
+        series = store.series(table, test_id)
+        result[table] = series.summary() if series is not None else None
+    if result[SAMPLES] is None and result[SUMMARIES] is None:
+        return jsonify({"error": f"No data for test {test_id}"}), 404
+    return jsonify(result), 200
+
+
+@app.errorhandler(OSError)
+def storage_error(e):
+    """Disk full, out of file handles or a lost volume: the chunk is not stored, so ask the client to retry."""
+    logger.error("Storage error on %s %s: %s", request.method, request.path, e)
+    response = jsonify({"error": f"Storage unavailable: {e.strerror or e}"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(storage_retry_after)
+    return response
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+if __name__ == '__main__':
+    logger.info(f"Storing chunks under {os.path.abspath(data_dir)}")
+    try:
+        serve(app, host="0.0.0.0", port=80, threads=web_threads)
+    finally:
+        store.close()
@@ -0,0 +1,295 @@
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+
+TIMESTAMP = "timestamp"
+TIMESTAMP_DTYPE = np.dtype("<i8")
+VALUE_DTYPE = np.dtype("<f8")
+
+
+def _column_file(directory, name):
+    return os.path.join(directory, f"{quote(name, safe='-_')}.{'i8' if name == TIMESTAMP else 'f8'}")
+
+
+class FileCache:
+    """Append handles of column files shared by every series, with at most `max_files` open at once.
+
+    A test with hundreds of channels holds as many column files, so the bound
+    is on handles rather than series. Handles in use by an append are pinned;
+    when the cache is full the least recently used unpinned ones are closed.
+    """
+
+    def __init__(self, max_files=512):
+        self.max_files = max_files
+        self._files = OrderedDict()
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, paths):
+        """Yield {path: handle} for `paths`, kept open until the block exits."""
+        with self._lock:
+            handles = {}
+            try:
+                for path in paths:
+                    f = self._files.get(path)
+                    if f is None:
+                        f = self._files[path] = open(path, "ab", buffering=0)
+                    self._files.move_to_end(path)
+                    self._pins[path] = self._pins.get(path, 0) + 1
+                    handles[path] = f
+            except OSError:
+                self._unpin(handles)
+                raise
+            self._evict()
+        try:
+            yield handles
+        finally:
+            with self._lock:
+                self._unpin(handles)
+                self._evict()
+
+    def _unpin(self, paths):
+        for path in paths:
+            pins = self._pins.pop(path) - 1
+            if pins:
+                self._pins[path] = pins
+
+    def _evict(self):
+        # One series may need more files than the cache holds; it goes over the bound while pinned
+        excess = len(self._files) - self.max_files
+        for path in list(self._files):
+            if excess <= 0:
+                break
+            if path not in self._pins:
+                self._files.pop(path).close()
+                excess -= 1
+
+    def close(self, directory=None):
+        """Close every handle, or only those of files under `directory`."""
+        with self._lock:
+            for path in list(self._files):
+                if directory is None or os.path.dirname(path) == directory:
+                    self._files.pop(path).close()
+
+    @property
+    def open_files(self):
+        return len(self._files)
+
+
+class Series:
+    """One test's rows in one table: a raw little-endian file per column.
+
+    Appends write each column with a single unbuffered write, timestamps
+    last, so readers (and a restart after a crash) only trust the rows that
+    every column file holds. Reads memory-map the files. While timestamps
+    arrive in order, range queries are a binary search; once a chunk arrives
+    out of order the series is marked unsorted and queries scan instead.
+    The first and last timestamps are tracked on append and saved in the
+    metadata on close, so listing tests does not scan their rows.
+    """
+
+    def __init__(self, directory, files):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.columns = []
+        self.rows = 0
+        self.sorted = True
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._files = files
+        self._bounds_saved = True
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _meta_path(self):
+        return os.path.join(self.directory, "columns.json")
+
+    def _load(self):
+        if not os.path.exists(self._meta_path()):
+            return
+        with open(self._meta_path(), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.columns = meta["columns"]
+        self.sorted = meta["sorted"]
+        path = _column_file(self.directory, TIMESTAMP)
+        self.rows = os.path.getsize(path) // TIMESTAMP_DTYPE.itemsize if os.path.exists(path) else 0
+        # Timestamps are written last, so they define the committed rows; trim
+        # columns of an append that was cut short and pad an unfinished backfill
+        for name in [TIMESTAMP] + self.columns:
+            itemsize = TIMESTAMP_DTYPE.itemsize if name == TIMESTAMP else VALUE_DTYPE.itemsize
+            path = _column_file(self.directory, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(path, "ab") as f:
+                if size > self.rows * itemsize:
+                    f.truncate(self.rows * itemsize)
+                elif size < self.rows * itemsize:
+                    f.write(np.full(self.rows - size // itemsize, np.nan, dtype=VALUE_DTYPE).tobytes())
+        if meta.get("rows") == self.rows:
+            self.first_timestamp = meta.get("first_timestamp")
+            self.last_timestamp = meta.get("last_timestamp")
+        elif self.rows:
+            # Saved bounds are stale after an unclean shutdown; rescan once
+            timestamps = self._map(TIMESTAMP, self.rows)
+            self.first_timestamp = int(timestamps.min())
+            self.last_timestamp = int(timestamps.max())
+            self._bounds_saved = False
+
+    def _save_meta(self):
+        path = self._meta_path()
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "columns": self.columns,
+                "sorted": self.sorted,
+                "rows": self.rows,
+                "first_timestamp": self.first_timestamp,
+                "last_timestamp": self.last_timestamp
+            }, f)
+        os.replace(path + ".tmp", path)
+        self._bounds_saved = True
+
+    def _map(self, name, rows):
+        dtype = TIMESTAMP_DTYPE if name == TIMESTAMP else VALUE_DTYPE
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_column_file(self.directory, name), dtype=dtype, mode="r", shape=(rows,))
+
+    def append(self, timestamps, columns):
+        """Append rows; columns new to the series are backfilled with NaN, missing ones are written as NaN."""
+        count = len(timestamps)
+        if count == 0:
+            return 0
+        timestamps = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        with self.lock:
+            added = [name for name in columns if name not in self.columns]
+            in_order = not np.any(np.diff(timestamps) < 0) and \
+                (self.last_timestamp is None or timestamps[0] >= self.last_timestamp)
+            if added or (self.sorted and not in_order) or not os.path.exists(self._meta_path()):
+                self.columns.extend(added)
+                self.sorted = bool(self.sorted and in_order)
+                self._save_meta()
+            paths = {name: _column_file(self.directory, name) for name in [TIMESTAMP] + self.columns}
+            with self._files.open(paths.values()) as files:
+                for name in added:
+                    files[paths[name]].write(np.full(self.rows, np.nan, dtype=VALUE_DTYPE).tobytes())
+                for name in self.columns:
+                    values = columns.get(name)
+                    values = np.full(count, np.nan, dtype=VALUE_DTYPE) if values is None else np.asarray(values, dtype=VALUE_DTYPE)
+                    files[paths[name]].write(values.tobytes())
+                files[paths[TIMESTAMP]].write(timestamps.tobytes())
+            self.rows += count
+            oldest, newest = int(timestamps.min()), int(timestamps.max())
+            self.first_timestamp = oldest if self.first_timestamp is None else min(self.first_timestamp, oldest)
+            self.last_timestamp = newest if self.last_timestamp is None else max(self.last_timestamp, newest)
+            self._bounds_saved = False
+        return count
+
+    def query(self, start=None, end=None, columns=None, limit=None):
+        """Rows with start <= timestamp < end, in timestamp order. Returns (timestamps, {column: values}, truncated)."""
+        with self.lock:
+            rows = self.rows
+            names = [name for name in (columns or self.columns) if name in self.columns]
+            is_sorted = self.sorted
+        timestamps = self._map(TIMESTAMP, rows)
+        if is_sorted:
+            low = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+            high = rows if end is None else int(np.searchsorted(timestamps, end, side="left"))
+            index = slice(low, max(low, high))
+        else:
+            mask = np.ones(rows, dtype=bool)
+            if start is not None:
+                mask &= timestamps >= start
+            if end is not None:
+                mask &= timestamps < end
+            selected = np.flatnonzero(mask)
+            index = selected[np.argsort(timestamps[selected], kind="stable")]
+
+        selected_timestamps = timestamps[index]
+        truncated = limit is not None and len(selected_timestamps) > limit
+        if truncated:
+            index = slice(index.start, index.start + limit) if isinstance(index, slice) else index[:limit]
+            selected_timestamps = selected_timestamps[:limit]
+        return np.array(selected_timestamps), {name: np.array(self._map(name, rows)[index]) for name in names}, truncated
+
+    def summary(self):
+        with self.lock:
+            rows, columns = self.rows, list(self.columns)
+            first, last = self.first_timestamp, self.last_timestamp
+        return {
+            "rows": rows,
+            "columns": columns,
+            "first_timestamp": first,
+            "last_timestamp": last,
+            # Every committed column file holds exactly `rows` values
+            "bytes": rows * (TIMESTAMP_DTYPE.itemsize + VALUE_DTYPE.itemsize * len(columns))
+        }
+
+    def close(self, save=True):
+        """Close the column files and save the timestamp bounds; the next append reopens them."""
+        with self.lock:
+            self._files.close(self.directory)
+            if save and not self._bounds_saved:
+                self._save_meta()
+
+
+class ColumnStore:
+    """Per-test columnar series under `root`, grouped into tables (e.g. samples and summaries)."""
+
+    def __init__(self, root, max_open_files=512):
+        self.root = root
+        self.files = FileCache(max_open_files)
+        self._series = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _directory(self, table, test_id):
+        name = quote(test_id, safe="-_")
+        if name in ("", ".", ".."):
+            raise ValueError(f"Invalid test_id '{test_id}'")
+        return os.path.join(self.root, table, name)
+
+    def series(self, table, test_id, create=False):
+        key = (table, test_id)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                directory = self._directory(table, test_id)
+                if not create and not os.path.isdir(directory):
+                    return None
+                series = self._series[key] = Series(directory, self.files)
+            return series
+
+    def append(self, table, test_id, timestamps, columns):
+        series = self.series(table, test_id, create=True)
+        return series.append(timestamps, columns)
+
+    def tests(self, table):
+        directory = os.path.join(self.root, table)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(unquote(name) for name in os.listdir(directory))
+
+    def delete(self, table, test_id):
+        directory = self._directory(table, test_id)
+        with self._lock:
+            series = self._series.pop((table, test_id), None)
+            if series is not None:
+                series.close(save=False)
+            if not os.path.isdir(directory):
+                return False
+            shutil.rmtree(directory)
+        return True
+
+    def close(self):
+        with self._lock:
+            for series in self._series.values():
+                series.close()
+            self._series = {}
+            self.files.close()
@@ -0,0 +1,113 @@
+import json
+import os
+
+import numpy as np
+
+from store import TIMESTAMP, ColumnStore, FileCache, Series, _column_file
+
+
+def column_rows(directory, name):
+    return os.path.getsize(_column_file(directory, name)) / 8
+
+
+def test_restart_trims_a_cut_short_append(tmp_path):
+    directory = str(tmp_path / "T-1")
+    series = Series(directory, FileCache())
+    series.append([0, 10, 20], {"rpm": [1.0, 2.0, 3.0], "temp": [4.0, 5.0, 6.0]})
+    series.close()
+
+    # Killed mid-append: rpm got a whole row, temp half of one and the timestamps a partial value
+    for name, tail in [("rpm", np.array([9.0]).tobytes()), ("temp", b"\0" * 4), (TIMESTAMP, b"\0" * 3)]:
+        with open(_column_file(directory, name), "ab") as f:
+            f.write(tail)
+    reopened = Series(directory, FileCache())
+
+    assert reopened.rows == 3
+    assert [column_rows(directory, name) for name in (TIMESTAMP, "rpm", "temp")] == [3, 3, 3]
+    timestamps, columns, _ = reopened.query()
+    assert timestamps.tolist() == [0, 10, 20]
+    assert columns["rpm"].tolist() == [1.0, 2.0, 3.0] and columns["temp"].tolist() == [4.0, 5.0, 6.0]
+    assert (reopened.first_timestamp, reopened.last_timestamp) == (0, 20)
+
+    # The next append lines up with the committed rows
+    reopened.append([30], {"rpm": [4.0]})
+    assert reopened.query()[1]["rpm"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_restart_pads_an_unfinished_backfill(tmp_path):
+    directory = str(tmp_path / "T-1")
+    series = Series(directory, FileCache())
+    series.append([0, 10, 20], {"rpm": [1.0, 2.0, 3.0]})
+    series.close()
+
+    # Killed after a new column was recorded but before its NaN backfill was written out
+    meta_path = os.path.join(directory, "columns.json")
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["columns"].append("volts")
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    with open(_column_file(directory, "volts"), "wb") as f:
+        f.write(np.array([np.nan]).tobytes())
+    reopened = Series(directory, FileCache())
+
+    assert column_rows(directory, "volts") == 3
+    assert np.isnan(reopened.query()[1]["volts"]).all()
+
+
+def test_eviction_leaves_pinned_files_open(tmp_path):
+    cache = FileCache(max_files=2)
+    paths = [str(tmp_path / f"{index}.f8") for index in range(4)]
+
+    with cache.open(paths[:3]) as pinned:
+        # One append may need more files than the cache holds
+        assert cache.open_files == 3
+        with cache.open(paths[3:]):
+            assert cache.open_files == 4
+        assert cache.open_files == 3
+        assert not any(f.closed for f in pinned.values())
+    assert cache.open_files == 2
+
+    # The least recently used unpinned handles went first
+    with cache.open(paths[:1]) as reopened:
+        assert not reopened[paths[0]].closed
+    assert cache.open_files == 2
+    cache.close()
+    assert cache.open_files == 0
+
+
+def test_evicted_files_are_reopened_for_the_next_append(tmp_path):
+    store = ColumnStore(str(tmp_path), max_open_files=2)
+    for index in range(3):
+        store.append("samples", f"T-{index}", [0, 10], {"rpm": [1.0, 2.0]})
+    assert store.files.open_files <= 2
+
+    store.append("samples", "T-0", [20], {"rpm": [3.0]})
+
+    assert store.series("samples", "T-0").query()[1]["rpm"].tolist() == [1.0, 2.0, 3.0]
+    store.close()
+
+
+def test_unsorted_appends_are_queried_in_timestamp_order(tmp_path):
+    store = ColumnStore(str(tmp_path))
+    store.append("samples", "T-1", [30, 40, 50], {"rpm": [3.0, 4.0, 5.0]})
+    store.append("samples", "T-1", [0, 20, 10], {"rpm": [0.0, 2.0, 1.0]})
+    store.append("samples", "T-1", [60, 25], {"rpm": [6.0, 2.5]})
+    series = store.series("samples", "T-1")
+
+    assert not series.sorted
+    timestamps, columns, truncated = series.query(start=10, end=50)
+    assert timestamps.tolist() == [10, 20, 25, 30, 40]
+    assert columns["rpm"].tolist() == [1.0, 2.0, 2.5, 3.0, 4.0]
+    assert not truncated
+
+    timestamps, columns, truncated = series.query(limit=3)
+    assert timestamps.tolist() == [0, 10, 20] and columns["rpm"].tolist() == [0.0, 1.0, 2.0]
+    assert truncated
+    assert (series.first_timestamp, series.last_timestamp) == (0, 60)
+
+    # Reopening keeps the series marked unsorted
+    store.close()
+    reopened = ColumnStore(str(tmp_path)).series("samples", "T-1")
+    assert not reopened.sorted
+    assert reopened.query(start=20, end=30)[0].tolist() == [20, 25]
@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import html
+import mimetypes
+import os
+import threading
+
+from flask import Response, request
+from werkzeug.http import http_date
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+ONE_YEAR = 31536000
+
+
+def _accepted_encodings():
+    return {value.split(";")[0].strip().lower() for value in request.headers.get("Accept-Encoding", "").split(",")}
+
+
+def _not_modified(etag, last_modified=None):
+    if_none_match = request.if_none_match
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+
+class PageTemplate:
+    """An HTML page rendered once at startup, with only the test ID filled in per request.
+
+    The page is split around the `{{test_id}}` placeholder when it is loaded.
+    Other `{{name}}` placeholders are filled from `values` at the same time.
+    Rendered variants (identity, gzip and, when available, brotli) are kept
+    for the most recent test ID, so repeated page loads cost a dict lookup.
+    """
+
+    def __init__(self, path, **values):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        for name, value in values.items():
+            text = text.replace("{{" + name + "}}", str(value))
+        self._prefix, _, self._suffix = text.partition("{{test_id}}")
+        self._digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        self._lock = threading.Lock()
+        self._cached_test_id = None
+        self._variants = {}
+
+    def _render(self, test_id):
+        with self._lock:
+            if test_id != self._cached_test_id:
+                body = (self._prefix + html.escape(str(test_id)) + self._suffix).encode("utf-8")
+                variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+                if brotli is not None:
+                    variants["br"] = brotli.compress(body, quality=11)
+                etag = hashlib.sha1(f"{self._digest}:{test_id}".encode("utf-8")).hexdigest()[:16]
+                self._variants = {"etag": etag, **variants}
+                self._cached_test_id = test_id
+            return self._variants
+
+    def response(self, test_id):
+        variants = self._render(test_id)
+        etag = variants["etag"]
+        if _not_modified(etag):
+            response = Response(status=304)
+        else:
+            accepted = _accepted_encodings()
+            encoding = next((name for name in ("br", "gzip") if name in accepted and name in variants), "identity")
+            response = Response(variants[encoding], mimetype="text/html", status=200)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        # The test ID changes between submissions, so always revalidate (cheaply, via the ETag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class _FileRange:
+    """Iterate over exactly `length` bytes of an open file from its current position."""
+
+    def __init__(self, f, length, block_size=65536):
+        self._file = f
+        self._remaining = length
+        self._block_size = block_size
+
+    def __iter__(self):
+        while self._remaining > 0:
+            data = self._file.read(min(self._block_size, self._remaining))
+            if not data:
+                break
+            self._remaining -= len(data)
+            yield data
+
+    def close(self):
+        self._file.close()
+
+
+class FileAsset:
+    """A static file served with validators, long-lived caching and byte ranges.
+
+    Whole files are handed to the server's wsgi.file_wrapper, so waitress
+    streams them from its I/O thread instead of tying up a worker while a
+    video downloads. Ranges are read in blocks that stop at the end of the
+    range, since the server may send a wrapped file through to its end.
+    """
+
+    def __init__(self, path, max_age=ONE_YEAR):
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.last_modified = stat.st_mtime
+        self.etag = hashlib.sha1(f"{stat.st_size}-{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:16]
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.max_age = max_age
+
+    @property
+    def version(self):
+        """Cache-busting token for asset URLs."""
+        return self.etag
+
+    def response(self):
+        if _not_modified(self.etag, self.last_modified):
+            response = Response(status=304)
+        else:
+            start, length, status = 0, self.size, 200
+            byte_range = request.range
+            # Honour If-Range: serve the full file if the client's copy is stale
+            if byte_range is not None and not self._if_range_matches():
+                byte_range = None
+            if byte_range is not None:
+                content_range = byte_range.range_for_length(self.size)
+                if content_range is None:
+                    response = Response(status=416)
+                    response.headers["Content-Range"] = f"bytes */{self.size}"
+                    return self._cache_headers(response)
+                start, stop = content_range
+                length, status = stop - start, 206
+
+            f = open(self.path, "rb")
+            f.seek(start)
+            body = wrap_file(request.environ, f) if status == 200 else _FileRange(f, length)
+            response = Response(body, status=status, mimetype=self.mimetype, direct_passthrough=True)
+            response.content_length = length
+            if status == 206:
+                response.headers["Content-Range"] = f"bytes {start}-{start + length - 1}/{self.size}"
+        return self._cache_headers(response)
+
+    def _if_range_matches(self):
+        if_range = request.if_range
+        if if_range.etag is not None:
+            return if_range.etag == self.etag
+        if if_range.date is not None:
+            # Last-Modified is sent with one-second resolution
+            return int(if_range.date.timestamp()) == int(self.last_modified)
+        return True
+
+    def _cache_headers(self, response):
+        response.set_etag(self.etag)
+        response.headers["Last-Modified"] = http_date(self.last_modified)
+        response.headers["Accept-Ranges"] = "bytes"
+        # URLs carry ?v=<version>, so a changed file gets a new URL and the old one can be cached forever
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}, immutable"
+        return response
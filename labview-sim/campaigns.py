@@ -0,0 +1,125 @@
+import csv
+import hashlib
+import io
+import json
+import time
+from collections import Counter
+
+from outbox import FINISHED_STATES, QUEUED, COMPLETED, FAILED
+
+
+FORM_FIELDS = (
+    "testid", "campaignid", "sampleid", "environmentid", "batteryid",
+    "fanid", "motorid", "shroudid", "throttle", "operator", "holdtime"
+)
+# Optional per-test idempotency key; the test's contents are used without one
+KEY_FIELD = "key"
+
+
+def parse_csv(text):
+    """Parse a CSV campaign whose header row uses the form field names."""
+    reader = csv.DictReader(io.StringIO(text))
+    unknown = set(reader.fieldnames or []) - set(FORM_FIELDS) - {KEY_FIELD}
+    if unknown:
+        raise ValueError(f"Unknown CSV columns: {', '.join(sorted(unknown))}")
+    return [{key: value for key, value in row.items() if value not in (None, "")} for row in reader]
+
+
+def campaign_keys(tests):
+    """Idempotency key of each test: its "key" field, or a digest of its fields.
+
+    Identical tests without a key are told apart by how often the same
+    contents occurred before them, so re-posting a campaign maps every test
+    to the job it created the first time, whatever order the rows are in.
+    """
+    keys = []
+    seen = Counter()
+    for test in tests:
+        if test.get(KEY_FIELD) not in (None, ""):
+            keys.append(f"key:{test[KEY_FIELD]}")
+            continue
+        contents = json.dumps({name: test[name] for name in test if name != KEY_FIELD}, sort_keys=True, default=str)
+        digest = hashlib.sha256(contents.encode("utf-8")).hexdigest()
+        keys.append(f"row:{digest}:{seen[digest]}")
+        seen[digest] += 1
+    return keys
+
+
+def campaign_job_id(campaign_id, key):
+    """Job ID (and so upstream Idempotency-Key) of the test with `key` in a campaign."""
+    return hashlib.sha256(f"{campaign_id}:{key}".encode("utf-8")).hexdigest()[:32]
+
+
+class CampaignRunner:
+    """Submit whole campaigns through the submit pipeline and follow their delivery.
+
+    All of a campaign's tests are written to the durable outbox in one
+    transaction, so they survive upstream outages and restarts exactly like
+    form submissions, and are delivered by the pipeline's drainers with
+    their batching, retries and circuit breakers. `follow` then reports
+    every change in a job's status or delivery error until all jobs have
+    finished or `wait` runs out.
+
+    Each test's job ID comes from the campaign ID and the test's key, and
+    finished jobs stay in the outbox, so re-posting a campaign reports the
+    tests that already completed or are in flight, and only sends the
+    failed and new ones again.
+    """
+
+    def __init__(self, pipeline, logger, poll_interval=0.5):
+        self._pipeline = pipeline
+        self._logger = logger
+        self._poll_interval = poll_interval
+
+    def existing(self, job_ids):
+        """Jobs already stored for any of `job_ids`, by job ID."""
+        return {job.job_id: job for job in self._pipeline.outbox.get_many(list(job_ids))}
+
+    def submit(self, campaign_id, job_ids, tests, existing):
+        """Queue the campaign's new tests and retry its failed ones; returns all its jobs in `job_ids` order.
+
+        `tests` are (job_id, test_id, configuration, ecu_data) tuples for the
+        job IDs not in `existing`.
+        """
+        retry = [job_id for job_id, job in existing.items() if job.status == FAILED]
+        jobs = {job.job_id: job for job in self._pipeline.submit_many(tests, retry=retry)}
+        for job_id in retry:
+            existing[job_id].status, existing[job_id].error = QUEUED, None
+        jobs.update(existing)
+        self._logger.info(f"Queued campaign {campaign_id}: {len(tests)} new tests, {len(retry)} retried, "
+                          f"{len(existing) - len(retry)} already completed or in flight")
+        return [jobs[job_id] for job_id in job_ids]
+
+    def follow(self, campaign_id, jobs, wait=300.0):
+        """Yield a result dict per job now and whenever its status or error changes, then a summary."""
+        started = time.time()
+        states = {}
+        for job in jobs:
+            states[job.job_id] = (job.status, job.error)
+            yield self._result(job)
+
+        pending = [job.job_id for job in jobs if not job.finished]
+        deadline = started + wait
+        while pending and time.time() < deadline:
+            time.sleep(self._poll_interval)
+            for job in self._pipeline.outbox.get_many(pending):
+                if (job.status, job.error) != states[job.job_id]:
+                    states[job.job_id] = (job.status, job.error)
+                    yield self._result(job)
+            pending = [job_id for job_id in pending if states[job_id][0] not in FINISHED_STATES]
+
+        counts = {"completed": 0, "failed": 0, "pending": len(pending)}
+        for status, _ in states.values():
+            if status in FINISHED_STATES:
+                counts["completed" if status == COMPLETED else "failed"] += 1
+        yield {"summary": dict(counts, campaign_id=campaign_id, tests=len(jobs), seconds=round(time.time() - started, 3))}
+
+    @staticmethod
+    def _result(job):
+        result = {"test_id": job.test_id, "job_id": job.job_id, "status": job.status,
+                  "status_url": f"/api/jobs/{job.job_id}"}
+        if job.error:
+            result["error"] = job.error
+        if job.ecu_run is not None:
+            result["ecu_run"] = job.ecu_run
+        return result
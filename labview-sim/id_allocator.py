@@ -0,0 +1,137 @@
+import itertools
+import sqlite3
+import threading
+
+import requests
+
+
+def parse_test_id(test_id):
+    """Split an ID like "TEST-001" into ("TEST", 1), or return None if it is not in that form."""
+    parts = str(test_id).split('-')
+    if len(parts) == 2 and parts[1].isdigit():
+        return parts[0], int(parts[1])
+    return None
+
+
+def format_test_id(prefix, number):
+    return f"{prefix}-{number:03d}"
+
+
+class SqliteIdStore:
+    """Persistent per-prefix counters; leasing a block is one atomic transaction.
+
+    Every process on the same host that opens the file shares the counters,
+    and SQLite's write lock makes concurrent leases from threads or processes
+    safe. WAL mode relies on shared memory, so the file must be on a local
+    disk: replicas on other hosts lease from its owner via HttpIdStore.
+    """
+
+    def __init__(self, path, start=1):
+        self.path = path
+        self._start = start
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS test_id_counters (prefix TEXT PRIMARY KEY, next INTEGER NOT NULL)")
+
+    def lease(self, prefix, count):
+        """Reserve `count` numbers for `prefix`; returns the half-open range (start, end)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT next FROM test_id_counters WHERE prefix = ?", (prefix,)).fetchone()
+                start = row[0] if row else self._start
+                self._conn.execute(
+                    "INSERT INTO test_id_counters (prefix, next) VALUES (?, ?) "
+                    "ON CONFLICT (prefix) DO UPDATE SET next = excluded.next",
+                    (prefix, start + count)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return start, start + count
+
+
+class HttpIdStore:
+    """Lease blocks from another labview-sim's /api/test-ids/leases endpoint."""
+
+    def __init__(self, url, session=None, timeout=10):
+        self.url = url
+        self._session = session or requests.Session()
+        self._timeout = timeout
+
+    def lease(self, prefix, count):
+        response = self._session.post(self.url, json={"prefix": prefix, "count": count}, timeout=self._timeout)
+        response.raise_for_status()
+        data = response.json()
+        return data["start"], data["end"]
+
+
+class _Block:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.numbers = itertools.count(start)
+        self.last = start - 1
+
+
+class TestIdAllocator:
+    """Hands out unique test IDs from blocks leased from a shared store.
+
+    Each process leases `block_size` numbers at a time, so the store is only
+    touched once per block. Within a block, `next()` on an itertools.count is
+    atomic under the GIL, so concurrent requests never take a lock unless
+    the block has run out. Numbers left in a block when the process stops
+    are skipped, never reissued.
+    """
+
+    __test__ = False  # Not a pytest test class, despite its name
+
+    def __init__(self, store, prefix="TEST", block_size=100, logger=None):
+        self.store = store
+        self.prefix = prefix
+        self.block_size = block_size
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._block = None
+
+    def _renew(self, exhausted):
+        with self._lock:
+            # Another thread may already have replaced the exhausted block
+            if self._block is exhausted:
+                start, end = self.store.lease(self.prefix, self.block_size)
+                self._block = _Block(start, end)
+                if self._logger is not None:
+                    self._logger.info(f"Leased test IDs {format_test_id(self.prefix, start)} to "
+                                      f"{format_test_id(self.prefix, end - 1)}")
+            return self._block
+
+    def allocate(self):
+        block = self._block
+        while True:
+            if block is not None:
+                number = next(block.numbers)
+                if number < block.end:
+                    block.last = number
+                    return format_test_id(self.prefix, number)
+            block = self._renew(block)
+
+    def allocate_many(self, count):
+        return [self.allocate() for _ in range(count)]
+
+    def owns(self, test_id):
+        """Whether an ID belongs to the allocated series (and so must come from the allocator)."""
+        parsed = parse_test_id(test_id)
+        return parsed is not None and parsed[0] == self.prefix
+
+    def peek(self):
+        """The ID the next allocation will most likely return, for display, or None before the first lease.
+
+        Never leases, so rendering a page does not depend on the store being reachable.
+        """
+        block = self._block
+        if block is None:
+            return None
+        number = block.last + 1
+        return format_test_id(self.prefix, number) if number < block.end else format_test_id(self.prefix, block.end)
@@ -1,23 +1,51 @@
 import os
 import datetime
 import json
-import requests
-from flask import Flask, request, Response, redirect, jsonify
-from waitress import serve
-import time
+import sqlite3
+from flask import Flask, request, Response, jsonify
 
 from flask_cors import CORS
 
-from setup_logging import get_logger
+from setup_logging import get_logger, LazyJson
+from outbox import Outbox
+from submit_pipeline import SubmitPipeline
+from assets import FileAsset, PageTemplate
+from campaigns import CampaignRunner, parse_csv, campaign_job_id, campaign_keys
+from id_allocator import HttpIdStore, SqliteIdStore, TestIdAllocator
+from metrics import Counter, Gauge, REGISTRY, CONTENT_TYPE, merge
+import serving
 
 # for local dev, load env vars from a .env file
 from dotenv import load_dotenv
 load_dotenv()
 
+# With WEB_WORKERS > 1 this process only supervises the worker processes that run the code below
+if __name__ == '__main__':
+    serving.supervise(get_logger())
+
 service_url = os.getenv("Quix__Deployment__Network__PublicUrl")
 data_api_endpoint = os.getenv("data_api_endpoint", "")
 test_api_url = os.getenv("TEST_API_URL", "http://localhost:3000/api/tests")
 ecu_api_url = os.getenv("ECU_API_URL", "http://localhost:3001/api/ecu")
+submit_workers = int(os.getenv("SUBMIT_WORKERS", "16"))
+outbox_path = os.getenv("OUTBOX_PATH", "state/outbox.db")
+test_id_store_path = os.getenv("TEST_ID_STORE", "state/test_ids.db")
+test_id_allocator_url = os.getenv("TEST_ID_ALLOCATOR_URL", "")  # Lease IDs from the single deployment that owns the counter
+test_id_prefix = os.getenv("TEST_ID_PREFIX", "TEST")
+test_id_block_size = int(os.getenv("TEST_ID_BLOCK_SIZE", "20"))
+outbox_batch_size = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+outbox_max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "0"))  # 0 retries until delivered
+outbox_max_backoff = float(os.getenv("OUTBOX_MAX_BACKOFF", "60"))
+outbox_keep_finished = int(os.getenv("OUTBOX_KEEP_FINISHED", "20000"))  # Finished jobs, and so campaign keys, kept
+circuit_failure_threshold = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+circuit_reset_timeout = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+test_api_bulk_url = os.getenv("TEST_API_BULK_URL", "")  # Optional endpoint accepting a JSON array of configurations
+campaign_wait = float(os.getenv("CAMPAIGN_WAIT", "0"))  # Default seconds a campaign response streams job status
+max_campaign_wait = float(os.getenv("MAX_CAMPAIGN_WAIT", "600"))
+# A streaming campaign response holds a waitress thread, so always leave threads for the form and API
+max_campaign_streams = serving.stream_limit(os.getenv("MAX_CAMPAIGN_STREAMS"))
+campaign_retry_after = int(os.getenv("CAMPAIGN_RETRY_AFTER", "5"))
+max_campaign_tests = int(os.getenv("MAX_CAMPAIGN_TESTS", "5000"))
 
 logger = get_logger()
 
@@ -29,424 +57,275 @@ CORS(app)
 app.static_folder = '.'
 app.static_url_path = ''
 
-# Store the current test ID
-current_test_id = "TEST-001"
+# Test IDs come from blocks leased from a persistent (optionally shared) counter
+if test_id_allocator_url:
+    test_id_store = HttpIdStore(test_id_allocator_url)
+else:
+    if os.path.dirname(test_id_store_path):
+        os.makedirs(os.path.dirname(test_id_store_path), exist_ok=True)
+    test_id_store = SqliteIdStore(test_id_store_path)
+test_id_allocator = TestIdAllocator(test_id_store, prefix=test_id_prefix, block_size=test_id_block_size, logger=logger)
 
-def increment_test_id(test_id):
-    """Extract number from test ID, increment it, and return new ID"""
-    parts = test_id.split('-')
-    if len(parts) == 2 and parts[1].isdigit():
-        number = int(parts[1]) + 1
-        return f"{parts[0]}-{number:03d}"
-    return test_id
+app_dir = os.path.dirname(os.path.abspath(__file__))
+image_asset = FileAsset(os.path.join(app_dir, 'image_1.png'))
+video_asset = FileAsset(os.path.join(app_dir, 'video.mp4'))
+home_page_template = PageTemplate(
+    os.path.join(app_dir, 'index.html'),
+    image_version=image_asset.version,
+    video_version=video_asset.version
+)
 
 @app.route("/image_1.png")
 def serve_image():
-    return app.send_static_file('image_1.png')
+    return image_asset.response()
 
 @app.route("/video.mp4")
 def serve_video():
-    return app.send_static_file('video.mp4')
+    return video_asset.response()
 
 @app.route("/", methods=['GET'])
 def home_page():
-    global current_test_id
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Test Data Entry Form</title>
-        <style>
-            body {{
-                font-family: 'MS Sans Serif', Arial, sans-serif;
-                background-color: #c0c0c0;
-                margin: 0;
-                padding: 20px;
-            }}
-            
-            .form-container {{
-                background-color: #c0c0c0;
-                border: 2px outset #dfdfdf;
-                border-right-color: #808080;
-                border-bottom-color: #808080;
-                padding: 8px;
-                width: 450px;
-                box-shadow: 1px 1px 0 #ffffff inset, -1px -1px 0 #808080 inset;
-            }}
-            
-            .title-bar {{
-                background: linear-gradient(to right, #000080, #1084d7);
-                color: white;
-                padding: 2px 2px;
-                margin: -8px -8px 8px -8px;
-                font-weight: bold;
-                font-size: 11px;
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-            }}
-            
-            .form-group {{
-                margin-bottom: 10px;
-                display: flex;
-                align-items: center;
-            }}
-            
-            label {{
-                width: 140px;
-                font-size: 11px;
-                color: #000000;
-                font-weight: normal;
-            }}
-            
-            input[type="text"],
-            input[type="number"] {{
-                width: 250px;
-                padding: 3px 2px;
-                font-family: 'MS Sans Serif', Arial, sans-serif;
-                font-size: 11px;
-                border: 2px inset #dfdfdf;
-                border-right-color: #808080;
-                border-bottom-color: #808080;
-                background-color: #ffffff;
-            }}
-            
-            input[type="text"]:focus,
-            input[type="number"]:focus {{
-                outline: none;
-            }}
-            
-            button {{
-                width: 90px;
-                height: 28px;
-                font-family: 'MS Sans Serif', Arial, sans-serif;
-                font-size: 11px;
-                background-color: #c0c0c0;
-                border: 2px outset #dfdfdf;
-                border-right-color: #808080;
-                border-bottom-color: #808080;
-                color: #000000;
-                cursor: pointer;
-                font-weight: bold;
-                margin-top: 15px;
-                margin-right: 5px;
-            }}
-            
-            button:active {{
-                border-style: inset;
-                border-top-color: #808080;
-                border-left-color: #808080;
-                border-right-color: #dfdfdf;
-                border-bottom-color: #dfdfdf;
-            }}
-            
-            .button-group {{
-                text-align: center;
-                margin-top: 20px;
-            }}
-            
-            .main-container {{
-                display: flex;
-                gap: 20px;
-            }}
-            
-            .image-container {{
-                flex-shrink: 0;
-            }}
-            
-            .image-container img {{
-                border: 2px outset #dfdfdf;
-                border-right-color: #808080;
-                border-bottom-color: #808080;
-                background-color: #c0c0c0;
-                max-width: 500px;
-                height: auto;
-            }}
-
-            .video-container {{
-                flex-shrink: 0;
-                display: none;
-            }}
-
-            .video-container video {{
-                border: 2px outset #dfdfdf;
-                border-right-color: #808080;
-                border-bottom-color: #808080;
-                background-color: #000000;
-                max-width: 500px;
-                height: auto;
-            }}
-
-            #status-message {{
-                margin-top: 10px;
-                padding: 8px;
-                font-size: 11px;
-                display: none;
-                border: 2px inset #dfdfdf;
-                border-right-color: #808080;
-                border-bottom-color: #808080;
-            }}
-
-            #status-message.success {{
-                background-color: #90EE90;
-                color: #008000;
-                display: block;
-            }}
-
-            #status-message.error {{
-                background-color: #FFB6C6;
-                color: #8B0000;
-                display: block;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>LabTECH</h1>
-        <div class="main-container">
-            <div class="form-container">
-            <div class="title-bar">
-                <span>Test Data Entry</span>
-                <span>_</span>
-            </div>
-            <form id="testForm">
-                <div class="form-group">
-                    <label for="testid">Test ID:</label>
-                    <input type="text" id="testid" name="testid" value="{current_test_id}" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="campaignid">Campaign ID:</label>
-                    <input type="text" id="campaignid" name="campaignid" value="CAMP-2024-001" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="sampleid">Sample ID:</label>
-                    <input type="text" id="sampleid" name="sampleid" value="SAMPLE-001" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="environmentid">Environment ID:</label>
-                    <input type="text" id="environmentid" name="environmentid" value="ENV-LAB-01" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="batteryid">Battery ID:</label>
-                    <input type="text" id="batteryid" name="batteryid" value="BATT-12345" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="fanid">Fan ID:</label>
-                    <input type="text" id="fanid" name="fanid" value="FAN-001" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="motorid">Motor ID:</label>
-                    <input type="text" id="motorid" name="motorid" value="MOT-001" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="shroudid">Shroud ID:</label>
-                    <input type="text" id="shroudid" name="shroudid" value="SHROUD-001" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="throttle">Throttle %:</label>
-                    <input type="number" id="throttle" name="throttle" min="0" max="100" value="50" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="operator">Operator Name:</label>
-                    <input type="text" id="operator" name="operator" value="John Smith" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="holdtime">Hold Time:</label>
-                    <input type="text" id="holdtime" name="holdtime" value="30000" required>
-                </div>
-                
-                <div id="status-message"></div>
-                
-                <div class="button-group">
-                    <button type="button" id="runBtn">Run Test</button>
-                    <button type="reset">Clear</button>
-                </div>
-            </form>
-            </div>
-            
-            <div class="image-container" id="imageContainer">
-                <img src="/image_1.png" alt="Test Image">
-            </div>
-
-            <div class="video-container" id="videoContainer">
-                <video id="testVideo" controls autoplay>
-                    <source src="/video.mp4" type="video/mp4">
-                    Your browser does not support the video tag.
-                </video>
-            </div>
-        </div>
-
-        <script>
-            function incrementTestId(testId) {{
-                const parts = testId.split('-');
-                if (parts.length === 2 && /^\d+$/.test(parts[1])) {{
-                    const number = parseInt(parts[1]) + 1;
-                    return parts[0] + '-' + String(number).padStart(3, '0');
-                }}
-                return testId;
-            }}
-
-            document.getElementById('runBtn').addEventListener('click', async function(e) {{
-                e.preventDefault();
-                
-                const formData = new FormData(document.getElementById('testForm'));
-                const data = {{
-                    testid: formData.get('testid'),
-                    campaignid: formData.get('campaignid'),
-                    sampleid: formData.get('sampleid'),
-                    environmentid: formData.get('environmentid'),
-                    batteryid: formData.get('batteryid'),
-                    fanid: formData.get('fanid'),
-                    motorid: formData.get('motorid'),
-                    shroudid: formData.get('shroudid'),
-                    throttle: formData.get('throttle'),
-                    operator: formData.get('operator'),
-                    holdtime: formData.get('holdtime')
-                }};
-                
-                // Show video and hide image immediately
-                document.getElementById('imageContainer').style.display = 'none';
-                document.getElementById('videoContainer').style.display = 'block';
-                document.getElementById('testVideo').play();
-                
-                try {{
-                    const response = await fetch('/api/submit-test', {{
-                        method: 'POST',
-                        headers: {{
-                            'Content-Type': 'application/json'
-                        }},
-                        body: JSON.stringify(data)
-                    }});
-                    
-                    const result = await response.json();
-                    const statusMsg = document.getElementById('status-message');
-                    
-                    if (response.ok) {{
-                        statusMsg.className = 'success';
-                        statusMsg.textContent = 'Test submitted successfully!';
-                        
-                        // Increment the test ID on the client side
-                        const currentId = document.getElementById('testid').value;
-                        document.getElementById('testid').value = incrementTestId(currentId);
-                    }} else {{
-                        statusMsg.className = 'error';
-                        statusMsg.textContent = 'Error: ' + (result.error || 'Failed to submit test');
-                    }}
-                }} catch (error) {{
-                    const statusMsg = document.getElementById('status-message');
-                    statusMsg.className = 'error';
-                    statusMsg.textContent = 'Error: ' + error.message;
-                }}
-            }});
-        </script>
-    </body>
-    </html>
-    """
-    return Response(html, mimetype='text/html', status=200)
+    # Before this process has leased any IDs there is no next one to show
+    return home_page_template.response(test_id_allocator.peek() or "Next test ID")
+
+def build_configuration(data):
+    # Format the data according to the API specification
+    return {
+        "test_id": data.get('testid'),
+        "campaign_id": data.get('campaignid'),
+        "environment_id": data.get('environmentid'),
+        "sample_id": data.get('sampleid'),
+        "operator": data.get('operator'),
+        "sensors": {
+            "throttle": {
+                "value": data.get('throttle')
+            },
+            "hold_time": {
+                "value": data.get('holdtime')
+            },
+            "battery": {
+                "id": data.get('batteryid')
+            },
+            "motor": {
+                "id": data.get('motorid')
+            },
+            "shroud": {
+                "id": data.get('shroudid')
+            },
+            "fan": {
+                "id": data.get('fanid')
+            }
+        },
+        "timestamp": datetime.datetime.now().isoformat()
+    }
+
+def build_ecu_data(data):
+    return {
+        "test_id": data.get('testid'),
+        "speeds": [data.get('throttle')],
+        "ramp_delay": data.get('holdtime')
+    }
+
+if os.path.dirname(outbox_path):
+    os.makedirs(os.path.dirname(outbox_path), exist_ok=True)
+
+submit_pipeline = SubmitPipeline(
+    Outbox(outbox_path),
+    test_api_url,
+    ecu_api_url,
+    logger,
+    bulk_url=test_api_bulk_url,
+    workers=submit_workers,
+    batch_size=outbox_batch_size,
+    max_backoff=outbox_max_backoff,
+    max_attempts=outbox_max_attempts,
+    breaker_threshold=circuit_failure_threshold,
+    breaker_reset=circuit_reset_timeout,
+    max_finished=outbox_keep_finished
+)
+
+submissions = Counter("labview_submissions_total", "Tests accepted for submission, by source", ("source",))
+Gauge("labview_outbox_jobs", "Jobs in the outbox by status", lambda: submit_pipeline.outbox.counts(), ("status",))
+Gauge("labview_circuit_open", "1 while deliveries to an upstream are paused by its circuit breaker",
+      lambda: {name: int(breaker.to_dict()["state"] == "open") for name, breaker in submit_pipeline.breakers.items()},
+      ("upstream",))
 
 @app.route("/api/submit-test", methods=['POST'])
 def api_submit_test():
-    # Handle the AJAX form submission
-    global current_test_id
+    # Handle the AJAX form submission; the upstream calls are made from the outbox
     try:
         data = request.get_json()
         
-        # Format the data according to the API specification
-        configuration = {
-            "test_id": data.get('testid'),
-            "campaign_id": data.get('campaignid'),
-            "environment_id": data.get('environmentid'),
-            "sample_id": data.get('sampleid'),
-            "operator": data.get('operator'),
-            "sensors": {
-                "throttle": {
-                    "value": data.get('throttle')
-                },
-                "hold_time": {
-                    "value": data.get('holdtime')
-                },
-                "battery": {
-                    "id": data.get('batteryid')
-                },
-                "motor": {
-                    "id": data.get('motorid')
-                },
-                "shroud": {
-                    "id": data.get('shroudid')
-                },
-                "fan": {
-                    "id": data.get('fanid')
-                }
-            },
-            "timestamp": datetime.datetime.now().isoformat()
-        }
+        # IDs in the allocated series are only ever assigned here, so replicas never hand out the same one
+        if data.get('testid') and test_id_allocator.owns(data.get('testid')):
+            return jsonify({"error": f"Test IDs starting with {test_id_prefix}- are assigned automatically; "
+                                     f"leave the test ID empty or use another prefix"}), 409
+        if not data.get('testid'):
+            data['testid'] = test_id_allocator.allocate()
         
-        logger.info(f"Test data formatted: {json.dumps(configuration)}")
+        configuration = build_configuration(data)
+        logger.debug("Test data formatted: %s", LazyJson(configuration))
         
-        # Post test data to the HTTP API
-        try:
-            response = requests.post(
-                test_api_url,
-                json=configuration,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
-            
-            if response.status_code not in [200, 201]:
-                logger.warning(f"Test API returned status code {response.status_code}. Response: {response.text}")
-                return jsonify({"error": f"Test API failed with status {response.status_code}"}), 400
-            
-            logger.info(f"Test data posted successfully. Response: {response.text}")
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to post test data to API: {str(e)}")
-            return jsonify({"error": "Failed to submit test data"}), 500
+        ecu_data = build_ecu_data(data)
+        logger.debug("ECU data formatted: %s", LazyJson(ecu_data))
         
-        # Post ECU data to a different API
-        try:
-            ecu_data = {
-                "test_id": data.get('testid'),
-                "speeds": [data.get('throttle')],
-                "ramp_delay": data.get('holdtime')
-            }
-            
-            logger.info(f"ECU data formatted: {json.dumps(ecu_data)}")
-            
-            ecu_response = requests.post(
-                ecu_api_url,
-                json=ecu_data,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
-            
-            if ecu_response.status_code not in [200, 201]:
-                logger.warning(f"ECU API returned status code {ecu_response.status_code}. Response: {ecu_response.text}")
-                return jsonify({"error": f"ECU API failed with status {ecu_response.status_code}"}), 400
-            
-            logger.info(f"ECU data posted successfully. Response: {ecu_response.text}")
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to post ECU data to API: {str(e)}")
-            return jsonify({"error": "Failed to submit ECU data"}), 500
-        
-        # Only increment test ID after both API calls succeed
-        current_test_id = increment_test_id(current_test_id)
+        job = submit_pipeline.submit(data.get('testid'), configuration, ecu_data)
+        submissions.labels("form").inc()
         
-        return jsonify({"success": True, "next_test_id": current_test_id}), 200
+        response = jsonify({
+            "success": True,
+            "job_id": job.job_id,
+            "test_id": job.test_id,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.job_id}",
+            "next_test_id": test_id_allocator.peek()
+        })
+        response.status_code = 202
+        response.headers["Location"] = f"/api/jobs/{job.job_id}"
+        return response
     
     except Exception as e:
         logger.error(f"Error submitting test: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Campaign tests go through the outbox like form submissions
+campaign_runner = CampaignRunner(submit_pipeline, logger)
+campaign_streams = serving.StreamSlots(max_campaign_streams)
+
+def same_test(job, data):
+    """Whether a stored job was queued from the same definition as `data`, its allocated test ID aside."""
+    data = dict(data, testid=data.get("testid") or job.test_id)
+    configuration = {key: value for key, value in build_configuration(data).items() if key != "timestamp"}
+    stored = {key: value for key, value in job.configuration.items() if key != "timestamp"}
+    return json.loads(json.dumps([configuration, build_ecu_data(data)])) == [stored, job.ecu_data]
+
+@app.route("/api/campaigns", methods=['POST'])
+def api_submit_campaign():
+    """Queue a whole campaign in the outbox and stream NDJSON status lines per test.
+
+    Accepts a JSON array of form-shaped test definitions, a JSON object
+    {"campaign_id", "tests", "defaults", "wait"}, or a CSV upload (multipart
+    field "file" or a text/csv body) with form field names as headers. Tests
+    without a testid get the next IDs from the allocator. A test may carry an
+    idempotency "key"; without one it is identified by its contents. Re-posting
+    a campaign only sends its failed and new tests again, and a key reused for
+    a different test is rejected with 409. Every test gets a line when it is
+    queued and, for up to `wait` seconds (CAMPAIGN_WAIT by default), whenever
+    its job changes status; /api/jobs/<job_id> keeps reporting after that.
+    Waiting responses hold a server thread, so at most MAX_CAMPAIGN_STREAMS
+    run at once and further ones get 503. Delivery concurrency is SUBMIT_WORKERS.
+    """
+    try:
+        options = dict(request.args)
+        if "file" in request.files:
+            tests = parse_csv(request.files["file"].read().decode("utf-8-sig"))
+        elif request.mimetype == "text/csv":
+            tests = parse_csv(request.get_data(as_text=True))
+        else:
+            body = request.get_json()
+            if isinstance(body, dict):
+                options.update({key: value for key, value in body.items() if key != "tests"})
+                tests = body.get("tests", [])
+            else:
+                tests = body
+        if not isinstance(tests, list) or not tests or not all(isinstance(test, dict) for test in tests):
+            raise ValueError("A campaign needs a non-empty list of test definitions")
+        if len(tests) > max_campaign_tests:
+            raise ValueError(f"A campaign may contain at most {max_campaign_tests} tests")
+        if any(test.get("testid") and test_id_allocator.owns(test["testid"]) for test in tests):
+            raise ValueError(f"Test IDs starting with {test_id_prefix}- are assigned automatically; leave them empty")
+        wait = max(0.0, min(float(options.get("wait", campaign_wait)), max_campaign_wait))
+        defaults = options.get("defaults") or {}
+        if not isinstance(defaults, dict):
+            raise ValueError("defaults must be an object of form fields")
+        campaign_id = str(options.get("campaign_id") or defaults.get("campaignid") or tests[0].get("campaignid") or "CAMPAIGN")
+        rows = [{**defaults, "campaignid": campaign_id, **test} for test in tests]
+        job_ids = [campaign_job_id(campaign_id, key) for key in campaign_keys(rows)]
+        if len(set(job_ids)) != len(job_ids):
+            raise ValueError("Test keys must be unique within a campaign")
+    except Exception as e:
+        logger.warning(f"Rejected campaign: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+    # Tests already in the outbox keep their job and test ID; only new ones get IDs allocated
+    existing = campaign_runner.existing(job_ids)
+    conflicts = [index for index, (job_id, data) in enumerate(zip(job_ids, rows))
+                 if job_id in existing and not same_test(existing[job_id], data)]
+    if conflicts:
+        logger.warning(f"Rejected campaign {campaign_id}: keys of rows {conflicts} were used for other tests")
+        return jsonify({"error": "Test keys were already used for different tests", "rows": conflicts}), 409
+
+    slot = None
+    if wait > 0:
+        slot = campaign_streams.acquire()
+        if slot is None:
+            response = jsonify({"error": f"All {max_campaign_streams} campaign streams are in use; "
+                                         f"retry later or post with wait=0 and poll /api/jobs"})
+            response.status_code = 503
+            response.headers["Retry-After"] = str(campaign_retry_after)
+            return response
+
+    new_tests = [(job_id, data) for job_id, data in zip(job_ids, rows) if job_id not in existing]
+    new_ids = iter(test_id_allocator.allocate_many(sum(1 for _, data in new_tests if not data.get("testid"))))
+    definitions = []
+    for job_id, data in new_tests:
+        if not data.get("testid"):
+            data["testid"] = next(new_ids)
+        definitions.append((job_id, data["testid"], build_configuration(data), build_ecu_data(data)))
+
+    # Queued before the response starts, so a dropped connection loses nothing
+    try:
+        jobs = campaign_runner.submit(campaign_id, job_ids, definitions, existing)
+    except sqlite3.IntegrityError:
+        if slot is not None:
+            slot.release()
+        return jsonify({"error": f"Campaign {campaign_id} is already being submitted"}), 409
+    submissions.labels("campaign").inc(len(definitions))
+
+    def generate():
+        for result in campaign_runner.follow(campaign_id, jobs, wait=wait):
+            yield json.dumps(result) + "\n"
+
+    response = Response(generate(), mimetype="application/x-ndjson", status=200)
+    if slot is not None:
+        response.call_on_close(slot.release)
+    return response
+
+@app.route("/api/jobs/<job_id>", methods=['GET'])
+def api_job_status(job_id):
+    job = submit_pipeline.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/api/outbox", methods=['GET'])
+def api_outbox_status():
+    return jsonify(submit_pipeline.stats()), 200
+
+@app.route("/api/test-ids/leases", methods=['POST'])
+def api_lease_test_ids():
+    """Lease a block of test IDs to another replica (see TEST_ID_ALLOCATOR_URL)."""
+    if not isinstance(test_id_store, SqliteIdStore):
+        return jsonify({"error": "This instance leases its IDs from TEST_ID_ALLOCATOR_URL and does not own the counter"}), 409
+    data = request.get_json(silent=True) or {}
+    try:
+        count = int(data.get("count", test_id_block_size))
+        if count < 1 or count > 10000:
+            raise ValueError("count must be between 1 and 10000")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    start, end = test_id_store.lease(str(data.get("prefix", test_id_prefix)), count)
+    return jsonify({"start": start, "end": end}), 200
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    if not serving.multi_process:
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+    # Each worker's series carry a worker label; any worker answers for all of them
+    text = REGISTRY.render({"worker": serving.worker_index})
+    return Response(merge([text] + serving.gather(request, "/metrics")), content_type=CONTENT_TYPE)
+
 
 if __name__ == '__main__':
-    serve(app, host="0.0.0.0", port=80)
\ No newline at end of file
+    serving.serve(app, logger, on_shutdown=submit_pipeline.close)
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""Low-overhead Prometheus metrics.
+
+Counters and histograms keep one accumulator per thread, so recording a
+value on a hot path is a couple of list updates with no lock and no
+contention; accumulators are only summed when /metrics is scraped, and a
+thread's accumulator is folded into a base total when the thread exits.
+Gauges and callback metrics are read from application state at scrape time.
+"""
+import bisect
+import math
+import threading
+import weakref
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _ShardOwner:
+    """Only referenced from its thread's locals, so it is freed when the thread exits."""
+
+    __slots__ = ("__weakref__",)
+
+
+class _Sharded:
+    """Per-thread accumulator lists, each written only by its own thread.
+
+    The shards of exited threads are folded into `_base`, so short-lived
+    threads (e.g. of per-task executors) do not make the list grow forever.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._shards = []
+        self._base = [0] * size
+        self._lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0] * self._size
+            owner = _ShardOwner()
+            with self._lock:
+                self._shards.append(values)
+            weakref.finalize(owner, self._retire, values)
+            self._local.owner = owner
+            self._local.values = values
+            return values
+
+    def _retire(self, values):
+        with self._lock:
+            for index, value in enumerate(values):
+                self._base[index] += value
+            self._shards = [shard for shard in self._shards if shard is not values]
+
+    def totals(self):
+        with self._lock:
+            totals = list(self._base)
+            for values in self._shards:
+                for index, value in enumerate(values):
+                    totals[index] += value
+        return totals
+
+
+class _CounterChild:
+    def __init__(self):
+        self._values = _Sharded(1)
+
+    def inc(self, amount=1):
+        self._values.shard()[0] += amount
+
+    def value(self):
+        return self._values.totals()[0]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # One slot per bucket (plus +Inf), then the sum
+        self._values = _Sharded(len(buckets) + 2)
+
+    def observe(self, value):
+        values = self._values.shard()
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+    def snapshot(self):
+        totals = self._values.totals()
+        return totals[:-1], totals[-1]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        # Unlabelled metrics are exported (as zero) from the start
+        self._default = None if self.labelnames or self.kind == "gauge" else self.labels()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        """The child for these label values; cache it on hot paths."""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def render(self):
+        lines = self._header()
+        for values, child in self._items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value())}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def render(self):
+        lines = self._header()
+        for values, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(total))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read at scrape time from `function`.
+
+    `function` returns a number, or a dict mapping label value tuples to
+    numbers when the gauge has labels.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function, labelnames=(), registry=None, kind="gauge"):
+        self._function = function
+        super().__init__(name, documentation, labelnames, registry)
+        self.kind = kind
+
+    def render(self):
+        lines = self._header()
+        values = self._function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            if not isinstance(label_values, tuple):
+                label_values = (label_values,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(value)}")
+        return lines
+
+
+def _add_labels(line, labels):
+    name, separator, rest = line.partition("{")
+    if separator:
+        return f"{name}{{{labels},{rest}"
+    name, _, value = line.partition(" ")
+    return f"{name}{{{labels}}} {value}"
+
+
+def merge(texts):
+    """Combine expositions from several processes, keeping each metric family together."""
+    families = {}
+    current = None
+    for text in texts:
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                current = line.split(" ", 3)[2]
+                families.setdefault(current, ([line], []))
+            elif line.startswith("# TYPE "):
+                header = families[current][0]
+                if len(header) == 1:
+                    header.append(line)
+            elif line:
+                families[current][1].append(line)
+    return "".join("\n".join(header + samples) + "\n" for header, samples in families.values())
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self, labels=None):
+        """Exposition text for all metrics; `labels` (a dict) is added to every sample."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        if labels:
+            text = _format_labels(tuple(labels), tuple(labels.values()))[1:-1]
+            lines = [line if line.startswith("#") else _add_labels(line, text) for line in lines]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
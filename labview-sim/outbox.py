@@ -0,0 +1,220 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+QUEUED = "queued"
+STARTING_ECU = "starting_ecu"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    job_id TEXT PRIMARY KEY,
+    test_id TEXT,
+    configuration TEXT NOT NULL,
+    ecu_data TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    error TEXT,
+    ecu_run TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+COLUMNS = "job_id, test_id, configuration, ecu_data, status, attempts, next_attempt_at, error, ecu_run, created_at, finished_at"
+
+
+class SubmitJob:
+    """One test submission and its progress through the outbox."""
+
+    def __init__(self, test_id, configuration, ecu_data, job_id=None):
+        # The job ID is also the Idempotency-Key of its upstream requests
+        self.job_id = job_id or uuid.uuid4().hex
+        self.test_id = test_id
+        self.configuration = configuration
+        self.ecu_data = ecu_data
+        self.status = QUEUED
+        self.attempts = 0
+        self.next_attempt_at = time.time()
+        self.error = None
+        self.ecu_run = None
+        self.created_at = self.next_attempt_at
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        (job.job_id, job.test_id, configuration, ecu_data, job.status, job.attempts,
+         job.next_attempt_at, job.error, ecu_run, job.created_at, job.finished_at) = row
+        job.configuration = json.loads(configuration)
+        job.ecu_data = json.loads(ecu_data)
+        job.ecu_run = json.loads(ecu_run) if ecu_run is not None else None
+        return job
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "test_id": self.test_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "next_attempt_at": None if self.finished else self.next_attempt_at,
+            "error": self.error,
+            "ecu_run": self.ecu_run,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+class Outbox:
+    """Durable store of test submissions, backed by SQLite in WAL mode.
+
+    A submission is committed to disk before it is acknowledged, and stays
+    in the table through each delivery stage, so nothing is lost if the
+    upstream APIs are down or the process restarts. One connection is shared
+    behind a lock; every statement is a short indexed read or write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL keeps acknowledged submissions across a power loss, not just a process crash
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def add(self, job):
+        return self.add_many([job])[0]
+
+    def add_many(self, jobs):
+        """Store several jobs in one transaction, so a whole campaign costs a single sync to disk."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"INSERT INTO outbox ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(job.job_id, job.test_id, json.dumps(job.configuration), json.dumps(job.ecu_data), job.status,
+                      job.attempts, job.next_attempt_at, job.error, None, job.created_at, job.finished_at)
+                     for job in jobs]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return jobs
+
+    def get(self, job_id):
+        rows = self._read(f"SELECT {COLUMNS} FROM outbox WHERE job_id = ?", (job_id,))
+        return SubmitJob.from_row(rows[0]) if rows else None
+
+    def get_many(self, job_ids, batch=500):
+        """The stored jobs among `job_ids`, in no particular order."""
+        jobs = []
+        for start in range(0, len(job_ids), batch):
+            ids = job_ids[start:start + batch]
+            rows = self._read(f"SELECT {COLUMNS} FROM outbox WHERE job_id IN ({', '.join('?' * len(ids))})", ids)
+            jobs.extend(SubmitJob.from_row(row) for row in rows)
+        return jobs
+
+    def due(self, status, limit, claim_for=60.0):
+        """Claim the oldest jobs in `status` whose next attempt is due.
+
+        Claimed jobs are not due again for `claim_for` seconds, so several
+        processes can drain the same outbox without sending a job twice; if
+        the claimant dies the job simply becomes due again.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT {COLUMNS} FROM outbox WHERE status = ? AND next_attempt_at <= ? ORDER BY created_at LIMIT ?",
+                    (status, now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE job_id = ?",
+                    [(now + claim_for, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [SubmitJob.from_row(row) for row in rows]
+
+    def next_due_at(self, status):
+        rows = self._read("SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (status,))
+        return rows[0][0]
+
+    def advance(self, job_id, status, ecu_run=None):
+        """Move a job to its next stage, resetting its retry state."""
+        now = time.time()
+        self._write(
+            "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ?, error = NULL, ecu_run = ?, "
+            "finished_at = ? WHERE job_id = ?",
+            (status, now, json.dumps(ecu_run) if ecu_run is not None else None,
+             now if status in FINISHED_STATES else None, job_id)
+        )
+
+    def requeue(self, job_ids):
+        """Send failed jobs through delivery again from the start."""
+        if not job_ids:
+            return 0
+        return self._write(
+            f"UPDATE outbox SET status = ?, attempts = 0, error = NULL, next_attempt_at = ?, finished_at = NULL "
+            f"WHERE status = ? AND job_id IN ({', '.join('?' * len(job_ids))})",
+            (QUEUED, time.time(), FAILED, *job_ids)
+        )
+
+    def retry_later(self, job_id, error, next_attempt_at):
+        self._write(
+            "UPDATE outbox SET attempts = attempts + 1, error = ?, next_attempt_at = ? WHERE job_id = ?",
+            (error, next_attempt_at, job_id)
+        )
+
+    def fail(self, job_id, error):
+        self._write(
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, error = ?, finished_at = ? WHERE job_id = ?",
+            (FAILED, error, time.time(), job_id)
+        )
+
+    def counts(self):
+        return dict(self._read("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+
+    def prune(self, max_finished):
+        """Delete all but the newest `max_finished` delivered or failed jobs."""
+        return self._write(
+            "DELETE FROM outbox WHERE finished_at IS NOT NULL AND job_id NOT IN "
+            "(SELECT job_id FROM outbox WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+            (max_finished,)
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,23 +1,126 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+
+LOGGER_NAME = 'waitress'
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_text or record.exc_info:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `rate` records per second through from each logging call site.
+
+    Records at `max_level` and above always pass. The number of records
+    suppressed at a call site is appended to the next one that gets through.
+    """
+
+    def __init__(self, rate, max_level=logging.ERROR):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.max_level:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._sites.get(site, (self.rate, now, 0))
+            tokens = min(self.rate, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._sites[site] = (tokens, now, suppressed + 1)
+                return False
+            self._sites[site] = (tokens - 1, now, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge the arguments here, since they may change after the call returns,
+        # but leave timestamps and layout to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LazyJson:
+    """Defers json.dumps of a log argument until the record is actually emitted."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value)
 
 
 def get_logger():
-    
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='[%(asctime)s] [%(levelname)s]: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    # Set up logging
-    logger = logging.getLogger('waitress')
-    logger.setLevel(logging.DEBUG)  # Set to DEBUG for more detailed output
-    logger.propagate = False  # Prevent the log messages from propagating to the root logger
-
-    # Create handlers (console and file handler for example)
-    console_handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    return logger
\ No newline at end of file
+    """The service logger, configured once from the environment.
+
+    LOG_LEVEL sets the level (default INFO) and LOG_FORMAT=json switches to
+    JSON lines. Records are put on a queue and written to the console by a
+    listener thread, so request and sampling threads never block on I/O.
+    LOG_RATE_LIMIT caps records per second per call site below ERROR
+    (0 disables the limit).
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _setup_lock:
+        if _listener is not None:
+            return logger
+
+        level = os.getenv("LOG_LEVEL", "INFO").upper()
+        rate_limit = float(os.getenv("LOG_RATE_LIMIT", "20"))
+
+        console_handler = logging.StreamHandler()
+        if os.getenv("LOG_FORMAT", "text").lower() == "json":
+            console_handler.setFormatter(JsonFormatter())
+        else:
+            console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        queue_handler = _QueueHandler(queue.SimpleQueue())
+        if rate_limit > 0:
+            queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+        logger.setLevel(level)
+        logger.propagate = False  # Prevent the log messages from propagating to the root logger
+        logger.handlers = [queue_handler]
+
+        _listener = logging.handlers.QueueListener(queue_handler.queue, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+    return logger
@@ -0,0 +1,274 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from outbox import QUEUED, STARTING_ECU, COMPLETED, SubmitJob
+from metrics import Counter, Histogram
+
+
+# Responses worth retrying; any other error status fails the job for good
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+upstream_seconds = Histogram("labview_upstream_request_seconds", "Latency of requests to the test API and ECU",
+                             ("upstream",))
+upstream_responses = Counter("labview_upstream_responses_total", "Upstream responses by HTTP status (or error)",
+                             ("upstream", "status"))
+
+
+def record_upstream(upstream, started, response=None):
+    """Record the outcome of one upstream request; `response` is None if it raised."""
+    upstream_seconds.labels(upstream).observe(time.perf_counter() - started)
+    upstream_responses.labels(upstream, response.status_code if response is not None else "error").inc()
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and no
+    requests are sent for `reset_timeout` seconds. It then lets a single
+    probe through (half-open): success closes it, failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Number of requests that may be sent now: None for unlimited, 1 for a probe, 0 while open."""
+        with self._lock:
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == OPEN:
+                return 0
+            return 1 if self.state == HALF_OPEN else None
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class DeliveryError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class SubmitPipeline:
+    """Deliver test submissions from the durable outbox to the upstream APIs.
+
+    `submit` only writes the job to the outbox, so the operator is answered
+    in milliseconds whatever state the backends are in. One drainer thread
+    per upstream then takes due jobs in batches: the test API registers
+    configurations (in one request when `bulk_url` is set) and the ECU
+    starts registered tests. Failed deliveries are retried with exponential
+    backoff and a circuit breaker per upstream stops hammering one that is
+    down. Jobs left in the outbox are picked up again after a restart.
+    """
+
+    def __init__(self, outbox, test_api_url, ecu_api_url, logger, bulk_url=None, workers=16, batch_size=50,
+                 timeout=10, backoff=1.0, max_backoff=60.0, max_attempts=0, breaker_threshold=5,
+                 breaker_reset=30.0, poll_interval=1.0, max_finished=1000):
+        self.outbox = outbox
+        self.test_api_url = test_api_url
+        self.ecu_api_url = ecu_api_url
+        self.bulk_url = bulk_url
+        self._logger = logger
+        self._batch_size = batch_size
+        self._timeout = timeout
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._max_attempts = max_attempts
+        self._poll_interval = poll_interval
+        self._max_finished = max_finished
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="submit")
+        self._stop = threading.Event()
+        self.breakers = {
+            "test_api": CircuitBreaker("test_api", breaker_threshold, breaker_reset),
+            "ecu": CircuitBreaker("ecu", breaker_threshold, breaker_reset)
+        }
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._wake = {QUEUED: threading.Event(), STARTING_ECU: threading.Event()}
+        self._threads = [
+            threading.Thread(target=self._drain, args=(QUEUED, self.breakers["test_api"], self._register),
+                             name="outbox-register", daemon=True),
+            threading.Thread(target=self._drain, args=(STARTING_ECU, self.breakers["ecu"], self._start_ecu),
+                             name="outbox-ecu", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        pending = outbox.counts()
+        if pending.get(QUEUED) or pending.get(STARTING_ECU):
+            self._logger.info(f"Resuming outbox delivery: {pending.get(QUEUED, 0)} to register, "
+                              f"{pending.get(STARTING_ECU, 0)} to start on the ECU")
+
+    def submit(self, test_id, configuration, ecu_data):
+        job = self.outbox.add(SubmitJob(test_id, configuration, ecu_data))
+        self._wake[QUEUED].set()
+        return job
+
+    def submit_many(self, tests, retry=()):
+        """Queue (job_id, test_id, configuration, ecu_data) tuples in one outbox transaction.
+
+        Failed jobs listed in `retry` are delivered again.
+        """
+        jobs = self.outbox.add_many([SubmitJob(test_id, configuration, ecu_data, job_id)
+                                     for job_id, test_id, configuration, ecu_data in tests])
+        self.outbox.requeue(list(retry))
+        self._wake[QUEUED].set()
+        return jobs
+
+    def get(self, job_id):
+        return self.outbox.get(job_id)
+
+    def stats(self):
+        return {
+            "outbox": self.outbox.counts(),
+            "circuits": {name: breaker.to_dict() for name, breaker in self.breakers.items()}
+        }
+
+    def close(self):
+        self._stop.set()
+        for event in self._wake.values():
+            event.set()
+        for thread in self._threads:
+            thread.join(timeout=self._timeout)
+        self._executor.shutdown(wait=False)
+
+    def _drain(self, status, breaker, deliver):
+        wake = self._wake[status]
+        last_prune = 0.0
+        while not self._stop.is_set():
+            try:
+                wake.clear()
+                allowed = breaker.allow()
+                limit = self._batch_size if allowed is None else allowed
+                # Hold the claim for as long as delivering a full batch can take
+                claim_for = self._timeout * (limit // self._workers + 2)
+                jobs = self.outbox.due(status, limit, claim_for) if allowed != 0 else []
+                if jobs:
+                    deliver(jobs)
+                    continue
+
+                if status == QUEUED and time.time() - last_prune > 60:
+                    self.outbox.prune(self._max_finished)
+                    last_prune = time.time()
+
+                # Sleep until the next retry is due, a new job arrives or the circuit may close
+                next_due = self.outbox.next_due_at(status)
+                timeout = self._poll_interval if next_due is None else min(self._poll_interval, max(0.0, next_due - time.time()))
+                if allowed == 0:
+                    timeout = self._poll_interval
+                wake.wait(timeout)
+            except Exception as e:
+                self._logger.error(f"Outbox drainer for {status} jobs failed: {str(e)}")
+                self._stop.wait(self._poll_interval)
+
+    def _register(self, jobs):
+        breaker = self.breakers["test_api"]
+        if self.bulk_url and len(jobs) > 1:
+            try:
+                batch_key = hashlib.sha256("".join(job.job_id for job in jobs).encode("utf-8")).hexdigest()[:32]
+                self._post(self.bulk_url, [job.configuration for job in jobs], batch_key, "Test bulk")
+            except DeliveryError as e:
+                self._delivery_failed(jobs, breaker, e, "Test")
+                return
+            breaker.record_success()
+            for job in jobs:
+                self.outbox.advance(job.job_id, STARTING_ECU)
+            self._logger.info(f"Registered {len(jobs)} test configurations in bulk")
+            self._wake[STARTING_ECU].set()
+            return
+
+        for job, result in zip(jobs, self._executor.map(
+                lambda job: self._attempt(self.test_api_url, job.configuration, job.job_id, "Test"), jobs)):
+            if isinstance(result, DeliveryError):
+                self._delivery_failed([job], breaker, result, "Test")
+            else:
+                breaker.record_success()
+                self.outbox.advance(job.job_id, STARTING_ECU)
+                self._wake[STARTING_ECU].set()
+
+    def _start_ecu(self, jobs):
+        breaker = self.breakers["ecu"]
+        for job, result in zip(jobs, self._executor.map(
+                lambda job: self._attempt(self.ecu_api_url, job.ecu_data, job.job_id, "ECU"), jobs)):
+            if isinstance(result, DeliveryError):
+                self._delivery_failed([job], breaker, result, "ECU")
+                continue
+            breaker.record_success()
+            try:
+                ecu_run = result.json()
+            except ValueError:
+                ecu_run = None
+            self.outbox.advance(job.job_id, COMPLETED, ecu_run=ecu_run)
+
+    def _attempt(self, url, payload, key, name):
+        try:
+            return self._post(url, payload, key, name)
+        except DeliveryError as e:
+            return e
+
+    def _post(self, url, payload, key, name):
+        upstream = name.lower().replace(" ", "_")
+        started = time.perf_counter()
+        try:
+            # The job ID doubles as the idempotency key, so a retried request is not applied twice
+            response = self.session.post(url, json=payload, headers={"Idempotency-Key": key}, timeout=self._timeout)
+        except requests.exceptions.RequestException as e:
+            record_upstream(upstream, started)
+            raise DeliveryError(f"Failed to submit {name} data: {str(e)}")
+        record_upstream(upstream, started, response)
+
+        if response.status_code not in [200, 201, 202]:
+            self._logger.warning("%s API returned status code %d. Response: %s", name, response.status_code, response.text)
+            raise DeliveryError(f"{name} API failed with status {response.status_code}",
+                                retryable=response.status_code in RETRYABLE_STATUS_CODES)
+
+        self._logger.debug("%s data posted successfully for %s. Response: %s", name, key, response.text)
+        return response
+
+    def _delivery_failed(self, jobs, breaker, error, name):
+        if error.retryable:
+            breaker.record_failure()
+        for job in jobs:
+            attempts = job.attempts + 1
+            if not error.retryable or (self._max_attempts and attempts >= self._max_attempts):
+                self._logger.error(f"Giving up on {name} delivery of {job.test_id}: {str(error)}")
+                self.outbox.fail(job.job_id, str(error))
+            else:
+                delay = min(self._max_backoff, self._backoff * 2 ** job.attempts)
+                self._logger.warning(f"{name} delivery of {job.test_id} failed, retrying in {delay:.1f}s: {str(error)}")
+                self.outbox.retry_later(job.job_id, str(error), time.time() + delay)
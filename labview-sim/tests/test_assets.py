@@ -0,0 +1,109 @@
+import gzip
+import os
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+
+from assets import FileAsset, PageTemplate
+
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def asset(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+    return FileAsset(str(path))
+
+
+@pytest.fixture
+def client(asset, tmp_path):
+    page = tmp_path / "index.html"
+    page.write_text("<p>Test {{test_id}} v{{version}}</p>", encoding="utf-8")
+    template = PageTemplate(str(page), version=3)
+
+    app = Flask(__name__)
+    app.add_url_rule("/video", "video", asset.response)
+    app.add_url_rule("/page/<test_id>", "page", template.response)
+    return app.test_client()
+
+
+def test_full_file_with_validators(client, asset):
+    response = client.get("/video")
+
+    assert response.status_code == 200
+    assert response.get_data() == CONTENT
+    assert response.headers["ETag"] == f'"{asset.etag}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Type"] == "video/mp4"
+    assert "immutable" in response.headers["Cache-Control"]
+
+
+def test_matching_etag_is_not_modified(client, asset):
+    response = client.get("/video", headers={"If-None-Match": f'"{asset.etag}"'})
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+
+
+def test_range_is_served_as_partial_content(client):
+    response = client.get("/video", headers={"Range": "bytes=100-299"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 100-299/{len(CONTENT)}"
+    assert response.content_length == 200
+    assert response.get_data() == CONTENT[100:300]
+
+
+def test_suffix_range(client):
+    response = client.get("/video", headers={"Range": "bytes=-10"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes {len(CONTENT) - 10}-{len(CONTENT) - 1}/{len(CONTENT)}"
+    assert response.get_data() == CONTENT[-10:]
+
+
+def test_unsatisfiable_range(client):
+    response = client.get("/video", headers={"Range": f"bytes={len(CONTENT)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("if_range,status", [("current", 206), ('"stale"', 200)])
+def test_if_range_only_honours_the_current_etag(client, asset, if_range, status):
+    etag = f'"{asset.etag}"' if if_range == "current" else if_range
+    response = client.get("/video", headers={"Range": "bytes=0-9", "If-Range": etag})
+
+    assert response.status_code == status
+    if status == 200:
+        assert response.get_data() == CONTENT
+
+
+@pytest.mark.parametrize("offset,status", [(0, 206), (-3600, 200)], ids=["current", "stale"])
+def test_if_range_date_must_match_last_modified(client, asset, offset, status):
+    date = http_date(os.stat(asset.path).st_mtime + offset)
+    response = client.get("/video", headers={"Range": "bytes=0-9", "If-Range": date})
+
+    assert response.status_code == status
+    assert response.get_data() == (CONTENT[:10] if status == 206 else CONTENT)
+
+
+def test_page_etag_follows_the_test_id(client):
+    first = client.get("/page/T-1", headers={"Accept-Encoding": "gzip"})
+
+    assert first.status_code == 200
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(first.get_data()) == b"<p>Test T-1 v3</p>"
+    assert client.get("/page/T-1", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    second = client.get("/page/T-2", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.get_data() == b"<p>Test T-2 v3</p>"
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+
+def test_page_escapes_the_test_id(client):
+    assert client.get("/page/<b>").get_data() == b"<p>Test &lt;b&gt; v3</p>"
@@ -0,0 +1,22 @@
+from campaigns import campaign_job_id, campaign_keys
+
+
+def test_keys_follow_the_test_not_its_row():
+    first = [{"throttle": "0.5", "holdtime": "10"}, {"throttle": "0.7", "holdtime": "10"}]
+
+    assert campaign_keys(first) == campaign_keys(first)
+    assert campaign_keys(list(reversed(first))) == list(reversed(campaign_keys(first)))
+    assert campaign_keys([{"throttle": "0.5", "holdtime": "20"}])[0] not in campaign_keys(first)
+
+
+def test_identical_tests_get_distinct_keys():
+    keys = campaign_keys([{"throttle": "0.5"}, {"throttle": "0.5"}, {"throttle": "0.5", "key": "a"}])
+
+    assert len(set(keys)) == 3
+    assert keys[2] == "key:a"
+
+
+def test_job_ids_differ_between_campaigns():
+    key = campaign_keys([{"throttle": "0.5"}])[0]
+
+    assert campaign_job_id("C-1", key) != campaign_job_id("C-2", key)
@@ -0,0 +1,20 @@
+from id_allocator import SqliteIdStore, TestIdAllocator
+
+
+class UnreachableStore:
+    def lease(self, prefix, count):
+        raise ConnectionError("allocator is down")
+
+
+def test_peek_never_leases():
+    allocator = TestIdAllocator(UnreachableStore())
+
+    assert allocator.peek() is None
+
+
+def test_peek_shows_the_next_id_of_the_leased_block(tmp_path):
+    allocator = TestIdAllocator(SqliteIdStore(str(tmp_path / "ids.db")), block_size=2)
+
+    assert allocator.allocate() == "TEST-001"
+    assert allocator.peek() == "TEST-002"
+    assert allocator.allocate_many(2) == ["TEST-002", "TEST-003"]
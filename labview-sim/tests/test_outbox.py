@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+
+import pytest
+
+import submit_pipeline
+from outbox import COMPLETED, FAILED, QUEUED, STARTING_ECU, Outbox, SubmitJob
+from submit_pipeline import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, SubmitPipeline
+
+
+TEST_API = "http://tests.invalid/api/tests"
+ECU_API = "http://ecu.invalid/api/ecu"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.text = str(body)
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("No JSON body")
+        return self._body
+
+
+class FakeUpstream:
+    """Stands in for the pipeline's requests session; answers each URL from a script of statuses."""
+
+    def __init__(self, statuses):
+        self._statuses = {url: list(script) for url, script in statuses.items()}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        with self._lock:
+            script = self._statuses[url]
+            status = script.pop(0) if len(script) > 1 else script[0]
+            self.calls.append((url, headers["Idempotency-Key"], time.monotonic()))
+        return FakeResponse(status, {"run_id": "r-1"} if url == ECU_API else None)
+
+    def attempts(self, url):
+        with self._lock:
+            return [call for call in self.calls if call[0] == url]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    yield outbox
+    outbox.close()
+
+
+@pytest.fixture
+def make_pipeline(outbox):
+    pipelines = []
+
+    def make(statuses, **options):
+        pipeline = SubmitPipeline(outbox, TEST_API, ECU_API, logging.getLogger("test"), poll_interval=0.05, **options)
+        pipeline.session = FakeUpstream(statuses)
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.close()
+
+
+def wait_for_status(pipeline, job_id, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = pipeline.get(job_id)
+        if job.status in statuses:
+            return job
+        assert time.monotonic() < deadline, f"job stuck in {job.status}"
+        time.sleep(0.01)
+
+
+def test_job_is_retried_after_an_upstream_failure(make_pipeline):
+    pipeline = make_pipeline({TEST_API: [503, 502, 201], ECU_API: [500, 202]}, backoff=0.05)
+
+    job = pipeline.submit("T-1", {"test_id": "T-1"}, {"test_id": "T-1"})
+    done = wait_for_status(pipeline, job.job_id, (COMPLETED, FAILED))
+
+    assert done.status == COMPLETED
+    assert done.ecu_run == {"run_id": "r-1"}
+    assert done.error is None and done.attempts == 0
+    registered, started = pipeline.session.attempts(TEST_API), pipeline.session.attempts(ECU_API)
+    assert len(registered) == 3 and len(started) == 2
+    # Every retry carries the same idempotency key, so upstreams apply it once
+    assert {key for _, key, _ in registered + started} == {job.job_id}
+    assert all(breaker.state == CLOSED for breaker in pipeline.breakers.values())
+
+
+def test_retries_back_off_exponentially_until_max_attempts(make_pipeline):
+    pipeline = make_pipeline({TEST_API: [503], ECU_API: [202]}, backoff=0.04, max_backoff=0.16, max_attempts=5,
+                             breaker_threshold=100)
+
+    job = pipeline.submit("T-1", {}, {})
+    failed = wait_for_status(pipeline, job.job_id, (FAILED,))
+
+    assert failed.attempts == 5
+    assert failed.error == "Test API failed with status 503"
+    times = [at for _, _, at in pipeline.session.attempts(TEST_API)]
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert len(gaps) == 4
+    for gap, delay in zip(gaps, (0.04, 0.08, 0.16, 0.16)):
+        assert gap >= delay * 0.9
+    assert not pipeline.session.attempts(ECU_API)
+
+
+def test_non_retryable_status_fails_at_once(make_pipeline):
+    pipeline = make_pipeline({TEST_API: [400], ECU_API: [202]}, backoff=0.01)
+
+    job = pipeline.submit("T-1", {}, {})
+    failed = wait_for_status(pipeline, job.job_id, (FAILED,))
+
+    assert failed.attempts == 1
+    assert len(pipeline.session.attempts(TEST_API)) == 1
+    assert pipeline.breakers["test_api"].failures == 0
+
+
+def test_failed_jobs_can_be_requeued(make_pipeline, outbox):
+    pipeline = make_pipeline({TEST_API: [400, 201], ECU_API: [202]})
+    job = pipeline.submit("T-1", {}, {})
+    wait_for_status(pipeline, job.job_id, (FAILED,))
+
+    assert outbox.requeue([job.job_id]) == 1
+    pipeline.submit_many([])
+
+    assert wait_for_status(pipeline, job.job_id, (COMPLETED,)).status == COMPLETED
+
+
+def test_claimed_jobs_are_not_due_again_until_the_claim_expires(outbox):
+    outbox.add(SubmitJob("T-1", {}, {}, job_id="a"))
+
+    assert [job.job_id for job in outbox.due(QUEUED, 10, claim_for=0.1)] == ["a"]
+    assert outbox.due(QUEUED, 10) == []
+    time.sleep(0.15)
+    assert [job.job_id for job in outbox.due(QUEUED, 10)] == ["a"]
+
+
+def test_retry_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    first = Outbox(path)
+    first.add(SubmitJob("T-1", {"a": 1}, {"b": 2}, job_id="a"))
+    first.retry_later("a", "upstream down", time.time() + 30)
+    first.close()
+
+    reopened = Outbox(path)
+    job = reopened.get("a")
+    reopened.close()
+
+    assert (job.status, job.attempts, job.error) == (QUEUED, 1, "upstream down")
+    assert job.configuration == {"a": 1} and job.ecu_data == {"b": 2}
+    assert job.next_attempt_at > time.time() + 20
+
+
+def test_advance_resets_the_retry_state(outbox):
+    outbox.add(SubmitJob("T-1", {}, {}, job_id="a"))
+    outbox.retry_later("a", "upstream down", time.time() + 30)
+
+    outbox.advance("a", STARTING_ECU)
+
+    job = outbox.get("a")
+    assert (job.status, job.attempts, job.error, job.finished_at) == (STARTING_ECU, 0, None, None)
+    assert job.next_attempt_at <= time.time()
+
+
+def test_requeue_only_touches_failed_jobs(outbox):
+    outbox.add_many([SubmitJob("T-1", {}, {}, job_id="failed"), SubmitJob("T-2", {}, {}, job_id="done")])
+    outbox.fail("failed", "bad request")
+    outbox.advance("done", COMPLETED)
+
+    assert outbox.requeue(["failed", "done"]) == 1
+    assert outbox.get("failed").status == QUEUED
+    assert outbox.get("done").status == COMPLETED
+
+
+class SteppedClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def test_circuit_breaker_state_machine(monkeypatch):
+    clock = SteppedClock()
+    monkeypatch.setattr(submit_pipeline.time, "time", clock.time)
+    breaker = CircuitBreaker("test_api", failure_threshold=3, reset_timeout=30.0)
+
+    for _ in range(2):
+        breaker.record_failure()
+    assert (breaker.state, breaker.allow()) == (CLOSED, None)
+
+    breaker.record_failure()
+    assert (breaker.state, breaker.allow()) == (OPEN, 0)
+
+    clock.now += 29
+    assert breaker.allow() == 0
+    clock.now += 1
+    # One probe is let through once the reset timeout has passed
+    assert (breaker.allow(), breaker.state) == (1, HALF_OPEN)
+
+    breaker.record_failure()
+    assert (breaker.state, breaker.allow()) == (OPEN, 0)
+
+    clock.now += 30
+    assert breaker.allow() == 1
+    breaker.record_success()
+    assert (breaker.state, breaker.allow(), breaker.failures) == (CLOSED, None, 0)
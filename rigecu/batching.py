@@ -0,0 +1,83 @@
+import threading
+
+
+class AdaptiveBatcher:
+    """Size one run's upload chunks from the data API's measured round trips, errors and backlog.
+
+    Chunks start at `min_samples`, the run's fixed send_interval worth of
+    samples, and never get smaller. While the API answers well within the
+    latency budget the target grows by `grow` per response, so the same
+    samples go out in fewer, larger requests. A failed or throttled request,
+    a round trip over the budget, or a growing upload backlog cuts it by
+    `shrink`, and a request the API rejected as too large also lowers
+    `max_bytes` below its size. A sample waits for the rest of its chunk and then for the round
+    trip, so chunks are also capped at `max_latency_ms` less the measured
+    round trip of sample time, and at `max_bytes` using the measured encoded
+    size per sample.
+    """
+
+    def __init__(self, data_interval, min_samples=1, max_samples=5000, max_bytes=1000000, max_latency_ms=1000.0,
+                 backlog_threshold=2, grow=1.25, shrink=0.5, headroom=0.5, smoothing=0.2):
+        if not 1 <= min_samples <= max_samples:
+            raise ValueError("batch sizes must satisfy 1 <= min_samples <= max_samples")
+        self.data_interval = data_interval
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.max_bytes = max_bytes
+        self.max_latency_ms = max_latency_ms
+        self._backlog_threshold = backlog_threshold
+        self._grow = grow
+        self._shrink = shrink
+        self._headroom = headroom
+        self._smoothing = smoothing
+        self._lock = threading.Lock()
+        self.target = float(min_samples)
+        self.rtt_ms = None
+        self.bytes_per_sample = None
+        self.backlog = 0
+        self.grown = 0
+        self.shrunk = 0
+
+    def chunk_samples(self):
+        """Samples to put in the run's next chunk."""
+        samples = self.target
+        budget_ms = self.max_latency_ms - (self.rtt_ms or 0.0)
+        samples = max(self.min_samples, min(samples, budget_ms / self.data_interval))
+        bytes_per_sample = self.bytes_per_sample
+        if bytes_per_sample:
+            samples = min(samples, self.max_bytes / bytes_per_sample)
+        return max(1, int(samples))
+
+    def observe(self, samples, size, rtt, ok, backlog, too_large=False):
+        """Record one upload attempt: samples and encoded bytes sent, round trip in seconds, outcome, queue depth."""
+        with self._lock:
+            if too_large:
+                self.max_bytes = min(self.max_bytes, size * self._shrink)
+            rtt_ms = rtt * 1000
+            self.rtt_ms = rtt_ms if self.rtt_ms is None else self.rtt_ms + self._smoothing * (rtt_ms - self.rtt_ms)
+            if samples:
+                per_sample = size / samples
+                self.bytes_per_sample = per_sample if self.bytes_per_sample is None else \
+                    self.bytes_per_sample + self._smoothing * (per_sample - self.bytes_per_sample)
+
+            growing_backlog = backlog > self._backlog_threshold and backlog > self.backlog
+            self.backlog = backlog
+            if not ok or growing_backlog or self.rtt_ms > self.max_latency_ms:
+                if self.target > self.min_samples:
+                    self.target = max(self.min_samples, self.target * self._shrink)
+                    self.shrunk += 1
+            elif self.rtt_ms < self._headroom * self.max_latency_ms and self.target < self.max_samples:
+                self.target = min(self.max_samples, self.target * self._grow)
+                self.grown += 1
+
+    def stats(self):
+        return {
+            "target_samples": round(self.target, 1),
+            "min_samples": self.min_samples,
+            "max_bytes": round(self.max_bytes),
+            "rtt_ms": round(self.rtt_ms, 2) if self.rtt_ms is not None else None,
+            "bytes_per_sample": round(self.bytes_per_sample, 1) if self.bytes_per_sample is not None else None,
+            "backlog": self.backlog,
+            "grown": self.grown,
+            "shrunk": self.shrunk
+        }
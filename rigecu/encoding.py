@@ -0,0 +1,208 @@
+import gzip
+import json
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+from summaries import summary_to_rows
+
+
+ROWS_JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.rigecu.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.rigecu.columnar+msgpack"
+
+FORMATS = {
+    "rows": ROWS_JSON,
+    "columnar": COLUMNAR_JSON,
+    "columnar-msgpack": COLUMNAR_MSGPACK
+}
+
+COMPRESSIONS = ("gzip", "zstd")
+
+# Negotiation preference when the endpoint advertises what it accepts
+PREFERRED_FORMATS = ("columnar-msgpack", "columnar", "rows")
+PREFERRED_COMPRESSIONS = ("zstd", "gzip")
+
+# Keys of a columnar payload that describe the chunk rather than hold channel values
+COLUMNAR_KEYS = ("format", "count", "timestamp_base", "timestamp_deltas")
+
+
+def parse_encoding(name):
+    """Parse an encoding name such as 'rows', 'columnar+gzip' or 'columnar-msgpack+zstd'."""
+    fmt, _, compression = name.strip().lower().partition("+")
+    if fmt not in FORMATS and fmt != "auto":
+        raise ValueError(f"Unknown chunk format '{fmt}', expected one of {', '.join(FORMATS)} or auto")
+    if compression and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown chunk compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+    return fmt, compression or None
+
+
+def _check_available(fmt, compression):
+    if fmt == "columnar-msgpack" and msgpack is None:
+        raise ValueError("The columnar-msgpack format requires the msgpack package")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+
+
+def to_columnar(block):
+    """Build the columnar payload: one array per channel, nested like the row format, and delta-encoded timestamps."""
+    if hasattr(block, "to_columnar"):
+        # Summary blocks carry their own layout
+        return block.to_columnar()
+    timestamps = block.timestamps
+    deltas = np.diff(timestamps, prepend=timestamps[:1]) if len(timestamps) else timestamps
+    set_speed = block.set_speed
+    if np.ndim(set_speed) == 0:
+        set_speed = float(set_speed)
+    elif len(set_speed) and np.all(set_speed == set_speed[0]):
+        # A constant set_speed is sent once rather than per sample
+        set_speed = float(set_speed[0])
+    else:
+        set_speed = set_speed.tolist()
+
+    return {
+        "format": "columnar",
+        "count": len(block),
+        "timestamp_base": int(timestamps[0]) if len(timestamps) else 0,
+        "timestamp_deltas": deltas.tolist(),
+        "set_speed": set_speed,
+        **block.schema.nest(block.values.tolist())
+    }
+
+
+def columnar_to_rows(payload):
+    """Expand a columnar payload back into the row-per-sample format."""
+    if payload.get("format") == "summary":
+        return summary_to_rows(payload)
+    count = payload["count"]
+    timestamps = np.cumsum(payload["timestamp_deltas"], dtype=np.int64) + payload["timestamp_base"]
+
+    def expand(value):
+        # Arrays hold a value per sample, groups nest further and anything else is constant
+        if isinstance(value, dict):
+            keys = list(value)
+            return [dict(zip(keys, sample)) for sample in zip(*(expand(item) for item in value.values()))]
+        return value if isinstance(value, list) else [value] * count
+
+    fields = {key: value for key, value in payload.items() if key not in COLUMNAR_KEYS}
+    names = list(fields)
+    return [
+        {"timestamp": timestamp, **dict(zip(names, sample))}
+        for timestamp, sample in zip(timestamps.tolist(), zip(*(expand(value) for value in fields.values())))
+    ]
+
+
+def compress(body, compression):
+    if compression == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return body
+
+
+def decompress(body, compression):
+    if compression == "gzip":
+        return gzip.decompress(body)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(body)
+    return body
+
+
+def decode_chunk(body, content_type=ROWS_JSON, content_encoding=None):
+    """Decode a chunk body in any supported encoding into a list of rows."""
+    body = decompress(body, (content_encoding or "").strip().lower() or None)
+    content_type = (content_type or ROWS_JSON).split(";")[0].strip().lower()
+    if content_type == COLUMNAR_MSGPACK:
+        if msgpack is None:
+            raise ValueError("The columnar-msgpack format requires the msgpack package")
+        return columnar_to_rows(msgpack.unpackb(body))
+    payload = json.loads(body)
+    if content_type == COLUMNAR_JSON or payload.get("format") == "columnar":
+        return columnar_to_rows(payload)
+    return payload["data"]
+
+
+class ChunkEncoder:
+    """Encode SampleBlocks for upload.
+
+    `encoding` is a format optionally followed by a compression, e.g. 'rows',
+    'columnar+gzip' or 'columnar-msgpack+zstd'. With the 'auto' format the
+    encoder asks the endpoint which content types and encodings it accepts
+    (via the Accept and Accept-Encoding headers of an OPTIONS response) and
+    picks the most compact one; it falls back to row JSON when the endpoint
+    advertises nothing or rejects a payload with 415.
+    """
+
+    def __init__(self, encoding="rows"):
+        fmt, compression = parse_encoding(encoding)
+        self.negotiated = fmt != "auto"
+        if fmt == "auto":
+            fmt, compression = "rows", None
+        _check_available(fmt, compression)
+        self.format = fmt
+        self.compression = compression
+
+    @property
+    def name(self):
+        return self.format + (f"+{self.compression}" if self.compression else "")
+
+    def __call__(self, block):
+        if self.format == "rows":
+            body = json.dumps({"data": block.to_rows()}).encode("utf-8")
+        elif self.format == "columnar":
+            body = json.dumps(to_columnar(block)).encode("utf-8")
+        else:
+            body = msgpack.packb(to_columnar(block))
+
+        headers = {"Content-Type": FORMATS[self.format]}
+        if self.compression:
+            body = compress(body, self.compression)
+            headers["Content-Encoding"] = self.compression
+        return body, headers
+
+    def negotiate(self, session, url, timeout=5.0):
+        """Pick the most compact encoding the endpoint advertises. Only runs once, for 'auto'."""
+        if self.negotiated:
+            return self.name
+        self.negotiated = True
+        try:
+            response = session.options(url, timeout=timeout)
+        except Exception:
+            return self.name
+
+        accept = [value.split(";")[0].strip().lower() for value in response.headers.get("Accept", "").split(",")]
+        accept_encoding = [value.split(";")[0].strip().lower() for value in response.headers.get("Accept-Encoding", "").split(",")]
+        for fmt in PREFERRED_FORMATS:
+            if FORMATS[fmt] in accept:
+                self.format = fmt
+                break
+        for compression in PREFERRED_COMPRESSIONS:
+            if compression in accept_encoding:
+                self.compression = compression
+                break
+        try:
+            _check_available(self.format, self.compression)
+        except ValueError:
+            if self.format == "columnar-msgpack" and msgpack is None:
+                self.format = "columnar" if COLUMNAR_JSON in accept else "rows"
+            if self.compression == "zstd" and zstandard is None:
+                self.compression = "gzip" if "gzip" in accept_encoding else None
+        return self.name
+
+    def fallback(self):
+        """Switch to plain row JSON. Returns False if already using it."""
+        if self.format == "rows" and self.compression is None:
+            return False
+        self.format, self.compression = "rows", None
+        return True
@@ -0,0 +1,251 @@
+import heapq
+import itertools
+import json
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from generator import BlockGenerator
+from speed_profile import SpeedProfile
+from summaries import SummarizingSink
+
+
+RUNNING = "running"
+COMPLETED = "completed"
+STOPPED = "stopped"
+
+
+class VirtualRig:
+    """One simulated rig in a fleet. It produces a whole chunk per wakeup instead of waking every tick.
+
+    With a numeric `speedup` the rig's virtual time runs that many times
+    faster than the wall clock; with "max" its chunks are due as soon as they
+    are rescheduled, so it fills whatever time real-time rigs leave idle.
+    """
+
+    def __init__(self, fleet, test_id, params, setpoints, sink, schema=None):
+        self.fleet = fleet
+        self.sink = sink
+        self.test_id = test_id
+        self.data_interval = params["data_interval"]
+        self.samples_per_chunk = max(1, round(params["send_interval"] / params["data_interval"]))
+        self.speedup = params.get("speedup")
+        self.setpoints = setpoints
+        self.generator = BlockGenerator(params["seed"], schema)
+        self.start = None
+        self.next_tick = 0
+
+    @property
+    def finished(self):
+        return self.next_tick >= len(self.setpoints)
+
+    @property
+    def chunk_period(self):
+        """Wall-clock seconds one chunk covers."""
+        if self.speedup == "max":
+            return 0.0
+        return self.samples_per_chunk * self.data_interval / 1000 / (self.speedup or 1)
+
+    def next_deadline(self, now):
+        """Monotonic time at which the last sample of the next chunk is taken."""
+        if self.speedup == "max":
+            return now
+        last_tick = min(self.next_tick + self.samples_per_chunk, len(self.setpoints)) - 1
+        return self.start + last_tick * self.data_interval / 1000 / (self.speedup or 1)
+
+    def close(self):
+        """Emit an empty final block so the rig's summarizing sink sends its open window."""
+        empty = np.empty(0, dtype=np.int64)
+        block = self.generator.generate(empty, np.empty(0), np.empty(0), empty)
+        return self.sink.submit(self.test_id, block, final=True)
+
+    def next_block(self):
+        end_tick = min(self.next_tick + self.samples_per_chunk, len(self.setpoints))
+        ticks = np.arange(self.next_tick, end_tick)
+        self.next_tick = end_tick
+        timestamps = (ticks * self.data_interval).astype(np.int64)
+        set_speed, response = self.setpoints.lookup(ticks)
+        return self.generator.generate(timestamps, set_speed, response, ticks)
+
+
+class Fleet:
+    """A group of virtual rigs started and stopped together."""
+
+    def __init__(self, id_prefix=""):
+        self.fleet_id = id_prefix + uuid.uuid4().hex
+        self.status = RUNNING
+        self.created_at = time.time()
+        self.finished_at = None
+        self.rig_count = 0
+        self.active_rigs = 0
+        self.chunks = 0
+        self.samples = 0
+        self.late_chunks = 0
+        self.max_lag_ms = 0.0
+        self.stop_event = threading.Event()
+
+    def to_dict(self):
+        return {
+            "fleet_id": self.fleet_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "rigs": self.rig_count,
+            "active_rigs": self.active_rigs,
+            "chunks": self.chunks,
+            "samples": self.samples,
+            "late_chunks": self.late_chunks,
+            "max_lag_ms": self.max_lag_ms
+        }
+
+
+class FleetScheduler:
+    """Drive any number of virtual rigs from a single thread.
+
+    Every rig has one entry in a timer heap keyed by the deadline of its
+    next chunk. The thread sleeps until the earliest deadline, generates
+    that rig's chunk as one block, hands it to the shared sink and pushes
+    the rig back with its following deadline. Chunks that are emitted late
+    still carry their nominal timestamps; the lag is reported per fleet.
+    Stopped rigs are closed on the same thread, so sinks are never called
+    concurrently for one rig.
+    """
+
+    def __init__(self, sink, logger, late_threshold_ms=50.0, time_source=time.monotonic, id_prefix="",
+                 summary_sink=None, schema=None, max_finished=100):
+        self._sink = sink
+        self._schema = schema
+        self._summary_sink = summary_sink
+        self._id_prefix = id_prefix
+        self._logger = logger
+        self._late_threshold = late_threshold_ms / 1000
+        self._time = time_source
+        self._heap = []
+        self._sequence = itertools.count()
+        self._fleets = {}
+        self._max_finished = max_finished
+        # Rigs of stopped fleets waiting for their final block
+        self._closing = []
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="fleet-scheduler", daemon=True)
+        self._thread.start()
+
+    def start(self, rigs, stagger=True):
+        """Start a fleet from a list of (test_id, params) pairs."""
+        fleet = Fleet(self._id_prefix)
+        # Rigs usually share a handful of profiles, so compile each distinct one once
+        compiled = {}
+        virtual_rigs = []
+        for test_id, params in rigs:
+            key = (json.dumps(params["profile"], sort_keys=True), params["data_interval"])
+            if key not in compiled:
+                compiled[key] = SpeedProfile.from_dict(params["profile"]).compile(params["data_interval"])
+            sink = self._sink
+            if params.get("summary_window_ms") and self._summary_sink is not None:
+                sink = SummarizingSink(sink, self._summary_sink, params["summary_window_ms"], params["raw_decimation"])
+            virtual_rigs.append(VirtualRig(fleet, test_id, params, compiled[key], sink, self._schema))
+        fleet.rig_count = fleet.active_rigs = len(virtual_rigs)
+
+        now = self._time()
+        with self._condition:
+            self._fleets[fleet.fleet_id] = fleet
+            self._prune()
+            for index, rig in enumerate(virtual_rigs):
+                # Spread rig start times over one chunk period so their wakeups don't coincide
+                offset = index / len(virtual_rigs) * rig.chunk_period if stagger else 0.0
+                rig.start = now + offset
+                heapq.heappush(self._heap, (rig.next_deadline(now), next(self._sequence), rig))
+            self._condition.notify()
+        return fleet
+
+    def get(self, fleet_id):
+        with self._condition:
+            return self._fleets.get(fleet_id)
+
+    def list(self):
+        with self._condition:
+            return list(self._fleets.values())
+
+    def stop(self, fleet_id):
+        with self._condition:
+            fleet = self._fleets.get(fleet_id)
+            if fleet is None:
+                return None
+            if fleet.status == RUNNING:
+                fleet.stop_event.set()
+                fleet.status = STOPPED
+                fleet.active_rigs = 0
+                fleet.finished_at = time.time()
+                # Drop the fleet's pending timers right away; the loop closes the rigs with open summary windows
+                self._closing.extend(entry[2] for entry in self._heap
+                                     if entry[2].fleet is fleet and isinstance(entry[2].sink, SummarizingSink))
+                self._heap = [entry for entry in self._heap if entry[2].fleet is not fleet]
+                heapq.heapify(self._heap)
+            self._condition.notify()
+        return fleet
+
+    def _prune(self):
+        # Keep the most recent finished fleets around for status queries
+        finished = [fleet_id for fleet_id, fleet in self._fleets.items() if fleet.status != RUNNING]
+        for fleet_id in finished[:max(0, len(finished) - self._max_finished)]:
+            del self._fleets[fleet_id]
+
+    def _close(self, rig):
+        try:
+            rig.close()
+        except Exception as e:
+            self._logger.error(f"Fleet {rig.fleet.fleet_id} rig {rig.test_id} failed to close: {str(e)}")
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while not self._heap and not self._closing:
+                    self._condition.wait()
+                closing, self._closing = self._closing, []
+            for rig in closing:
+                self._close(rig)
+
+            with self._condition:
+                if not self._heap:
+                    continue
+                deadline, _, rig = self._heap[0]
+                delay = deadline - self._time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+
+            fleet = rig.fleet
+            if fleet.stop_event.is_set():
+                continue
+
+            lag = self._time() - deadline
+            block = rig.next_block()
+            try:
+                rig.sink.submit(rig.test_id, block, final=rig.finished)
+            except Exception as e:
+                self._logger.error(f"Fleet {fleet.fleet_id} rig {rig.test_id} failed to emit a chunk: {str(e)}")
+
+            fleet.chunks += 1
+            fleet.samples += len(block)
+            # Rigs running at "max" have no schedule to fall behind
+            if rig.speedup != "max":
+                if lag > self._late_threshold:
+                    fleet.late_chunks += 1
+                if lag * 1000 > fleet.max_lag_ms:
+                    fleet.max_lag_ms = lag * 1000
+
+            with self._condition:
+                if fleet.stop_event.is_set():
+                    # Stopped while this chunk was being emitted
+                    if not rig.finished and isinstance(rig.sink, SummarizingSink):
+                        self._closing.append(rig)
+                elif not rig.finished:
+                    heapq.heappush(self._heap, (rig.next_deadline(self._time()), next(self._sequence), rig))
+                elif fleet.status == RUNNING:
+                    fleet.active_rigs -= 1
+                    if fleet.active_rigs == 0:
+                        fleet.status = COMPLETED
+                        fleet.finished_at = time.time()
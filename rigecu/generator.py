@@ -0,0 +1,83 @@
+import numpy as np
+
+from schema import load_schema
+
+
+DEFAULT_SCHEMA = load_schema()
+
+
+class SampleBlock:
+    """A chunk of sensor samples stored as struct-of-arrays.
+
+    `values` is one contiguous (channel, sample) float64 array with a row per
+    channel of `schema`, so blocks of hundreds of channels are generated,
+    sliced and encoded column by column without building a dict per sample.
+    """
+
+    def __init__(self, timestamps, values, set_speed, schema=DEFAULT_SCHEMA):
+        self.timestamps = timestamps
+        self.values = values
+        self.set_speed = set_speed
+        self.schema = schema
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def channel(self, name):
+        return self.values[self.schema.index[name]]
+
+    def take(self, indices):
+        """A new block with only the samples at `indices`."""
+        set_speed = self.set_speed if np.ndim(self.set_speed) == 0 else self.set_speed[indices]
+        return SampleBlock(self.timestamps[indices], self.values[:, indices], set_speed, self.schema)
+
+    def to_rows(self):
+        """Convert the block into the row-per-sample wire format."""
+        set_speeds = self.set_speed
+        if np.ndim(set_speeds) == 0:
+            set_speeds = [float(set_speeds)] * len(self)
+        else:
+            set_speeds = set_speeds.tolist()
+
+        nest = self.schema.nest
+        return [
+            {"timestamp": timestamp, **nest(sample), "set_speed": set_speed}
+            for timestamp, sample, set_speed in zip(self.timestamps.tolist(), self.values.T.tolist(), set_speeds)
+        ]
+
+
+class BlockGenerator:
+    """Generate whole blocks of ECU sensor samples from a seedable RNG.
+
+    A sample's noise depends only on the seed and its tick, so a run
+    reproduces exactly whatever chunks it is generated in.
+    """
+
+    def __init__(self, seed=None, schema=None):
+        self.seed = seed
+        self.schema = schema or DEFAULT_SCHEMA
+        self._streams = self.schema.noise_streams(seed)
+        # Last value of each slower-rate channel group, carried across blocks
+        self._held = {}
+        self._next_tick = 0
+
+    def generate(self, timestamps, set_speed, response=None, ticks=None):
+        """Generate one sample per timestamp.
+
+        set_speed is the commanded speed reported with each sample and may be a
+        scalar or one value per timestamp. Sensor values follow `response`, the
+        speed the rig has actually reached, which defaults to set_speed; each
+        channel's base value is its schema polynomial in that speed. `ticks`
+        are the samples' increasing indexes in the run; by default blocks
+        continue where the previous one ended.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if ticks is None:
+            ticks = np.arange(self._next_tick, self._next_tick + len(timestamps))
+        ticks = np.asarray(ticks, dtype=np.int64)
+        if len(ticks):
+            self._next_tick = int(ticks[-1]) + 1
+        speed = np.broadcast_to(np.asarray(set_speed if response is None else response, dtype=np.float64),
+                                (len(timestamps),))
+        values = self.schema.generate(self._streams, ticks, timestamps, speed, self._held)
+        return SampleBlock(timestamps, values, set_speed, self.schema)
@@ -1,24 +1,82 @@
 import os
-import datetime
-import json
-from flask import Flask, request, Response, redirect
+from flask import Flask, request, Response, redirect, jsonify
 from flasgger import Swagger
-from waitress import serve
-import time
 import random
-import requests
+import numpy as np
 from flask_cors import CORS
-from setup_logging import get_logger
+from setup_logging import get_logger, LazyJson
+from runs import RunScheduler, SchedulerFull
+from sample_clock import SampleClock, make_timer
+from generator import BlockGenerator
+from schema import load_schema
+from uploader import ChunkUploader
+from batching import AdaptiveBatcher
+from encoding import ChunkEncoder
+from speed_profile import SpeedProfile
+from stream import SampleStream, STREAM_FORMATS
+from sinks import FanoutSink, KafkaSink
+from fleet import FleetScheduler
+from replay import replay_recording
+from summaries import SummarizingSink
+from metrics import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE, merge
+import serving
 
 # for local dev, load env vars from a .env file
 from dotenv import load_dotenv
 load_dotenv()
 
+# With WEB_WORKERS > 1 this process only supervises the worker processes that run the code below
+if __name__ == '__main__':
+    serving.supervise(get_logger())
+
 service_url = os.environ["Quix__Deployment__Network__PublicUrl"]
 data_api_endpoint = os.getenv("data_api_endpoint", "")
+max_concurrent_runs = int(os.getenv("max_concurrent_runs", "32"))
+max_queued_runs = int(os.getenv("max_queued_runs", "64"))
+default_data_interval = float(os.getenv("data_interval_ms", "50"))  # Generate data every 50ms (20 Hz)
+default_send_interval = float(os.getenv("send_interval_ms", "200"))  # Send data every 200ms
+# adaptive: size HTTP chunks from the data API's round trips and backlog unless a run sets send_interval
+upload_batching = os.getenv("upload_batching", "adaptive")  # adaptive or fixed
+batch_min_samples = int(os.getenv("batch_min_samples", "1"))  # Chunks never shrink below send_interval_ms of samples either
+batch_max_samples = int(os.getenv("batch_max_samples", "5000"))
+batch_max_bytes = int(os.getenv("batch_max_bytes", "1000000"))
+batch_max_latency_ms = float(os.getenv("batch_max_latency_ms", "1000"))  # Longest a sample waits in a chunk
+upload_queue_size = int(os.getenv("upload_queue_size", "1000"))
+upload_backpressure = os.getenv("upload_backpressure", "block")  # drop, block or spill
+upload_spill_dir = os.getenv("upload_spill_dir", "/tmp/rigecu-spill")
+upload_max_retries = int(os.getenv("upload_max_retries", "3"))
+upload_timeout = float(os.getenv("upload_timeout", "10"))
+upload_workers = int(os.getenv("upload_workers", "2"))
+replay_dir = os.getenv("replay_dir", "recordings")  # Captures available to /ecu/replay
+max_fleet_rigs = int(os.getenv("max_fleet_rigs", "5000"))
+stream_buffer_blocks = int(os.getenv("stream_buffer_blocks", "50"))  # Chunks buffered per /ecu/stream client
+# Each open stream holds a waitress thread, so always leave threads for the other endpoints
+max_streams = serving.stream_limit(os.getenv("max_streams"))
+stream_retry_after = int(os.getenv("stream_retry_after", "5"))
+chunk_encoding = os.getenv("chunk_encoding", "rows")  # e.g. rows, columnar+gzip, columnar-msgpack+zstd or auto
+sink_names = os.getenv("sinks", "http")  # Comma-separated: http, kafka
+kafka_brokers = os.getenv("kafka_brokers", os.getenv("Quix__Broker__Address", "localhost:9092"))  # or file:///path for a file-backed fake
+kafka_topic = os.getenv("kafka_topic", "http-source")
+kafka_encoding = os.getenv("kafka_encoding", "columnar")
+kafka_linger_ms = int(os.getenv("kafka_linger_ms", "50"))
+kafka_batch_size = int(os.getenv("kafka_batch_size", "1000000"))
+kafka_compression = os.getenv("kafka_compression", "lz4")
+default_summary_window = float(os.getenv("summary_window_ms", "0"))  # e.g. 1000 for per-second summaries; 0 turns them off
+default_raw_decimation = int(os.getenv("raw_decimation", "1"))  # Keep every Nth raw sample when summarising; 0 sends none
+# Unset or empty: <data_api_endpoint>/summary and <kafka_topic>-summary
+summary_api_endpoint = os.getenv("summary_api_endpoint") or (f"{data_api_endpoint.rstrip('/')}/summary" if data_api_endpoint else "")
+kafka_summary_topic = os.getenv("kafka_summary_topic") or f"{kafka_topic}-summary"
+sensor_schema_path = os.getenv("sensor_schema", "")  # JSON channel definitions; empty for the built-in three-channel rig
 
 logger = get_logger()
 
+if serving.multi_process:
+    # Every worker process keeps its own spill file
+    upload_spill_dir = os.path.join(upload_spill_dir, f"worker-{serving.worker_index}")
+
+sensor_schema = load_schema(sensor_schema_path or None)
+logger.info(f"Sensor schema has {len(sensor_schema.names)} channels")
+
 app = Flask(__name__)
 
 # Enable CORS for all routes and origins by default
@@ -32,97 +90,510 @@ app.config['SWAGGER'] = {
 
 swagger = Swagger(app)
 
-def build_api_url(endpoint, test_id):
-    """Build the API URL by appending test_id to the endpoint, handling trailing slashes."""
-    if not endpoint:
-        return None
-    
-    # Remove trailing slash from endpoint if present
-    endpoint = endpoint.rstrip('/')
-    return f"{endpoint}/{test_id}"
+samples_generated = Counter("rigecu_samples_total", "Samples generated by runs")
+missed_ticks = Counter("rigecu_missed_ticks_total", "Sample ticks skipped because a run fell behind real time")
+chunk_samples = Histogram("rigecu_chunk_samples", "Samples per chunk emitted by runs",
+                          buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000))
+tick_lateness = Histogram("rigecu_tick_lateness_seconds", "Delay between a sample tick's deadline and when it ran",
+                          ("clock",), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+@app.before_request
+def route_to_owner():
+    # Runs and fleets live in the worker process that started them
+    view_args = request.view_args or {}
+    owner = serving.owner_of(view_args.get("run_id") or view_args.get("fleet_id") or "")
+    if owner is not None:
+        return serving.forward(request, owner)
 
 @app.route("/", methods=['GET'])
 def redirect_to_swagger():
     return redirect("/apidocs/")
 
-@app.route("/ecu/start", methods=['POST'])
-def post_data_without_key():
-    data = request.json
-    logger.debug(f"{data}")
+def run_test(run):
+    """Generate samples for a run and post them in chunks until its speed profile ends or the run is cancelled."""
+    test_id = run.test_id
+    data_interval = run.params["data_interval"]
+    send_interval = run.params["send_interval"]
+    generator = BlockGenerator(run.params["seed"], sensor_schema)
+    sink = run.sink or default_sink
+    # Streamed runs and runs with an explicit send_interval keep fixed chunks
+    chunk_batcher = None
+    if uploader is not None and run.sink is None and run.params.get("adaptive_batching"):
+        # Each run has its own batcher, sized for its sample rate
+        chunk_batcher = AdaptiveBatcher(
+            data_interval,
+            min_samples=min(batch_max_samples, max(batch_min_samples, round(send_interval / data_interval))),
+            max_samples=batch_max_samples,
+            max_bytes=batch_max_bytes,
+            max_latency_ms=batch_max_latency_ms,
+            backlog_threshold=upload_workers
+        )
+        # The run posts through its own handle on the uploader, which reports each attempt to this batcher
+        uploads = uploader.track(run.run_id, chunk_batcher)
+        sink = FanoutSink({name: uploads if each is uploader else each for name, each in default_sink.sinks.items()})
+    if run.params.get("summary_window_ms"):
+        # Streamed runs carry their summaries in the same response as the raw samples
+        sink = SummarizingSink(sink, run.sink or summary_sink, run.params["summary_window_ms"],
+                               run.params["raw_decimation"])
+
+    # The trajectory is sampled lazily, a block of ticks at a time; each chunk only indexes into it
+    setpoints = SpeedProfile.from_dict(run.params["profile"]).compile(data_interval)
+    last_tick = len(setpoints) - 1
+    sent_final = False
+
+    def flush(chunk_ticks, final=False):
+        nonlocal sent_final
+        ticks = np.asarray(chunk_ticks, dtype=np.int64)
+        timestamps = (ticks * data_interval).astype(np.int64)  # Milliseconds since the start of the run
+        set_speed, response = setpoints.lookup(ticks)
+        sink.submit(test_id, generator.generate(timestamps, set_speed, response, ticks), final=final)
+        sent_final = final
+        if len(ticks):
+            samples_generated.inc(len(ticks))
+            chunk_samples.observe(len(ticks))
+
+    # Samples are taken on a fixed tick grid and grouped into chunks of
+    # send_interval, so chunk boundaries stay aligned even after missed ticks.
+    # Each tick only records its index; values are generated per chunk.
+    timer = make_timer(run.params.get("speedup"))
+    clock = SampleClock(data_interval, timer, tick_limit=len(setpoints))
+    lateness = tick_lateness.labels("real" if timer.skip_missed else "virtual")
+    reported_missed = 0
+    samples_per_chunk = max(1, round(send_interval / data_interval))
+    run.stats = clock.stats()
+
+    try:
+        chunk_ticks = []
+        chunk_index = 0
+
+        while True:
+            tick = clock.wait_next(run.cancel_event)
+            if tick is None:
+                break
+            lateness.observe(clock.last_lateness)
+            if clock.missed_ticks != reported_missed:
+                missed_ticks.inc(clock.missed_ticks - reported_missed)
+                reported_missed = clock.missed_ticks
+
+            if chunk_batcher is not None:
+                chunk_ticks.append(tick)
+                if tick == last_tick or len(chunk_ticks) >= chunk_batcher.chunk_samples():
+                    flush(chunk_ticks, final=tick == last_tick)
+                    chunk_ticks = []
+                    run.stats = clock.stats()
+                continue
+
+            if chunk_ticks and tick // samples_per_chunk != chunk_index:
+                flush(chunk_ticks)
+                chunk_ticks = []
+            chunk_index = tick // samples_per_chunk
+
+            chunk_ticks.append(tick)
+
+            # Send chunk once the last tick of its send_interval has been sampled
+            if (tick + 1) % samples_per_chunk == 0 or tick == last_tick:
+                flush(chunk_ticks, final=tick == last_tick)
+                chunk_ticks = []
+                run.stats = clock.stats()
+
+        # Send any remaining data in the final chunk. A run that was cancelled
+        # between chunks still closes its last summary window with an empty one.
+        if chunk_ticks or (not sent_final and isinstance(sink, SummarizingSink)):
+            flush(chunk_ticks, final=True)
+    finally:
+        if chunk_batcher is not None:
+            uploader.untrack(run.run_id)
+    if run.sink is not None:
+        run.sink.close()
+
+    run.stats = clock.stats()
+    if clock.missed_ticks:
+        logger.warning(f"Run {run.run_id} for {test_id} missed {clock.missed_ticks} of {clock.ticks + clock.missed_ticks} ticks")
+
+def build_sinks(endpoint, topic, spill_dir):
+    """Create the sinks named in the `sinks` setting."""
+    sinks = {}
+    for name in [name.strip() for name in sink_names.split(",") if name.strip()]:
+        if name == "http":
+            sinks[name] = ChunkUploader(
+                endpoint,
+                logger,
+                encoder=ChunkEncoder(chunk_encoding),
+                max_queue=upload_queue_size,
+                backpressure=upload_backpressure,
+                spill_dir=spill_dir,
+                max_retries=upload_max_retries,
+                timeout=upload_timeout,
+                workers=upload_workers
+            )
+        elif name == "kafka":
+            sinks[name] = KafkaSink(
+                kafka_brokers,
+                topic,
+                logger,
+                encoder=ChunkEncoder(kafka_encoding),
+                linger_ms=kafka_linger_ms,
+                batch_size=kafka_batch_size,
+                compression=kafka_compression
+            )
+        else:
+            raise ValueError(f"Unknown sink '{name}', expected http or kafka")
+    return sinks
+
+if upload_batching not in ("adaptive", "fixed"):
+    raise ValueError(f"upload_batching must be adaptive or fixed, not '{upload_batching}'")
+
+default_sink = FanoutSink(build_sinks(data_api_endpoint, kafka_topic, upload_spill_dir))
+uploader = default_sink.sinks.get("http")
+# Window summaries go to their own endpoint and topic
+summary_sink = FanoutSink(build_sinks(summary_api_endpoint, kafka_summary_topic,
+                                      os.path.join(upload_spill_dir, "summary")))
+
+stream_slots = serving.StreamSlots(max_streams)
+
+scheduler = RunScheduler(run_test, logger, max_workers=max_concurrent_runs, max_pending=max_queued_runs,
+                         id_prefix=serving.id_prefix())
+
+# Fleet rigs all run on one thread and share the default sink
+fleet_scheduler = FleetScheduler(default_sink, logger, id_prefix=serving.id_prefix(), summary_sink=summary_sink,
+                                 schema=sensor_schema)
+
+def replay_test(run):
+    """Re-emit a recorded capture under the run's test_id."""
+    sink = run.sink or default_sink
+    replay_recording(
+        run.params["path"],
+        run.test_id,
+        sink,
+        run.params["send_interval"],
+        make_timer(run.params["speedup"]),
+        run.cancel_event,
+        stats=run.stats
+    )
+    if run.sink is not None:
+        run.sink.close()
+    logger.info(f"Replayed {run.stats['samples']} samples from {run.params['file']} as {run.test_id}")
+
+def parse_run_params(data):
+    """Validate an /ecu/start or /ecu/stream body into run params. Raises ValueError, TypeError, KeyError or ZeroDivisionError."""
+    ramp_delay = int(data.get("ramp_delay", 6000))  # Default to 6000ms if not provided
+    # Defaults to holding set_speed (0.5 if not provided) for ramp_delay
+    profile = SpeedProfile.from_request(data, ramp_delay)
+    params = {
+        "ramp_delay": ramp_delay,
+        "profile": profile.to_dict(),
+        "send_interval": float(data.get("send_interval", default_send_interval)),
+        "adaptive_batching": upload_batching == "adaptive" and "send_interval" not in data
+    }
+    if "sample_rate_hz" in data:
+        params["data_interval"] = 1000 / float(data["sample_rate_hz"])
+    else:
+        params["data_interval"] = float(data.get("data_interval", default_data_interval))
+    if params["data_interval"] <= 0 or params["send_interval"] < params["data_interval"]:
+        raise ValueError("data_interval must be positive and no larger than send_interval")
+    # Time compression for offline generation: a factor such as 100, or "max" for as fast as possible
+    speedup = data.get("speedup")
+    if speedup is not None and speedup != "max":
+        speedup = float(speedup)
+        if speedup <= 0:
+            raise ValueError("speedup must be positive or \"max\"")
+    params["speedup"] = speedup
+    # Per-window min/max/mean/RMS summaries, with the raw stream thinned to every Nth sample
+    params["summary_window_ms"] = float(data.get("summary_window_ms", default_summary_window))
+    params["raw_decimation"] = int(data.get("raw_decimation", default_raw_decimation))
+    if params["summary_window_ms"] < 0 or params["raw_decimation"] < 0:
+        raise ValueError("summary_window_ms and raw_decimation must not be negative")
+    if params["summary_window_ms"] and params["summary_window_ms"] < params["data_interval"]:
+        raise ValueError("summary_window_ms must be at least data_interval")
+    if params["raw_decimation"] != 1 and not params["summary_window_ms"]:
+        raise ValueError("raw_decimation requires summary_window_ms")
+    # Record the seed so any run can be reproduced exactly
+    params["seed"] = int(data["seed"]) if data.get("seed") is not None else random.getrandbits(32)
+    return params
+
+def submit_run(sink=None):
+    """Parse the request body and queue a run. Returns (run, None) or (None, error response)."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, (jsonify({"error": "Request body must be a JSON object"}), 400)
+    logger.debug("%s", LazyJson(data))
 
     # Extract test_id and ramp_delay from the request
     test_id = data.get("test_id")
-    ramp_delay = int(data.get("ramp_delay", 6000))  # Default to 6000ms if not provided
+    try:
+        params = parse_run_params(data)
+    except (TypeError, ValueError, KeyError, ZeroDivisionError) as e:
+        return None, (jsonify({"error": f"Invalid run parameters: {str(e)}"}), 400)
+
+    try:
+        run = scheduler.submit(test_id, params, sink=sink)
+    except SchedulerFull as e:
+        logger.warning(f"Rejected run for {test_id}: {str(e)}")
+        return None, (jsonify({"error": "Too many runs in progress, try again later"}), 503)
 
-    set_speed = float(data.get("set_speed", 0.5))  # Default to 0.5 if not provided
-    start_time = time.time() * 1000  # Start time in milliseconds
-
-    def generate_data():
-        # Calculate values based on set_speed
-        base_voltage = 14.9 - (set_speed * 1.6)
-        base_current = 8000 + (set_speed * 6000)
-        base_load_cell = -140000 + (set_speed * 10000)
-
-        # Generate fluctuating values
-        voltage_v = base_voltage + random.uniform(-0.1, 0.1)
-        current_ma = base_current + random.uniform(-500, 500)
-        load_cell_raw_value = base_load_cell + random.uniform(-5000, 5000)
-
-        # Current timestamp in milliseconds
-        timestamp = int(time.time() * 1000 - start_time)
-
-        return {
-            "timestamp": timestamp,
-            "ina260": {
-                "voltage_v": voltage_v,
-                "current_ma": current_ma
-            },
-            "load_cell": {
-                "raw_value": load_cell_raw_value,
-                "is_ready": True
-            },
-            "set_speed": set_speed
+    logger.info(f"Queued run {run.run_id} for {test_id}")
+    return run, None
+
+@app.route("/ecu/start", methods=['POST'])
+def post_data_without_key():
+    run, error = submit_run()
+    if error:
+        return error
+
+    response = jsonify(run.to_dict())
+    response.status_code = 202
+    response.headers["Location"] = f"/ecu/runs/{run.run_id}"
+    return response
+
+@app.route("/ecu/stream", methods=['POST'])
+def stream_samples():
+    """Run a test and stream its samples in the response body instead of posting them to the data API."""
+    stream_format = request.args.get("format")
+    if stream_format is None:
+        stream_format = "sse" if "text/event-stream" in request.headers.get("Accept", "") else "ndjson"
+    if stream_format not in STREAM_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(STREAM_FORMATS)}"}), 400
+    mimetype, format_block = STREAM_FORMATS[stream_format]
+
+    slot = stream_slots.acquire()
+    if slot is None:
+        response = jsonify({"error": f"All {max_streams} streams are in use, try again later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(stream_retry_after)
+        return response
+
+    stream = SampleStream(max_blocks=stream_buffer_blocks)
+    run, error = submit_run(sink=stream)
+    if error:
+        slot.release()
+        return error
+
+    def generate():
+        sequence = 0
+        try:
+            while not stream.exhausted:
+                block = stream.get(timeout=1.0)
+                if block is not None:
+                    yield format_block(block, sequence)
+                    sequence += 1
+                elif run.finished:
+                    break
+        finally:
+            # The client went away or the run ended; either way stop producing samples
+            scheduler.cancel(run.run_id)
+            if stream.dropped_blocks:
+                logger.warning(f"Stream for run {run.run_id} dropped {stream.dropped_samples} samples for a slow client")
+
+    response = Response(generate(), mimetype=mimetype)
+    # Called once the response is closed, whether or not the client ever read it
+    response.call_on_close(slot.release)
+    response.headers["X-Run-Id"] = run.run_id
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/ecu/runs", methods=['GET'])
+def list_runs():
+    runs = [run.to_dict() for run in scheduler.list()]
+    for peer_runs in serving.gather(request, "/ecu/runs"):
+        runs.extend(peer_runs)
+    return jsonify(runs), 200
+
+@app.route("/ecu/runs/<run_id>", methods=['GET'])
+def get_run(run_id):
+    run = scheduler.get(run_id)
+    if run is None:
+        return jsonify({"error": f"Run {run_id} not found"}), 404
+    return jsonify(run.to_dict()), 200
+
+@app.route("/ecu/runs/<run_id>", methods=['DELETE'])
+def cancel_run(run_id):
+    run = scheduler.cancel(run_id)
+    if run is None:
+        return jsonify({"error": f"Run {run_id} not found"}), 404
+    logger.info(f"Cancel requested for run {run_id} ({run.test_id})")
+    return jsonify(run.to_dict()), 202
+
+@app.route("/ecu/replay", methods=['POST'])
+def start_replay():
+    """Replay a capture from replay_dir to the sinks as a new run.
+
+    Body: {"test_id", "file", "speedup" (factor or "max", default real time), "send_interval"}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get("file"):
+        return jsonify({"error": "Request body must be a JSON object with a 'file'"}), 400
+
+    # Only files inside replay_dir may be replayed
+    root = os.path.realpath(replay_dir)
+    path = os.path.realpath(os.path.join(root, data["file"]))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return jsonify({"error": f"Capture {data['file']} not found"}), 404
+
+    try:
+        speedup = data.get("speedup")
+        if speedup is not None and speedup != "max":
+            speedup = float(speedup)
+            if speedup <= 0:
+                raise ValueError("speedup must be positive or \"max\"")
+        params = {
+            "file": data["file"],
+            "path": path,
+            "speedup": speedup,
+            "send_interval": float(data.get("send_interval", default_send_interval))
         }
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid replay parameters: {str(e)}"}), 400
+
+    test_id = data.get("test_id")
+    try:
+        run = scheduler.submit(test_id, params, target=replay_test)
+    except SchedulerFull as e:
+        logger.warning(f"Rejected replay for {test_id}: {str(e)}")
+        return jsonify({"error": "Too many runs in progress, try again later"}), 503
 
-    # Generate data every 50ms and send chunks every 200ms
-    data_interval = 50  # Generate data every 50ms
-    send_interval = 200  # Send data every 200ms
-    end_time = start_time + ramp_delay
-
-    data_chunk = []
-    last_send_time = time.time() * 1000
-
-    while time.time() * 1000 < end_time:
-        current_time = time.time() * 1000
-
-        # Generate and accumulate data
-        data_to_chunk = generate_data()
-        data_chunk.append(data_to_chunk)
-
-        # Send chunk if send_interval has elapsed
-        if current_time - last_send_time >= send_interval:
-            if data_api_endpoint != "":
-                api_url = build_api_url(data_api_endpoint, test_id)
-                response = requests.post(api_url, json={"data": data_chunk})
-                logger.debug(f"Sent chunk with {len(data_chunk)} items, Response: {response.status_code}")
-            else:
-                logger.debug(f"Sent chunk: {test_id} :: {len(data_chunk)} items, Response: Not sent (no endpoint configured)")
-            
-            data_chunk = []
-            last_send_time = current_time
-
-        time.sleep(data_interval / 1000)  # Convert milliseconds to seconds
-
-    # Send any remaining data in the final chunk
-    if data_chunk:
-        if data_api_endpoint != "":
-            api_url = build_api_url(data_api_endpoint, test_id)
-            response = requests.post(api_url, json={"data": data_chunk})
-            logger.debug(f"Sent final chunk with {len(data_chunk)} items, Response: {response.status_code}")
+    logger.info(f"Queued replay {run.run_id} of {data['file']} as {test_id}")
+    response = jsonify(run.to_dict())
+    response.status_code = 202
+    response.headers["Location"] = f"/ecu/runs/{run.run_id}"
+    return response
+
+@app.route("/ecu/replay/files", methods=['GET'])
+def list_replay_files():
+    if not os.path.isdir(replay_dir):
+        return jsonify([]), 200
+    files = []
+    for directory, _, names in os.walk(replay_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            files.append({"file": os.path.relpath(path, replay_dir), "size": os.path.getsize(path)})
+    return jsonify(sorted(files, key=lambda entry: entry["file"])), 200
+
+@app.route("/ecu/schema", methods=['GET'])
+def get_schema():
+    """The channels every run reports, with their units, generation parameters and summary names."""
+    return jsonify({**sensor_schema.to_dict(), "summary_channels": list(sensor_schema.summary_names)}), 200
+
+@app.route("/ecu/fleet", methods=['POST'])
+def start_fleet():
+    """Start a fleet of virtual rigs on the shared fleet scheduler.
+
+    "rigs" is either a list of /ecu/start bodies, one per rig, or a count. With
+    a count, every rig uses the rest of the body as its parameters, gets the
+    test ID "<test_id_prefix>-NNN", and, if "speed_range" ([min, max] throttle
+    %) is given, a set speed spread evenly across that range. "speedup" works
+    as for /ecu/start; rigs at "max" use the time real-time rigs leave idle.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "rigs" not in data:
+        return jsonify({"error": "Request body must be a JSON object with a 'rigs' count or list"}), 400
+
+    try:
+        if isinstance(data["rigs"], list):
+            rig_bodies = data["rigs"]
         else:
-            logger.debug(f"Sent final chunk: {test_id} :: {len(data_chunk)} items, Response: Not sent (no endpoint configured)")
+            count = int(data["rigs"])
+            prefix = data.get("test_id_prefix", "FLEET")
+            speed_range = data.get("speed_range")
+            base = {key: value for key, value in data.items() if key not in ("rigs", "test_id_prefix", "speed_range")}
+            rig_bodies = []
+            for index in range(count):
+                body = dict(base, test_id=f"{prefix}-{index + 1:03d}")
+                if speed_range:
+                    low, high = (float(value) for value in speed_range)
+                    body["set_speed"] = (low + (high - low) * index / max(1, count - 1)) / 100
+                rig_bodies.append(body)
+        if not 0 < len(rig_bodies) <= max_fleet_rigs:
+            raise ValueError(f"A fleet must have between 1 and {max_fleet_rigs} rigs")
+        rigs = [(body.get("test_id"), parse_run_params(body)) for body in rig_bodies]
+    except (TypeError, ValueError, KeyError, ZeroDivisionError, AttributeError) as e:
+        return jsonify({"error": f"Invalid fleet parameters: {str(e)}"}), 400
+
+    fleet = fleet_scheduler.start(rigs)
+    logger.info(f"Started fleet {fleet.fleet_id} with {fleet.rig_count} rigs")
+    response = jsonify(fleet.to_dict())
+    response.status_code = 202
+    response.headers["Location"] = f"/ecu/fleet/{fleet.fleet_id}"
+    return response
+
+@app.route("/ecu/fleet", methods=['GET'])
+def list_fleets():
+    fleets = [fleet.to_dict() for fleet in fleet_scheduler.list()]
+    for peer_fleets in serving.gather(request, "/ecu/fleet"):
+        fleets.extend(peer_fleets)
+    return jsonify(fleets), 200
+
+@app.route("/ecu/fleet/<fleet_id>", methods=['GET'])
+def get_fleet(fleet_id):
+    fleet = fleet_scheduler.get(fleet_id)
+    if fleet is None:
+        return jsonify({"error": f"Fleet {fleet_id} not found"}), 404
+    return jsonify(fleet.to_dict()), 200
+
+@app.route("/ecu/fleet/<fleet_id>", methods=['DELETE'])
+def stop_fleet(fleet_id):
+    fleet = fleet_scheduler.stop(fleet_id)
+    if fleet is None:
+        return jsonify({"error": f"Fleet {fleet_id} not found"}), 404
+    logger.info(f"Stopped fleet {fleet_id}")
+    return jsonify(fleet.to_dict()), 200
+
+@app.route("/ecu/uploader", methods=['GET'])
+def uploader_stats():
+    if uploader is None:
+        return jsonify({"error": "The http sink is not enabled"}), 404
+    return jsonify(uploader.stats()), 200
+
+@app.route("/ecu/sinks", methods=['GET'])
+def sink_stats():
+    return jsonify({**default_sink.stats(), "summary": summary_sink.stats()}), 200
+
+def count_runs():
+    counts = {(status,): 0 for status in ("queued", "running")}
+    for run in scheduler.list():
+        if run.status in ("queued", "running"):
+            counts[(run.status,)] += 1
+    return counts
+
+def mean_batch_target():
+    targets = uploader.batch_targets() if uploader is not None else []
+    return sum(targets) / len(targets) if targets else 0
+
+def sink_counters():
+    return {
+        (prefix + sink, name): value
+        for prefix, fanout in (("", default_sink), ("summary-", summary_sink))
+        for sink, stats in fanout.stats().items()
+        for name, value in stats.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and name != "queued"
+    }
+
+Gauge("rigecu_runs", "Runs waiting for or holding a worker", count_runs, ("status",))
+Gauge("rigecu_open_streams", "Responses of /ecu/stream in progress", lambda: stream_slots.in_use)
+Gauge("rigecu_fleet_active_rigs", "Virtual rigs still emitting across all fleets",
+      lambda: sum(fleet.active_rigs for fleet in fleet_scheduler.list()))
+Gauge("rigecu_sink_chunks_total", "Chunk outcomes per sink (sent, failed, dropped, spilled, ...)", sink_counters,
+      ("sink", "event"), kind="counter")
+Gauge("rigecu_batch_target_samples", "Mean adaptive chunk size target of runs uploading over HTTP", mean_batch_target)
+Gauge("rigecu_upload_queue_depth", "Chunks waiting in the HTTP upload queue",
+      lambda: uploader.stats()["queued"] if uploader is not None else 0)
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    if not serving.multi_process:
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+    # Each worker's series carry a worker label; any worker answers for all of them
+    text = REGISTRY.render({"worker": serving.worker_index})
+    return Response(merge([text] + serving.gather(request, "/metrics")), content_type=CONTENT_TYPE)
 
-    return Response(status=200)
+def shutdown():
+    """Finish in-flight work before the process exits."""
+    # Runs get the shutdown timeout to finish before they are cancelled
+    scheduler.shutdown(serving.shutdown_timeout)
+    for fleet in fleet_scheduler.list():
+        fleet_scheduler.stop(fleet.fleet_id)
+    default_sink.close()
+    summary_sink.close()
 
 if __name__ == '__main__':
-    serve(app, host="0.0.0.0", port=80)
\ No newline at end of file
+    serving.serve(app, logger, on_shutdown=shutdown)
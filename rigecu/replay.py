@@ -0,0 +1,256 @@
+"""Replay recorded rig captures through the rigecu sinks.
+
+Two capture formats are supported, both read through mmap so multi-GB
+files are never loaded into memory:
+
+- JSON: chunks in the `{"data": [...]}` shape (as in sample.data, one per
+  line or pretty-printed and concatenated) or one sample object per line.
+  Large `data` arrays are parsed element by element.
+- Binary (.rsim): the RIGSIM01 magic followed by fixed-size little-endian
+  records (see RECORD_DTYPE), read as a numpy memmap.
+
+Convert a JSON capture to binary with:
+
+    python replay.py convert capture.ndjson capture.rsim
+"""
+import codecs
+import json
+import mmap
+import os
+import re
+import sys
+
+import numpy as np
+
+from generator import SampleBlock, DEFAULT_SCHEMA
+
+
+BINARY_MAGIC = b"RIGSIM01"
+BINARY_SUFFIX = ".rsim"
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"),
+    ("voltage_v", "<f8"),
+    ("current_ma", "<f8"),
+    ("raw_value", "<f8"),
+    ("set_speed", "<f8")
+])
+
+_DATA_ARRAY_START = re.compile(r'\{\s*"data"\s*:\s*\[')
+_WHITESPACE = " \t\r\n"
+
+
+class _JsonStream:
+    """Incremental reader of JSON values from a memory-mapped file."""
+
+    def __init__(self, mm, window):
+        self._mm = mm
+        self._window = window
+        self._offset = 0
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+
+    @property
+    def at_eof(self):
+        return self._offset >= len(self._mm)
+
+    def fill(self):
+        """Append the next window of the file to the buffer. Returns False at end of file."""
+        if self.at_eof:
+            return False
+        data = self._mm[self._offset:self._offset + self._window]
+        self._offset += len(data)
+        self.buf = self.buf[self.pos:] + self._text.decode(data, final=self.at_eof)
+        self.pos = 0
+        return True
+
+    def skip(self, characters):
+        """Skip the given characters; returns the next character or None at end of file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in characters:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def lookahead(self, size):
+        while len(self.buf) - self.pos < size and self.fill():
+            pass
+        return self.buf[self.pos:self.pos + size]
+
+    def decode(self):
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self.fill():
+                    continue
+                raise ValueError(f"Malformed JSON in capture: {str(e)}")
+            # A number cut off at the end of the window would still parse, so read on
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_rows(path, window=1 << 20):
+    """Yield sample rows from a JSON capture without reading it into memory."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            stream = _JsonStream(mm, window)
+            in_data_array = False
+            while True:
+                char = stream.skip(_WHITESPACE + ("," if in_data_array else ""))
+                if char is None:
+                    return
+                if in_data_array:
+                    if char == "]":
+                        # End of the data array: consume the rest of its wrapper object
+                        stream.pos += 1
+                        if stream.skip(_WHITESPACE) == "}":
+                            stream.pos += 1
+                        in_data_array = False
+                        continue
+                    yield stream.decode()
+                    continue
+                match = _DATA_ARRAY_START.match(stream.lookahead(64)) if char == "{" else None
+                if match:
+                    stream.pos += match.end()
+                    in_data_array = True
+                    continue
+                value = stream.decode()
+                if isinstance(value, dict) and "data" in value:
+                    yield from value["data"]
+                elif isinstance(value, dict):
+                    yield value
+
+
+def rows_to_records(rows):
+    records = np.empty(len(rows), dtype=RECORD_DTYPE)
+    for index, row in enumerate(rows):
+        records[index] = (
+            row["timestamp"],
+            row["ina260"]["voltage_v"],
+            row["ina260"]["current_ma"],
+            row["load_cell"]["raw_value"],
+            row.get("set_speed", 0.0)
+        )
+    return records
+
+
+def convert_to_binary(source, destination, batch_size=100000):
+    """Convert a JSON capture into the binary replay format. Returns the number of samples written."""
+    count = 0
+    with open(destination, "wb") as out:
+        out.write(BINARY_MAGIC)
+        batch = []
+        for row in iter_json_rows(source):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                out.write(rows_to_records(batch).tobytes())
+                count += len(batch)
+                batch = []
+        if batch:
+            out.write(rows_to_records(batch).tobytes())
+            count += len(batch)
+    return count
+
+
+def _records_to_block(records, offset):
+    # Captures hold the channels of the built-in schema, in its order
+    return SampleBlock(
+        np.asarray(records["timestamp"]) - offset,
+        np.vstack([records["voltage_v"], records["current_ma"], records["raw_value"]]),
+        np.asarray(records["set_speed"]),
+        DEFAULT_SCHEMA
+    )
+
+
+def iter_binary_blocks(path, send_interval):
+    size = os.path.getsize(path)
+    if size <= len(BINARY_MAGIC):
+        return
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a rigecu binary capture")
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=len(BINARY_MAGIC),
+                        shape=((size - len(BINARY_MAGIC)) // RECORD_DTYPE.itemsize,))
+    timestamps = records["timestamp"]
+    origin = int(timestamps[0])
+    start = 0
+    while start < len(records):
+        # Timestamps are sorted, so each send_interval window is found by binary search
+        end = int(np.searchsorted(timestamps, timestamps[start] + send_interval, side="left"))
+        end = max(end, start + 1)
+        yield _records_to_block(records[start:end], origin)
+        start = end
+
+
+def iter_json_blocks(path, send_interval, batch_limit=10000):
+    rows = []
+    origin = window_start = None
+    for row in iter_json_rows(path):
+        timestamp = row["timestamp"]
+        if origin is None:
+            origin = window_start = timestamp
+        if rows and (timestamp >= window_start + send_interval or len(rows) >= batch_limit):
+            yield _records_to_block(rows_to_records(rows), origin)
+            rows = []
+            window_start = timestamp
+        rows.append(row)
+    if rows:
+        yield _records_to_block(rows_to_records(rows), origin)
+
+
+def iter_blocks(path, send_interval):
+    """Yield SampleBlocks covering send_interval ms each, with timestamps rebased to start at 0."""
+    if path.endswith(BINARY_SUFFIX):
+        return iter_binary_blocks(path, send_interval)
+    return iter_json_blocks(path, send_interval)
+
+
+def replay_recording(path, test_id, sink, send_interval, timer, cancel_event=None, stats=None):
+    """Re-emit a capture to `sink` under a new test_id, paced by `timer`.
+
+    Progress is kept in `stats` (updated in place while replaying) and returned.
+    """
+    start = timer.now()
+    stats = {} if stats is None else stats
+    stats.update(chunks=0, samples=0, max_lag_ms=0.0)
+    block = None
+    for next_block in iter_blocks(path, send_interval):
+        if block is not None:
+            sink.submit(test_id, block)
+            stats["chunks"] += 1
+            stats["samples"] += len(block)
+        block = next_block
+
+        # Emit each chunk once the time of its last sample has been reached
+        due = start + int(block.timestamps[-1]) / 1000
+        remaining = due - timer.now()
+        if remaining > 0:
+            if timer.wait(remaining, cancel_event):
+                return stats
+        else:
+            stats["max_lag_ms"] = max(stats["max_lag_ms"], -remaining * 1000)
+        if cancel_event is not None and cancel_event.is_set():
+            return stats
+
+    if block is not None:
+        sink.submit(test_id, block, final=True)
+        stats["chunks"] += 1
+        stats["samples"] += len(block)
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "convert":
+        print("usage: python replay.py convert <capture.json|ndjson> <capture.rsim>")
+        sys.exit(2)
+    written = convert_to_binary(sys.argv[2], sys.argv[3])
+    print(f"Wrote {written} samples to {sys.argv[3]}")
@@ -0,0 +1,156 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, CANCELLED, FAILED)
+
+
+class SchedulerFull(Exception):
+    """Raised when the scheduler already holds the maximum number of runs."""
+
+
+class Run:
+    """State of a single ECU test run."""
+
+    def __init__(self, test_id, params, sink=None, id_prefix=""):
+        self.run_id = id_prefix + uuid.uuid4().hex
+        self.test_id = test_id
+        self.params = params
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.stats = {}
+        self.sink = sink
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "test_id": self.test_id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "stats": self.stats
+        }
+
+
+class RunScheduler:
+    """Execute runs on a bounded pool of background threads.
+
+    `target` (or the per-run target passed to submit) is called with the Run
+    and is expected to return early once `run.cancelled` becomes true.
+    """
+
+    def __init__(self, target, logger, max_workers=32, max_pending=64, max_finished=1000, id_prefix=""):
+        self._target = target
+        self._id_prefix = id_prefix
+        self._logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ecu-run")
+        self._max_active = max_workers + max_pending
+        self._max_finished = max_finished
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+        self._closing = False
+
+    def submit(self, test_id, params, sink=None, target=None):
+        with self._lock:
+            if self._closing:
+                raise SchedulerFull("Shutting down")
+            active = sum(1 for run in self._runs.values() if not run.finished)
+            if active >= self._max_active:
+                raise SchedulerFull(f"{active} runs already queued or running")
+            run = Run(test_id, params, sink=sink, id_prefix=self._id_prefix)
+            run.target = target or self._target
+            self._runs[run.run_id] = run
+            self._prune()
+        self._executor.submit(self._execute, run)
+        return run
+
+    def get(self, run_id):
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._runs.values())
+
+    def cancel(self, run_id):
+        run = self.get(run_id)
+        if run is None:
+            return None
+        run.cancel_event.set()
+        with self._lock:
+            # Runs still waiting for a worker never start
+            if run.status == QUEUED:
+                run.status = CANCELLED
+                run.finished_at = time.time()
+                run.done_event.set()
+        return run
+
+    def shutdown(self, timeout=0.0):
+        """Refuse new runs, give running ones up to `timeout` seconds to finish, then cancel the rest."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closing = True
+            queued = [run.run_id for run in self._runs.values() if run.status == QUEUED]
+        for run_id in queued:
+            self.cancel(run_id)
+        running = [run for run in self.list() if not run.finished]
+        if running:
+            self._logger.info(f"Waiting up to {timeout:g}s for {len(running)} runs to finish")
+        for run in running:
+            if not run.done_event.wait(max(0.0, deadline - time.monotonic())):
+                break
+        unfinished = [run for run in running if not run.done_event.is_set()]
+        if unfinished:
+            self._logger.warning(f"Cancelling {len(unfinished)} runs still in progress after {timeout:g}s")
+        for run in unfinished:
+            run.cancel_event.set()
+        self._executor.shutdown(wait=True)
+
+    def _execute(self, run):
+        with self._lock:
+            if run.status != QUEUED:
+                return
+            run.status = RUNNING
+            run.started_at = time.time()
+        try:
+            run.target(run)
+            status = CANCELLED if run.cancelled else COMPLETED
+        except Exception as e:
+            self._logger.error(f"Run {run.run_id} for {run.test_id} failed: {str(e)}")
+            run.error = str(e)
+            status = FAILED
+        with self._lock:
+            run.status = status
+            run.finished_at = time.time()
+        run.done_event.set()
+
+    def _prune(self):
+        # Keep the most recent finished runs around for status queries
+        finished = [run_id for run_id, run in self._runs.items() if run.finished]
+        for run_id in finished[:max(0, len(finished) - self._max_finished)]:
+            del self._runs[run_id]
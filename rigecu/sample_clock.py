@@ -0,0 +1,143 @@
+import time
+
+
+class RealTimer:
+    """Wall-clock time source for SampleClock."""
+
+    # Ticks that are already a period overdue are skipped to hold the real-time rate
+    skip_missed = True
+
+    def now(self):
+        return time.monotonic()
+
+    def wait(self, seconds, cancel_event=None):
+        """Wait for `seconds`; returns True if cancel_event was set."""
+        if cancel_event is not None:
+            return cancel_event.wait(seconds)
+        time.sleep(seconds)
+        return False
+
+
+class VirtualTimer:
+    """Scaled time source for generating data faster than real time.
+
+    With a numeric `speedup` virtual time runs that many times faster than the
+    wall clock. With speedup=None ("as fast as possible") waiting never sleeps:
+    it simply advances virtual time to the deadline.
+
+    Overdue ticks are never skipped: the output must match a real-time run
+    sample for sample, so the clock catches up instead.
+    """
+
+    skip_missed = False
+
+    def __init__(self, speedup=None):
+        if speedup is not None and speedup <= 0:
+            raise ValueError("speedup must be positive")
+        self.speedup = speedup
+        self._real_origin = time.monotonic()
+        self._virtual = 0.0
+
+    def now(self):
+        if self.speedup is None:
+            return self._virtual
+        return (time.monotonic() - self._real_origin) * self.speedup
+
+    def wait(self, seconds, cancel_event=None):
+        if self.speedup is None:
+            self._virtual += seconds
+            return cancel_event is not None and cancel_event.is_set()
+        return RealTimer().wait(seconds / self.speedup, cancel_event)
+
+
+def make_timer(speedup):
+    """Timer for a run's speedup param: None or 1 for real time, a factor, or "max"."""
+    if speedup is None or speedup == 1:
+        return RealTimer()
+    if speedup == "max":
+        return VirtualTimer()
+    return VirtualTimer(float(speedup))
+
+
+class SampleClock:
+    """Tick source that keeps a fixed sample rate using monotonic deadlines.
+
+    Tick `n` is due at `start + n * interval`, so time spent generating or
+    sending samples never accumulates into drift. If the caller falls a whole
+    period or more behind, the overdue ticks are skipped and counted in
+    `missed_ticks` instead of being emitted as a burst.
+
+    The timer decides what "time" is: RealTimer follows the wall clock, a
+    VirtualTimer compresses it so a long run completes in seconds with the
+    same timestamps and chunking.
+
+    With `tick_limit` the clock ends after that many ticks (emitted or
+    missed) without waiting for a tick past the end.
+    """
+
+    def __init__(self, interval_ms, timer=None, tick_limit=None):
+        if interval_ms <= 0:
+            raise ValueError("interval_ms must be positive")
+        self.interval_ms = interval_ms
+        self.interval = interval_ms / 1000
+        self._timer = timer or RealTimer()
+        self.tick_limit = tick_limit
+        self._time = self._timer.now
+        self._start = None
+        self._next_tick = 0
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.max_lateness = 0.0
+        self.last_lateness = 0.0
+        self._total_lateness = 0.0
+
+    def tick_time_ms(self, tick):
+        """Nominal offset of a tick from the start of the clock, in milliseconds."""
+        return tick * self.interval_ms
+
+    def wait_next(self, cancel_event=None):
+        """Block until the next tick is due and return its index, or None if cancelled or past `tick_limit`."""
+        if self.tick_limit is not None and self._next_tick >= self.tick_limit:
+            return None
+        now = self._time()
+        if self._start is None:
+            self._start = now
+        deadline = self._start + self._next_tick * self.interval
+        remaining = deadline - now
+        if remaining > 0:
+            if self._timer.wait(remaining, cancel_event):
+                return None
+            now = self._time()
+        elif -remaining >= self.interval and self._timer.skip_missed:
+            skipped = int(-remaining // self.interval)
+            if self.tick_limit is not None:
+                skipped = min(skipped, self.tick_limit - self._next_tick)
+            self.missed_ticks += skipped
+            self._next_tick += skipped
+            deadline += skipped * self.interval
+            if self.tick_limit is not None and self._next_tick >= self.tick_limit:
+                return None
+        elif cancel_event is not None and cancel_event.is_set():
+            return None
+
+        lateness = max(0.0, now - deadline)
+        self.last_lateness = lateness
+        self._total_lateness += lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+        tick = self._next_tick
+        self._next_tick += 1
+        self.ticks += 1
+        return tick
+
+    def stats(self):
+        elapsed = self._time() - self._start if self._start is not None else 0.0
+        return {
+            "ticks": self.ticks,
+            "missed_ticks": self.missed_ticks,
+            "target_rate_hz": 1000 / self.interval_ms,
+            "achieved_rate_hz": self.ticks / elapsed if elapsed > 0 else 0.0,
+            "mean_lateness_ms": self._total_lateness / self.ticks * 1000 if self.ticks else 0.0,
+            "max_lateness_ms": self.max_lateness * 1000
+        }
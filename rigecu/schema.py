@@ -0,0 +1,293 @@
+"""Sensor schemas: the channels a simulated rig reports and how their values are generated.
+
+A schema is a JSON object:
+
+    {
+      "channels": [
+        {"name": "ina260.voltage_v", "units": "V", "base": [14.9, -1.6],
+         "noise": {"type": "uniform", "amplitude": 0.1}},
+        {"name": "thermocouple.tc{index:03d}", "count": 200, "units": "degC", "base": [25, 60],
+         "spread": 10, "noise": {"type": "normal", "sigma": 0.2}, "rate_hz": 10, "summary": false}
+      ],
+      "constants": {"load_cell.is_ready": true},
+      "derived": [{"name": "power_w", "product": ["ina260.voltage_v", "ina260.current_ma"], "scale": 0.001}]
+    }
+
+- name: dotted path of the value in each wire-format row; "{index}" names
+  the members of a group of `count` identical channels
+- base: polynomial coefficients in the speed the rig has reached,
+  c0 + c1 * speed + c2 * speed ** 2 ...; `spread` offsets the members of a
+  group evenly across [-spread / 2, spread / 2]
+- noise: uniform (amplitude) or normal (sigma); omitted for none
+- rate_hz: sample rate of a slower channel, whose value is held between its
+  samples; omitted to sample on every tick of the run
+- summary: whether window summaries include the channel (default true)
+- constants: fixed values reported with every sample
+- derived: products of two channels, only computed for window summaries
+"""
+import json
+
+import numpy as np
+
+
+RESERVED_NAMES = ("timestamp", "set_speed", "event")
+NOISE_TYPES = ("uniform", "normal")
+
+DEFAULT_SCHEMA = {
+    "channels": [
+        {"name": "ina260.voltage_v", "units": "V", "base": [14.9, -1.6],
+         "noise": {"type": "uniform", "amplitude": 0.1}},
+        {"name": "ina260.current_ma", "units": "mA", "base": [8000, 6000],
+         "noise": {"type": "uniform", "amplitude": 500}},
+        {"name": "load_cell.raw_value", "units": "counts", "base": [-140000, 10000],
+         "noise": {"type": "uniform", "amplitude": 5000}}
+    ],
+    "constants": {"load_cell.is_ready": True},
+    "derived": [{"name": "power_w", "product": ["ina260.voltage_v", "ina260.current_ma"], "scale": 0.001}]
+}
+
+
+class Channel:
+    def __init__(self, name, units="", base=(0.0,), noise=None, rate_hz=None, summary=True):
+        self.name = name
+        self.units = units
+        self.base = tuple(float(c) for c in base)
+        noise = noise or {}
+        self.noise = noise.get("type")
+        if self.noise is not None and self.noise not in NOISE_TYPES:
+            raise ValueError(f"Channel {name}: noise type must be one of {', '.join(NOISE_TYPES)}")
+        self.noise_scale = float(noise.get("amplitude" if self.noise == "uniform" else "sigma", 0.0))
+        self.rate_hz = float(rate_hz) if rate_hz is not None else None
+        if self.rate_hz is not None and self.rate_hz <= 0:
+            raise ValueError(f"Channel {name}: rate_hz must be positive")
+        self.summary = bool(summary)
+
+    def to_dict(self):
+        channel = {"name": self.name, "units": self.units, "base": list(self.base), "summary": self.summary}
+        if self.noise:
+            channel["noise"] = {"type": self.noise, "amplitude" if self.noise == "uniform" else "sigma": self.noise_scale}
+        if self.rate_hz is not None:
+            channel["rate_hz"] = self.rate_hz
+        return channel
+
+
+class NoiseStream:
+    """Uniform variates keyed by sample index, so a sample's noise does not depend on how a run is chunked.
+
+    Every sample index owns `width` consecutive draws of a PCG64 stream. The
+    stream jumps straight to the first sample of a block (or of each run of
+    consecutive samples, after missed ticks), so generating 1 x N samples or
+    k x N/k samples gives identical values.
+    """
+
+    def __init__(self, seed, width):
+        self._seed = seed
+        self.width = width
+        self._reset()
+
+    def _reset(self):
+        self._bit_generator = np.random.PCG64(self._seed)
+        self._generator = np.random.Generator(self._bit_generator)
+        self._position = 0
+
+    def draw(self, indexes):
+        """A (sample, width) array of uniforms in [0, 1) for increasing sample `indexes`."""
+        out = np.empty((len(indexes), self.width))
+        if not self.width or not len(indexes):
+            return out
+        breaks = np.flatnonzero(np.diff(indexes) != 1) + 1
+        starts = [0] + breaks.tolist()
+        ends = breaks.tolist() + [len(indexes)]
+        for start, end in zip(starts, ends):
+            first = int(indexes[start])
+            if first < self._position:
+                self._reset()
+            self._bit_generator.advance((first - self._position) * self.width)
+            self._generator.random(out=out[start:end])
+            self._position = first + end - start
+        return out
+
+
+class _NoiseGroup:
+    """Channels sampled at the same rate, with their noise parameters as arrays."""
+
+    def __init__(self, period_ms, indexes, channels):
+        self.period_ms = period_ms
+        self.indexes = np.asarray(indexes)
+        uniform = [i for i, channel in zip(indexes, channels) if channel.noise == "uniform"]
+        normal = [i for i, channel in zip(indexes, channels) if channel.noise == "normal"]
+        # Positions within this group's rows, and the per-channel scale as a column vector
+        position = {index: row for row, index in enumerate(indexes)}
+        self.uniform_rows = np.asarray([position[i] for i in uniform], dtype=np.intp)
+        self.uniform_scale = np.asarray([channels[position[i]].noise_scale for i in uniform])[:, None]
+        self.normal_rows = np.asarray([position[i] for i in normal], dtype=np.intp)
+        self.normal_scale = np.asarray([channels[position[i]].noise_scale for i in normal])[:, None]
+        # Draws per sample: one per uniform channel, two per normal channel (Box-Muller)
+        self.width = len(uniform) + 2 * len(normal)
+
+    def add_noise(self, stream, samples, values):
+        """Add the noise of sample indexes `samples` in place to a (channel, sample) array of this group's channels."""
+        draws = stream.draw(samples).T
+        uniform = len(self.uniform_rows)
+        if uniform:
+            values[self.uniform_rows] += self.uniform_scale * (2.0 * draws[:uniform] - 1.0)
+        if len(self.normal_rows):
+            radius = np.sqrt(-2.0 * np.log1p(-draws[uniform::2]))
+            values[self.normal_rows] += self.normal_scale * radius * np.cos(2.0 * np.pi * draws[uniform + 1::2])
+
+
+class SensorSchema:
+    """A validated, compiled schema: channel values live in (channel, sample) arrays in `names` order."""
+
+    def __init__(self, channels, constants=None, derived=None):
+        if not channels:
+            raise ValueError("A sensor schema needs at least one channel")
+        self.channels = channels
+        self.names = tuple(channel.name for channel in channels)
+        self.index = {name: position for position, name in enumerate(self.names)}
+        if len(self.index) != len(self.names):
+            raise ValueError("Channel names must be unique")
+        self.constants = dict(constants or {})
+        self.derived = []
+        for spec in derived or []:
+            first, second = spec["product"]
+            if first not in self.index or second not in self.index:
+                raise ValueError(f"Derived channel {spec['name']} refers to an unknown channel")
+            self.derived.append((spec["name"], self.index[first], self.index[second], float(spec.get("scale", 1.0))))
+
+        self._layout = self._compile_layout()
+
+        # Horner coefficients, highest degree first, padded to a common degree
+        degree = max(len(channel.base) for channel in channels)
+        self._coefficients = np.zeros((degree, len(channels)))
+        for position, channel in enumerate(channels):
+            self._coefficients[degree - len(channel.base):, position] = channel.base[::-1]
+
+        by_rate = {}
+        for position, channel in enumerate(channels):
+            by_rate.setdefault(channel.rate_hz, []).append(position)
+        self._groups = [
+            _NoiseGroup(1000 / rate if rate else None, indexes, [channels[i] for i in indexes])
+            for rate, indexes in by_rate.items()
+        ]
+
+        summarised = [position for position, channel in enumerate(channels) if channel.summary]
+        self._summary_index = np.asarray(summarised, dtype=np.intp)
+        self.summary_names = tuple(self.names[i].replace(".", "_") for i in summarised) + \
+            tuple(name for name, _, _, _ in self.derived)
+
+    @classmethod
+    def from_dict(cls, data):
+        channels = []
+        for spec in data.get("channels", []):
+            count = spec.get("count")
+            spread = float(spec.get("spread", 0.0))
+            options = {key: spec[key] for key in ("units", "noise", "rate_hz", "summary") if key in spec}
+            base = list(spec.get("base", [0.0]))
+            if count is None:
+                channels.append(Channel(spec["name"], base=base, **options))
+                continue
+            for index in range(int(count)):
+                offset = spread * (index / (count - 1) - 0.5) if count > 1 else 0.0
+                channels.append(Channel(spec["name"].format(index=index + 1),
+                                        base=[base[0] + offset] + base[1:], **options))
+        return cls(channels, data.get("constants"), data.get("derived"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {
+            "channels": [channel.to_dict() for channel in self.channels],
+            "constants": self.constants,
+            "derived": [{"name": name, "product": [self.names[a], self.names[b]], "scale": scale}
+                        for name, a, b, scale in self.derived]
+        }
+
+    def _compile_layout(self):
+        """Nest dotted names into [(key, channel index | constant | sub-layout, kind)] for building rows."""
+        tree = {}
+        for name, value in [(name, ("channel", position)) for position, name in enumerate(self.names)] + \
+                [(name, ("constant", value)) for name, value in self.constants.items()]:
+            *groups, leaf = name.split(".")
+            if not groups and leaf in RESERVED_NAMES:
+                raise ValueError(f"'{leaf}' is reserved and cannot name a channel")
+            node = tree
+            for group in groups:
+                node = node.setdefault(group, {})
+                if not isinstance(node, dict):
+                    raise ValueError(f"{name} is nested under a channel")
+            if leaf in node:
+                raise ValueError(f"{name} is defined more than once")
+            node[leaf] = value
+
+        def compile_node(node):
+            return [(key, compile_node(value), "group") if isinstance(value, dict) else (key, value[1], value[0])
+                    for key, value in node.items()]
+        return compile_node(tree)
+
+    def nest(self, values):
+        """Arrange per-channel values (a sequence indexed like `names`) into the nested wire layout."""
+        def build(layout):
+            return {
+                key: values[item] if kind == "channel" else build(item) if kind == "group" else item
+                for key, item, kind in layout
+            }
+        return build(self._layout)
+
+    def base(self, speed):
+        """Noise-free values of every channel for each speed: a (channel, sample) array."""
+        values = np.repeat(self._coefficients[0][:, None], len(speed), axis=1)
+        for coefficients in self._coefficients[1:]:
+            values *= speed
+            values += coefficients[:, None]
+        return values
+
+    def noise_streams(self, seed):
+        """Independent noise streams for each rate group of a run with `seed`."""
+        children = np.random.SeedSequence(seed).spawn(len(self._groups))
+        return [NoiseStream(child, group.width) for child, group in zip(children, self._groups)]
+
+    def generate(self, streams, ticks, timestamps, speed, held):
+        """Channel values at `ticks` (sample indexes of the run) and `timestamps` (ms) for the reached `speed`.
+
+        Noise comes from `streams` (see noise_streams) keyed by tick, or by
+        period for slower channels, which draw one value per period of their
+        rate and hold it; `held` maps each period to the last (period number,
+        values) so a value carries over into the next block.
+        """
+        values = self.base(speed)
+        for group, stream in zip(self._groups, streams):
+            if group.period_ms is None and len(group.indexes) == len(self.names):
+                # Every channel samples on every tick: add noise in place
+                group.add_noise(stream, ticks, values)
+                continue
+            if group.period_ms is None:
+                rows = values[group.indexes]
+                group.add_noise(stream, ticks, rows)
+                values[group.indexes] = rows
+                continue
+            periods = timestamps // group.period_ms
+            unique, first, inverse = np.unique(periods, return_index=True, return_inverse=True)
+            rows = values[group.indexes][:, first]
+            group.add_noise(stream, unique, rows)
+            previous = held.get(group.period_ms)
+            if previous is not None and previous[0] == unique[0]:
+                rows[:, 0] = previous[1]
+            held[group.period_ms] = (unique[-1], rows[:, -1].copy())
+            values[group.indexes] = rows[:, inverse]
+        return values
+
+    def summary_values(self, values):
+        """The summarised channels and derived products of a (channel, sample) array."""
+        rows = [values[self._summary_index]]
+        for _, first, second, scale in self.derived:
+            rows.append((values[first] * values[second] * scale)[None, :])
+        return np.vstack(rows)
+
+
+def load_schema(path=None):
+    """The schema in the JSON file at `path`, or the built-in three-channel rig."""
+    return SensorSchema.load(path) if path else SensorSchema.from_dict(DEFAULT_SCHEMA)
@@ -0,0 +1,225 @@
+"""Single- or multi-process serving of a Flask app with waitress.
+
+With WEB_WORKERS=1 (the default) the app is served by one waitress process,
+as before. With WEB_WORKERS=N the process started by the container only
+supervises: it re-runs the same command N times as worker processes, each
+importing the app with its own state and listening on the public port
+through SO_REUSEPORT, so the kernel spreads connections across them.
+Workers also listen on a private loopback port (WEB_INTERNAL_PORT_BASE +
+index) so they can forward requests for state that lives in another worker.
+
+On SIGTERM a worker stops accepting connections, lets in-flight requests
+finish for up to WEB_DRAIN_TIMEOUT seconds, runs its shutdown hook and exits.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from flask import Response
+from waitress.server import create_server
+from waitress import wasyncore
+
+# Settings may come from a .env file, which main.py loads after its imports
+load_dotenv()
+
+WORKER_ENV = "WEB_WORKER_INDEX"
+# Set on requests forwarded between workers, which must be answered locally
+LOCAL_HEADER = "X-Web-Worker-Local"
+
+workers = int(os.getenv("WEB_WORKERS", "1"))
+threads = int(os.getenv("WEB_THREADS", "4"))
+host = os.getenv("WEB_HOST", "0.0.0.0")
+port = int(os.getenv("WEB_PORT", "80"))
+internal_port_base = int(os.getenv("WEB_INTERNAL_PORT_BASE", "18000"))
+drain_timeout = float(os.getenv("WEB_DRAIN_TIMEOUT", "30"))
+# Time the app's shutdown hook may take after the drain, e.g. to let runs finish
+shutdown_timeout = float(os.getenv("WEB_SHUTDOWN_TIMEOUT", "30"))
+
+worker_index = int(os.getenv(WORKER_ENV, "0"))
+multi_process = workers > 1
+
+
+def id_prefix():
+    """Prefix for IDs of per-process state, naming the worker that owns it."""
+    return f"w{worker_index}-" if multi_process else ""
+
+
+def owner_of(resource_id):
+    """Index of the worker owning an ID made with id_prefix(), or None if it is local or not prefixed."""
+    if not multi_process or not resource_id.startswith("w") or "-" not in resource_id:
+        return None
+    index = resource_id[1:resource_id.index("-")]
+    if not index.isdigit() or int(index) == worker_index or int(index) >= workers:
+        return None
+    return int(index)
+
+
+def peer_indexes():
+    return [index for index in range(workers) if index != worker_index] if multi_process else []
+
+
+def forward(request, index, timeout=30):
+    """Send the current request to worker `index` and return its response."""
+    url = f"http://127.0.0.1:{internal_port_base + index}{request.full_path.rstrip('?')}"
+    headers = {key: value for key, value in request.headers if key.lower() not in ("host", "content-length")}
+    headers[LOCAL_HEADER] = "1"
+    upstream = requests.request(request.method, url, headers=headers, data=request.get_data(), timeout=timeout)
+    excluded = ("content-encoding", "content-length", "transfer-encoding", "connection")
+    return Response(upstream.content, status=upstream.status_code,
+                    headers=[(key, value) for key, value in upstream.headers.items() if key.lower() not in excluded])
+
+
+def gather(request, path, timeout=10):
+    """GET `path` from every other worker; returns the decoded JSON bodies that answered."""
+    if request.headers.get(LOCAL_HEADER):
+        return []
+    results = []
+    for index in peer_indexes():
+        try:
+            response = requests.get(f"http://127.0.0.1:{internal_port_base + index}{path}",
+                                    headers={LOCAL_HEADER: "1"}, timeout=timeout)
+            if response.ok:
+                results.append(response.json() if "json" in response.headers.get("Content-Type", "") else response.text)
+        except requests.exceptions.RequestException:
+            pass
+    return results
+
+
+class _Slot:
+    def __init__(self, slots):
+        self._slots = slots
+        self._released = False
+
+    def release(self):
+        """Give the slot back; later calls do nothing."""
+        with self._slots._lock:
+            if not self._released:
+                self._released = True
+                self._slots.in_use -= 1
+
+
+class StreamSlots:
+    """Caps the streaming responses open at once, since each one holds a server thread until it ends."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """A slot to release when the response closes, or None if all are taken."""
+        with self._lock:
+            if self.in_use >= self.limit:
+                return None
+            self.in_use += 1
+        return _Slot(self)
+
+
+def stream_limit(configured=None):
+    """Streaming responses allowed at once: `configured`, or two fewer than the threads, always leaving one free."""
+    return max(1, min(int(configured or threads - 2), threads - 1))
+
+
+def supervise(logger):
+    """Run the worker processes when WEB_WORKERS > 1; returns immediately in a worker or single-process mode.
+
+    Call this before the app creates any threads or state: the supervising
+    process never returns from it.
+    """
+    if not multi_process or WORKER_ENV in os.environ:
+        return
+
+    stopping = threading.Event()
+    processes = {}
+
+    def spawn(index):
+        env = dict(os.environ, **{WORKER_ENV: str(index)})
+        processes[index] = subprocess.Popen([sys.executable] + sys.argv, env=env)
+
+    def stop(signum, frame):
+        stopping.set()
+        for process in processes.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+    logger.info(f"Serving on {host}:{port} with {workers} worker processes of {threads} threads")
+
+    while not stopping.is_set():
+        for index, process in list(processes.items()):
+            if process.poll() is not None and not stopping.is_set():
+                logger.warning(f"Worker {index} exited with code {process.returncode}, restarting")
+                time.sleep(1)
+                spawn(index)
+        stopping.wait(0.5)
+
+    logger.info(f"Stopping {len(processes)} worker processes")
+    deadline = time.monotonic() + drain_timeout + shutdown_timeout + 10
+    for index, process in processes.items():
+        try:
+            process.wait(max(0.1, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.error(f"Worker {index} did not exit in time, killing it")
+            process.kill()
+    sys.exit(0)
+
+
+def _listen_socket(address, reuse_port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(address)
+    return sock
+
+
+def serve(app, logger, on_shutdown=None):
+    """Serve `app` in this process until SIGTERM, then drain and call `on_shutdown`."""
+    public = _listen_socket((host, port), multi_process)
+    sockets = [public]
+    if multi_process:
+        sockets.append(_listen_socket(("127.0.0.1", internal_port_base + worker_index), False))
+
+    channels = {}
+    server = create_server(app, map=channels, sockets=sockets, threads=threads)
+    dispatcher = server.task_dispatcher
+
+    def drain():
+        deadline = time.monotonic() + drain_timeout
+        # Requests already accepted keep being served until the workers are idle
+        while time.monotonic() < deadline:
+            with dispatcher.lock:
+                idle = dispatcher.active_count == 0 and not dispatcher.queue
+            if idle:
+                break
+            time.sleep(0.05)
+        else:
+            logger.warning(f"Shutting down with requests still in progress after {drain_timeout}s")
+        os.kill(os.getpid(), signal.SIGINT)
+
+    def begin_drain(signum, frame):
+        logger.info(f"Worker {worker_index} draining")
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        # Stop accepting on the public port; other workers keep serving it
+        for channel in list(channels.values()):
+            if getattr(channel, "socket", None) is public:
+                wasyncore.dispatcher.close(channel)
+        threading.Thread(target=drain, name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, begin_drain)
+    if multi_process:
+        logger.info(f"Worker {worker_index} serving on {host}:{port} with {threads} threads")
+    try:
+        server.run()
+    finally:
+        if on_shutdown is not None:
+            on_shutdown()
@@ -0,0 +1,146 @@
+import base64
+import json
+import threading
+import time
+
+from encoding import ChunkEncoder
+
+try:
+    from confluent_kafka import Producer as KafkaProducer
+except ImportError:  # pragma: no cover - optional dependency
+    KafkaProducer = None
+
+
+class FanoutSink:
+    """Send every block to several sinks, e.g. the HTTP data API and a Kafka topic."""
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def submit(self, test_id, block, final=False):
+        accepted = False
+        for sink in self.sinks.values():
+            accepted = sink.submit(test_id, block, final=final) or accepted
+        return accepted
+
+    def stats(self):
+        return {name: sink.stats() for name, sink in self.sinks.items()}
+
+    def close(self):
+        for sink in self.sinks.values():
+            sink.close()
+
+
+class FileProducer:
+    """File-backed stand-in for a Kafka producer.
+
+    Implements the subset of the confluent_kafka Producer API used by
+    KafkaSink and appends each message to an NDJSON file, so the Kafka path
+    can be exercised without a broker.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def produce(self, topic, value=None, key=None, headers=None, on_delivery=None):
+        record = {
+            "topic": topic,
+            "key": key.decode("utf-8") if isinstance(key, bytes) else key,
+            "headers": {name: header.decode("utf-8") for name, header in (headers or [])},
+            "value": base64.b64encode(value).decode("ascii"),
+            "timestamp": int(time.time() * 1000)
+        }
+        with self._lock:
+            with open(self._path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            if on_delivery is not None:
+                self._pending.append(on_delivery)
+
+    def poll(self, timeout=0):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for on_delivery in pending:
+            on_delivery(None, None)
+        return len(pending)
+
+    def flush(self, timeout=None):
+        self.poll()
+        return 0
+
+
+class KafkaSink:
+    """Produce chunks straight to a Kafka topic, keyed by test_id.
+
+    Batching happens inside the producer: `linger_ms`, `batch_size` and
+    `compression` map onto the librdkafka settings of the same name. A
+    `brokers` value of file:///path uses FileProducer instead of a broker.
+    """
+
+    name = "kafka"
+
+    def __init__(self, brokers, topic, logger, encoder=None, linger_ms=50, batch_size=1000000,
+                 compression="lz4", extra_config=None):
+        self.topic = topic
+        self._logger = logger
+        self._encoder = encoder or ChunkEncoder("columnar")
+        self._counters_lock = threading.Lock()
+        self._counters = {"enqueued": 0, "sent": 0, "failed": 0, "dropped": 0}
+
+        if brokers.startswith("file://"):
+            self._producer = FileProducer(brokers[len("file://"):])
+        else:
+            if KafkaProducer is None:
+                raise ValueError("The kafka sink requires the confluent-kafka package")
+            config = {
+                "bootstrap.servers": brokers,
+                "linger.ms": linger_ms,
+                "batch.size": batch_size,
+                "compression.type": compression,
+                "enable.idempotence": True
+            }
+            config.update(extra_config or {})
+            self._producer = KafkaProducer(config)
+
+    def submit(self, test_id, block, final=False):
+        body, headers = self._encoder(block)
+        message_headers = [(name.lower(), value.encode("utf-8")) for name, value in headers.items()]
+        key = str(test_id).encode("utf-8")
+        for attempt in range(2):
+            try:
+                self._producer.produce(self.topic, value=body, key=key, headers=message_headers,
+                                       on_delivery=self._on_delivery)
+                break
+            except BufferError:
+                if attempt:
+                    self._count("dropped")
+                    self._logger.warning("Kafka producer queue full, dropped chunk: %s :: %d items", test_id, len(block))
+                    return False
+                # Local queue is full: serve delivery reports to make room, then try once more
+                self._producer.poll(0.1)
+        self._count("enqueued")
+        self._producer.poll(0)
+        return True
+
+    def stats(self):
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats["topic"] = self.topic
+        return stats
+
+    def close(self, timeout=10.0):
+        remaining = self._producer.flush(timeout)
+        if remaining:
+            self._logger.warning(f"{remaining} Kafka messages were not delivered before shutdown")
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def _on_delivery(self, error, message):
+        if error is not None:
+            self._count("failed")
+            self._logger.error("Kafka delivery to %s failed: %s", self.topic, error)
+        else:
+            self._count("sent")
@@ -0,0 +1,220 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+RAMP_SHAPES = ("linear", "exponential")
+
+# Curvature of the exponential ramp: the setpoint covers ~88% of the step in the first half
+EXPONENTIAL_RAMP_RATE = 4.0
+
+# Largest decay exponent the closed-form lag accumulates before rescaling (e^300 ~ 1e130)
+MAX_LAG_EXPONENT = 300.0
+
+
+class ProfileStep:
+    """One setpoint of a speed profile: ramp to `speed` over `ramp` ms, then hold it for `hold` ms."""
+
+    def __init__(self, speed, hold, ramp=0.0, shape="linear"):
+        if shape not in RAMP_SHAPES:
+            raise ValueError(f"ramp_shape must be one of {', '.join(RAMP_SHAPES)}")
+        if hold < 0 or ramp < 0:
+            raise ValueError("hold and ramp times must not be negative")
+        self.speed = speed
+        self.hold = hold
+        self.ramp = ramp
+        self.shape = shape
+
+    def to_dict(self):
+        return {"speed": self.speed, "hold": self.hold, "ramp": self.ramp, "ramp_shape": self.shape}
+
+
+class SetpointTable:
+    """Per-tick setpoint and lagged response of a compiled profile, evaluated one block of ticks at a time.
+
+    Only the response at each block boundary is kept for the whole run, so
+    memory stays flat however long the profile is. Runs and fleet rigs read
+    ticks in order, so the few most recently used blocks are cached.
+    """
+
+    BLOCK_TICKS = 4096
+    CACHED_BLOCKS = 4
+
+    def __init__(self, profile, interval_ms):
+        self.profile = profile
+        self.interval_ms = interval_ms
+        self._tick_count = max(1, math.ceil(profile.duration_ms / interval_ms))
+        # Response just before the first tick of each block evaluated so far
+        self._boundaries = [profile.start_speed]
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._tick_count
+
+    def lookup(self, ticks):
+        """Return (setpoint, response) arrays for the given tick indices."""
+        ticks = np.minimum(np.asarray(ticks, dtype=np.int64), self._tick_count - 1)
+        blocks = ticks // self.BLOCK_TICKS
+        setpoint = np.empty(ticks.shape, dtype=np.float64)
+        response = np.empty(ticks.shape, dtype=np.float64)
+        for block in np.unique(blocks):
+            in_block = blocks == block
+            block_setpoint, block_response = self._block(int(block))
+            offsets = ticks[in_block] - block * self.BLOCK_TICKS
+            setpoint[in_block] = block_setpoint[offsets]
+            response[in_block] = block_response[offsets]
+        return setpoint, response
+
+    def _block(self, block):
+        with self._lock:
+            cached = self._blocks.get(block)
+            if cached is not None:
+                self._blocks.move_to_end(block)
+                return cached
+            # A block's lag starts from the previous block's last response, so walk forward to it
+            for index in range(min(block, len(self._boundaries) - 1), block + 1):
+                cached = self._evaluate(index)
+            return cached
+
+    def _evaluate(self, block):
+        start = block * self.BLOCK_TICKS
+        stop = min(start + self.BLOCK_TICKS, self._tick_count)
+        setpoint = self.profile.setpoint(start, stop, self.interval_ms)
+        response = self.profile.lag(setpoint, self._boundaries[block], self.interval_ms)
+        if block + 1 == len(self._boundaries) and stop < self._tick_count:
+            self._boundaries.append(float(response[-1]))
+        self._blocks[block] = (setpoint, response)
+        if len(self._blocks) > self.CACHED_BLOCKS:
+            self._blocks.popitem(last=False)
+        return setpoint, response
+
+
+class SpeedProfile:
+    """A setpoint trajectory made of ramp/hold steps, with first-order lag on the response.
+
+    Speeds are fractions of full speed (0.0 - 1.0), matching `set_speed`.
+    """
+
+    def __init__(self, steps, time_constant=0.0, start_speed=None):
+        if not steps:
+            raise ValueError("A speed profile needs at least one step")
+        if time_constant < 0:
+            raise ValueError("time_constant must not be negative")
+        self.steps = steps
+        self.time_constant = time_constant
+        self.start_speed = steps[0].speed if start_speed is None else start_speed
+
+    @property
+    def duration_ms(self):
+        return sum(step.ramp + step.hold for step in self.steps)
+
+    @classmethod
+    def from_request(cls, data, ramp_delay):
+        """Build a profile from an /ecu/start body.
+
+        Accepted forms, in order of precedence:
+
+        - "steps": [{"speed": 50, "hold": 10000, "ramp": 2000, "ramp_shape": "linear"}, ...]
+        - "speeds": [50, 80, ...] with optional "hold_times" (ms per step, otherwise
+          ramp_delay is split evenly), "ramp_time" and "ramp_shape" applied to every step
+        - "set_speed": 0.5, held for ramp_delay
+
+        Step speeds and "speeds" are throttle percentages (0 - 100) as sent by
+        labview-sim; "set_speed" and "start_speed" are fractions. "time_constant"
+        (ms) sets the first-order lag of the simulated response.
+        """
+        time_constant = float(data.get("time_constant", 0))
+        start_speed = data.get("start_speed")
+        start_speed = float(start_speed) if start_speed is not None else None
+
+        if data.get("steps"):
+            steps = [
+                ProfileStep(
+                    float(step["speed"]) / 100,
+                    float(step.get("hold", 0)),
+                    float(step.get("ramp", 0)),
+                    step.get("ramp_shape", "linear")
+                )
+                for step in data["steps"]
+            ]
+        elif data.get("speeds"):
+            speeds = [float(speed) / 100 for speed in data["speeds"]]
+            hold_times = data.get("hold_times")
+            if hold_times is None:
+                hold_times = [ramp_delay / len(speeds)] * len(speeds)
+            elif len(hold_times) != len(speeds):
+                raise ValueError("hold_times must have one entry per speed")
+            ramp_time = float(data.get("ramp_time", 0))
+            ramp_shape = data.get("ramp_shape", "linear")
+            steps = [
+                ProfileStep(speed, float(hold), ramp_time, ramp_shape)
+                for speed, hold in zip(speeds, hold_times)
+            ]
+        else:
+            steps = [ProfileStep(float(data.get("set_speed", 0.5)), ramp_delay)]
+
+        return cls(steps, time_constant=time_constant, start_speed=start_speed)
+
+    def to_dict(self):
+        return {
+            "steps": [step.to_dict() for step in self.steps],
+            "time_constant": self.time_constant,
+            "start_speed": self.start_speed
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        steps = [ProfileStep(step["speed"], step["hold"], step["ramp"], step["ramp_shape"]) for step in data["steps"]]
+        return cls(steps, time_constant=data["time_constant"], start_speed=data["start_speed"])
+
+    def compile(self, interval_ms):
+        """Return the per-tick table the run loop indexes into; ticks are sampled lazily, a block at a time."""
+        return SetpointTable(self, interval_ms)
+
+    def setpoint(self, start, stop, interval_ms):
+        """Sample the trajectory at ticks [start, stop)."""
+        times = np.arange(start, stop, dtype=np.float64) * interval_ms
+        setpoint = np.empty(len(times), dtype=np.float64)
+
+        # Each step covers a contiguous slice of ticks, found by binary search
+        previous = self.start_speed
+        step_start = 0.0
+        for step in self.steps:
+            ramp_end = step_start + step.ramp
+            step_end = ramp_end + step.hold
+            first, ramp_stop, last = np.searchsorted(times, (step_start, ramp_end, step_end))
+            if ramp_stop > first:
+                progress = (times[first:ramp_stop] - step_start) / step.ramp
+                if step.shape == "exponential":
+                    progress = (1 - np.exp(-EXPONENTIAL_RAMP_RATE * progress)) / (1 - math.exp(-EXPONENTIAL_RAMP_RATE))
+                setpoint[first:ramp_stop] = previous + (step.speed - previous) * progress
+            setpoint[ramp_stop:last] = step.speed
+            previous = step.speed
+            step_start = step_end
+        setpoint[np.searchsorted(times, step_start):] = previous
+        return setpoint
+
+    def lag(self, setpoint, initial, interval_ms):
+        """Apply the first-order lag to consecutive setpoint ticks, starting from response `initial`."""
+        if self.time_constant <= 0:
+            return setpoint
+        # y[n] = decay * y[n-1] + (1 - decay) * u[n] unrolls to
+        # y[n] = decay^(n+1) * (y[-1] + (1 - decay) * sum(u[k] / decay^(k+1), k <= n)),
+        # evaluated over spans short enough that 1 / decay^span stays well inside float range
+        exponent = interval_ms / self.time_constant
+        if exponent > MAX_LAG_EXPONENT:
+            return setpoint
+        decay = math.exp(-exponent)
+        span = max(1, int(MAX_LAG_EXPONENT / exponent))
+        powers = decay ** np.arange(1, min(span, len(setpoint)) + 1, dtype=np.float64)
+        response = np.empty_like(setpoint)
+        value = initial
+        for first in range(0, len(setpoint), span):
+            target = setpoint[first:first + span]
+            scale = powers[:len(target)]
+            response[first:first + span] = scale * (value + (1 - decay) * np.cumsum(target / scale))
+            value = response[first + len(target) - 1]
+        return response
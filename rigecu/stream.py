@@ -0,0 +1,76 @@
+import json
+import threading
+from collections import deque
+
+
+class SampleStream:
+    """Bounded buffer of blocks between a run and an HTTP streaming response.
+
+    The run side never waits: if the client reads slower than samples are
+    produced, the oldest buffered blocks are discarded and counted in
+    `dropped_blocks`/`dropped_samples`.
+    """
+
+    def __init__(self, max_blocks=50):
+        self._blocks = deque()
+        self._max_blocks = max_blocks
+        self._condition = threading.Condition()
+        self.closed = False
+        self.dropped_blocks = 0
+        self.dropped_samples = 0
+
+    def submit(self, test_id, block, final=False):
+        with self._condition:
+            if self.closed:
+                return False
+            self._blocks.append(block)
+            if len(self._blocks) > self._max_blocks:
+                dropped = self._blocks.popleft()
+                self.dropped_blocks += 1
+                self.dropped_samples += len(dropped)
+            self._condition.notify()
+        return True
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """Return the next block, or None if nothing arrived within timeout or the stream is closed and empty."""
+        with self._condition:
+            if not self._blocks and not self.closed:
+                self._condition.wait(timeout)
+            if self._blocks:
+                return self._blocks.popleft()
+            return None
+
+    @property
+    def exhausted(self):
+        with self._condition:
+            return self.closed and not self._blocks
+
+
+def format_ndjson(block, sequence):
+    """One JSON object per sample (or per summary window), newline-delimited.
+
+    Every line starts with an "event" field, "chunk" or "summary", like the
+    event names of the SSE format.
+    """
+    event = getattr(block, "event", "chunk")
+    return "".join(json.dumps({"event": event, **row}) + "\n" for row in block.to_rows())
+
+
+def format_sse(block, sequence):
+    """One Server-Sent Event per block, carrying the chunk in the usual {"data": [...]} shape.
+
+    Window summaries arrive as "summary" events alongside the raw "chunk" events.
+    """
+    event = getattr(block, "event", "chunk")
+    return f"id: {sequence}\nevent: {event}\ndata: {json.dumps({'data': block.to_rows()})}\n\n"
+
+
+STREAM_FORMATS = {
+    "ndjson": ("application/x-ndjson", format_ndjson),
+    "sse": ("text/event-stream", format_sse)
+}
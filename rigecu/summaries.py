@@ -0,0 +1,183 @@
+import numpy as np
+
+from metrics import Counter
+
+
+STATS = ("min", "max", "mean", "rms")
+
+summary_windows = Counter("rigecu_summary_windows_total", "Window summaries emitted by runs")
+
+
+class SummaryBlock:
+    """Aggregates for consecutive windows of a run, stored as one array per channel and statistic."""
+
+    event = "summary"
+
+    def __init__(self, window_ms, window_starts, counts, stats):
+        self.window_ms = window_ms
+        self.window_starts = window_starts
+        self.counts = counts
+        self.stats = stats  # {channel: {stat: array}}
+
+    def __len__(self):
+        return len(self.window_starts)
+
+    def to_rows(self):
+        """One row per window in the wire format."""
+        channels = {
+            channel: {stat: values.tolist() for stat, values in stats.items()}
+            for channel, stats in self.stats.items()
+        }
+        return [
+            {
+                "timestamp": window_start,
+                "window_ms": self.window_ms,
+                "count": count,
+                **{channel: {stat: values[index] for stat, values in stats.items()}
+                   for channel, stats in channels.items()}
+            }
+            for index, (window_start, count) in enumerate(zip(self.window_starts.tolist(), self.counts.tolist()))
+        ]
+
+    def to_columnar(self):
+        deltas = np.diff(self.window_starts, prepend=self.window_starts[:1]) if len(self) else self.window_starts
+        return {
+            "format": "summary",
+            "count": len(self),
+            "window_ms": self.window_ms,
+            "timestamp_base": int(self.window_starts[0]) if len(self) else 0,
+            "timestamp_deltas": deltas.tolist(),
+            "samples": self.counts.tolist(),
+            "channels": {
+                channel: {stat: values.tolist() for stat, values in stats.items()}
+                for channel, stats in self.stats.items()
+            }
+        }
+
+
+def summary_to_rows(payload):
+    """Expand a columnar summary payload back into rows."""
+    starts = np.cumsum(payload["timestamp_deltas"], dtype=np.int64) + payload["timestamp_base"]
+    channels = payload["channels"]
+    return [
+        {
+            "timestamp": window_start,
+            "window_ms": payload["window_ms"],
+            "count": count,
+            **{channel: {stat: values[index] for stat, values in stats.items()} for channel, stats in channels.items()}
+        }
+        for index, (window_start, count) in enumerate(zip(starts.tolist(), payload["samples"]))
+    ]
+
+
+class WindowSummarizer:
+    """Streaming min/max/mean/RMS per channel over fixed, timestamp-aligned windows.
+
+    The channels are those the block's sensor schema marks for summaries
+    (dots in their names become underscores), plus its derived products.
+    Each window keeps only a count and per-channel min, max, sum and sum of
+    squares, so a sample costs O(1) whatever the window length. Blocks are
+    reduced with numpy segment reductions; a window is emitted once a sample
+    from a later window arrives, or when the run ends.
+    """
+
+    def __init__(self, window_ms):
+        self.window_ms = int(window_ms)
+        self._window = None
+        self._names = None
+        self._count = 0
+        self._min = self._max = self._sum = self._sum_sq = None
+
+    def add(self, block, final=False):
+        """Fold in a SampleBlock; returns a SummaryBlock of the windows it completed, or None."""
+        if len(block):
+            windows = block.timestamps // self.window_ms
+            values = block.schema.summary_values(block.values)
+            self._names = block.schema.summary_names
+            starts = np.flatnonzero(np.diff(windows, prepend=windows[0] - 1))
+            ids = windows[starts]
+            counts = np.diff(np.append(starts, len(windows)))
+            mins = np.minimum.reduceat(values, starts, axis=1)
+            maxs = np.maximum.reduceat(values, starts, axis=1)
+            sums = np.add.reduceat(values, starts, axis=1)
+            sums_sq = np.add.reduceat(values * values, starts, axis=1)
+
+            if self._window is not None:
+                if ids[0] == self._window:
+                    # The block continues the open window
+                    counts[0] += self._count
+                    mins[:, 0] = np.minimum(mins[:, 0], self._min)
+                    maxs[:, 0] = np.maximum(maxs[:, 0], self._max)
+                    sums[:, 0] += self._sum
+                    sums_sq[:, 0] += self._sum_sq
+                else:
+                    ids = np.insert(ids, 0, self._window)
+                    counts = np.insert(counts, 0, self._count)
+                    mins = np.insert(mins, 0, self._min, axis=1)
+                    maxs = np.insert(maxs, 0, self._max, axis=1)
+                    sums = np.insert(sums, 0, self._sum, axis=1)
+                    sums_sq = np.insert(sums_sq, 0, self._sum_sq, axis=1)
+        elif self._window is not None:
+            ids = np.array([self._window], dtype=np.int64)
+            counts = np.array([self._count])
+            mins, maxs = self._min[:, None], self._max[:, None]
+            sums, sums_sq = self._sum[:, None], self._sum_sq[:, None]
+        else:
+            return None
+
+        # The last window stays open for the next block unless the run is over
+        done = len(ids) if final else len(ids) - 1
+        if final:
+            self._window = None
+        else:
+            self._window, self._count = ids[-1], counts[-1]
+            self._min, self._max = mins[:, -1].copy(), maxs[:, -1].copy()
+            self._sum, self._sum_sq = sums[:, -1].copy(), sums_sq[:, -1].copy()
+        if done == 0:
+            return None
+
+        counts = counts[:done]
+        stats = {
+            channel: {
+                "min": mins[index, :done],
+                "max": maxs[index, :done],
+                "mean": sums[index, :done] / counts,
+                "rms": np.sqrt(sums_sq[index, :done] / counts)
+            }
+            for index, channel in enumerate(self._names)
+        }
+        summary_windows.inc(done)
+        return SummaryBlock(self.window_ms, ids[:done] * self.window_ms, counts, stats)
+
+
+class SummarizingSink:
+    """Sink wrapper for one run: window summaries go to `summary_sink`, raw samples to `raw_sink`.
+
+    Only every `decimation`-th raw sample is passed on (counted across
+    chunks, so the spacing is even), or none at all with a decimation of 0.
+    """
+
+    def __init__(self, raw_sink, summary_sink, window_ms, decimation=1):
+        self._raw_sink = raw_sink
+        self._summary_sink = summary_sink
+        self._summarizer = WindowSummarizer(window_ms)
+        self._decimation = decimation
+        self._offset = 0
+
+    def submit(self, test_id, block, final=False):
+        accepted = True
+        summary = self._summarizer.add(block, final=final)
+        if summary is not None:
+            accepted = self._summary_sink.submit(test_id, summary, final=final)
+
+        if self._decimation == 1:
+            raw = block
+        elif self._decimation > 1:
+            raw = block.take(np.arange((-self._offset) % self._decimation, len(block), self._decimation))
+            self._offset = (self._offset + len(block)) % self._decimation
+        else:
+            return accepted
+        # An empty final block only closes the summary window; the raw sink has nothing to receive
+        if len(raw):
+            accepted = self._raw_sink.submit(test_id, raw, final=final) and accepted
+        return accepted
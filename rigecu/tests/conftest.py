@@ -0,0 +1,5 @@
+import os
+import sys
+
+# rigecu's modules import each other as top-level modules, like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,65 @@
+from batching import AdaptiveBatcher
+
+
+def make_batcher(**options):
+    # 100 Hz run whose fixed send_interval was 200 ms
+    return AdaptiveBatcher(10.0, min_samples=20, max_samples=500, max_latency_ms=1000.0, **options)
+
+
+def test_starts_at_the_send_interval_floor():
+    assert make_batcher().chunk_samples() == 20
+
+
+def test_grows_while_the_api_is_fast():
+    batcher = make_batcher()
+    for _ in range(20):
+        batcher.observe(batcher.chunk_samples(), 1000, 0.005, True, 0)
+    assert batcher.chunk_samples() > 20
+    # A sample never waits longer than the latency budget less the round trip
+    assert batcher.chunk_samples() <= (1000 - batcher.rtt_ms) / 10
+
+
+def test_never_shrinks_below_the_floor():
+    batcher = make_batcher()
+    for _ in range(50):
+        batcher.observe(20, 1000, 0.005, True, 0)
+    for _ in range(50):
+        batcher.observe(20, 1000, 2.0, False, 0)
+    assert batcher.target == 20
+    assert batcher.chunk_samples() == 20
+
+
+def test_shrinks_on_errors_and_growing_backlog():
+    batcher = make_batcher()
+    for _ in range(10):
+        batcher.observe(20, 1000, 0.005, True, 0)
+    grown = batcher.target
+    batcher.observe(20, 1000, 0.005, False, 0)
+    assert batcher.target < grown
+
+    grown = batcher.target
+    for backlog in (3, 4):
+        batcher.observe(20, 1000, 0.005, True, backlog)
+    assert batcher.target < grown
+
+
+def test_holds_when_the_round_trip_uses_most_of_the_budget():
+    batcher = make_batcher()
+    for _ in range(10):
+        batcher.observe(20, 1000, 0.7, True, 0)
+    assert batcher.target == 20
+
+
+def test_caps_chunks_by_encoded_size():
+    batcher = AdaptiveBatcher(10.0, min_samples=20, max_samples=500, max_bytes=10000)
+    for _ in range(30):
+        batcher.observe(20, 20 * 1000, 0.001, True, 0)
+    assert batcher.chunk_samples() == 10
+
+
+def test_too_large_requests_cap_the_encoded_size_below_the_floor():
+    batcher = make_batcher()
+    batcher.observe(20, 20 * 1000, 0.005, False, 0, too_large=True)
+
+    assert batcher.max_bytes == 10000
+    assert batcher.chunk_samples() == 10
@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+
+from fleet import COMPLETED, STOPPED, FleetScheduler
+from speed_profile import ProfileStep, SpeedProfile
+
+
+class RecordingSink:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def submit(self, test_id, block, final=False):
+        with self.lock:
+            self.calls.append((test_id, len(block), final))
+        return True
+
+    def finals(self):
+        with self.lock:
+            return [test_id for test_id, _, final in self.calls if final]
+
+
+def rig_params(duration_ms, speedup=None, summary_window_ms=0):
+    return {
+        "data_interval": 10,
+        "send_interval": 100,
+        "seed": 1,
+        "profile": SpeedProfile([ProfileStep(0.5, duration_ms)]).to_dict(),
+        "speedup": speedup,
+        "summary_window_ms": summary_window_ms,
+        "raw_decimation": 1
+    }
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_max_speedup_runs_a_long_profile_without_waiting():
+    sink = RecordingSink()
+    scheduler = FleetScheduler(sink, logging.getLogger("test"))
+    fleet = scheduler.start([(f"RIG-{index}", rig_params(600 * 1000, speedup="max")) for index in range(2)])
+
+    wait_for(lambda: fleet.status == COMPLETED)
+    assert fleet.samples == 2 * 60000
+    assert sorted(sink.finals()) == ["RIG-0", "RIG-1"]
+
+
+def test_stopping_a_fleet_closes_open_summary_windows():
+    raw, summaries = RecordingSink(), RecordingSink()
+    scheduler = FleetScheduler(raw, logging.getLogger("test"), summary_sink=summaries)
+    fleet = scheduler.start([("RIG-0", rig_params(60 * 1000, summary_window_ms=1000))])
+
+    wait_for(lambda: fleet.chunks >= 2)
+    scheduler.stop(fleet.fleet_id)
+
+    assert fleet.status == STOPPED
+    wait_for(lambda: summaries.finals() == ["RIG-0"])
+    # Only the summary window is closed; the raw sink gets no empty final block
+    assert raw.finals() == []
+    assert all(length for _, length, _ in raw.calls)
+
+
+def test_stopping_a_fleet_without_summaries_sends_nothing_more():
+    sink = RecordingSink()
+    scheduler = FleetScheduler(sink, logging.getLogger("test"))
+    fleet = scheduler.start([("RIG-0", rig_params(60 * 1000))])
+
+    wait_for(lambda: fleet.chunks >= 2)
+    scheduler.stop(fleet.fleet_id)
+    time.sleep(0.2)
+
+    assert fleet.status == STOPPED
+    assert sink.finals() == []
+    assert all(length for _, length, _ in sink.calls)
+
+
+def test_finished_fleets_are_pruned():
+    scheduler = FleetScheduler(RecordingSink(), logging.getLogger("test"), max_finished=2)
+    for _ in range(4):
+        fleet = scheduler.start([("RIG-0", rig_params(1000, speedup="max"))])
+        wait_for(lambda: fleet.status == COMPLETED)
+    latest = scheduler.start([("RIG-0", rig_params(1000, speedup="max"))])
+
+    fleets = scheduler.list()
+    assert len(fleets) == 3
+    assert fleets[-1] is latest
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from generator import BlockGenerator
+from schema import load_schema
+
+
+HIGH_CHANNEL_SCHEMA = load_schema(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                               "schemas", "high_channel_rig.json"))
+
+
+def generate_in_chunks(seed, schema, ticks, chunk_size, interval_ms=10):
+    generator = BlockGenerator(seed, schema)
+    speed = np.linspace(0.0, 1.0, len(ticks))
+    blocks = [
+        generator.generate((ticks[start:start + chunk_size] * interval_ms).astype(np.int64),
+                           speed[start:start + chunk_size], ticks=ticks[start:start + chunk_size])
+        for start in range(0, len(ticks), chunk_size)
+    ]
+    return np.hstack([block.values for block in blocks])
+
+
+@pytest.mark.parametrize("schema", [None, HIGH_CHANNEL_SCHEMA], ids=["default", "high-channel"])
+@pytest.mark.parametrize("chunk_size", [1, 5, 7, 50])
+def test_chunking_does_not_change_values(schema, chunk_size):
+    ticks = np.arange(200)
+    whole = generate_in_chunks(42, schema, ticks, len(ticks))
+    assert np.array_equal(whole, generate_in_chunks(42, schema, ticks, chunk_size))
+
+
+def test_missed_ticks_do_not_shift_later_samples():
+    ticks = np.arange(100)
+    kept = np.delete(ticks, [3, 4, 5, 40, 77])
+    block = BlockGenerator(7).generate((kept * 10).astype(np.int64), 0.5, ticks=kept)
+    reference = BlockGenerator(7).generate((ticks * 10).astype(np.int64), 0.5, ticks=ticks)
+    assert np.array_equal(block.values, reference.values[:, kept])
+
+
+def test_default_chunks_continue_the_run():
+    generator = BlockGenerator(3)
+    first = generator.generate(np.arange(0, 50, 10), 0.5)
+    second = generator.generate(np.arange(50, 100, 10), 0.5)
+    whole = BlockGenerator(3).generate(np.arange(0, 100, 10), 0.5)
+    assert np.array_equal(np.hstack([first.values, second.values]), whole.values)
+
+
+def test_seeds_differ():
+    ticks = np.arange(20)
+    assert not np.array_equal(generate_in_chunks(1, None, ticks, 20), generate_in_chunks(2, None, ticks, 20))
+
+
+def test_noise_stays_within_amplitude_and_normal_noise_is_centred():
+    block = BlockGenerator(5, HIGH_CHANNEL_SCHEMA).generate(np.arange(0, 20000, 10), 0.0)
+    noise = block.channel("ina260.voltage_v") - 14.9
+    assert np.all(np.abs(noise) <= 0.1)
+    accelerometer = block.channel("accelerometer.ch001")
+    assert abs(accelerometer.mean()) < 0.1
+    assert 0.7 < accelerometer.std() < 0.9
@@ -0,0 +1,29 @@
+import threading
+
+from metrics import Counter, Histogram, Registry
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counts_survive_their_threads_and_shards_are_released():
+    counter = Counter("test_events_total", "Events", registry=Registry())
+    counter.inc()
+    for _ in range(10):
+        run_threads(20, lambda: counter.inc(2))
+    assert counter._default.value() == 401
+    # Only the shard of the live test thread remains
+    assert len(counter._default._values._shards) == 1
+
+
+def test_histogram_totals_include_exited_threads():
+    histogram = Histogram("test_seconds", "Durations", buckets=(0.1, 1.0), registry=Registry())
+    run_threads(5, lambda: histogram.observe(0.5))
+    counts, total = histogram._default.snapshot()
+    assert counts == [0, 5, 0]
+    assert total == 2.5
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from replay import iter_json_rows
+
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample.data")
+
+
+def row(timestamp, voltage=14.85375):
+    return {
+        "timestamp": timestamp,
+        "ina260": {"voltage_v": voltage, "current_ma": 9408.75},
+        "load_cell": {"raw_value": -149635, "is_ready": True},
+        "set_speed": 0.5
+    }
+
+
+def write(tmp_path, text):
+    path = tmp_path / "capture.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("window", [1, 2, 7, 64, 1 << 20])
+def test_pretty_printed_capture_parses_at_any_window(window):
+    with open(SAMPLE_DATA, encoding="utf-8") as f:
+        expected = json.load(f)["data"]
+
+    assert list(iter_json_rows(SAMPLE_DATA, window=window)) == expected
+
+
+@pytest.mark.parametrize("window", [1, 3, 16, 1 << 20])
+def test_mixed_chunks_and_sample_lines(tmp_path, window):
+    rows = [row(timestamp) for timestamp in range(5)]
+    text = "\n".join([
+        json.dumps({"data": rows[:2]}),
+        json.dumps(rows[2]),
+        json.dumps({"data": rows[3:]}, indent=2),
+        json.dumps({"data": []})
+    ]) + "\n"
+
+    assert list(iter_json_rows(write(tmp_path, text), window=window)) == rows
+
+
+def test_number_cut_at_the_window_boundary_is_read_whole(tmp_path):
+    # Padded past the 64 characters looked ahead for the data array, so the
+    # first window ends inside 1234567, where "1234" alone would still decode
+    text = '{"data": [' + "0, " * 40 + "1234567, 89]}"
+    window = text.index("567")
+
+    assert list(iter_json_rows(write(tmp_path, text), window=window)) == [0] * 40 + [1234567, 89]
+
+
+def test_row_number_cut_at_the_window_boundary(tmp_path):
+    text = json.dumps(row(150460, voltage=14.853751234)) + "\n" + json.dumps(row(150465)) + "\n"
+    window = text.index("51234")
+
+    rows = list(iter_json_rows(write(tmp_path, text), window=window))
+
+    assert [r["ina260"]["voltage_v"] for r in rows] == [14.853751234, 14.85375]
+
+
+def test_multibyte_character_split_across_windows(tmp_path):
+    sample = dict(row(1), note="40 °C – ✓")
+    text = json.dumps({"data": [sample]}, ensure_ascii=False)
+    # Cut inside the three-byte encoding of the dash
+    window = text.encode("utf-8").index("–".encode("utf-8")) + 1
+
+    assert list(iter_json_rows(write(tmp_path, text), window=window)) == [sample]
+
+
+def test_empty_capture_yields_nothing(tmp_path):
+    assert list(iter_json_rows(write(tmp_path, ""))) == []
+
+
+def test_malformed_capture_raises_value_error(tmp_path):
+    with pytest.raises(ValueError, match="Malformed JSON"):
+        list(iter_json_rows(write(tmp_path, '{"data": [{"timestamp": 1,'), window=4))
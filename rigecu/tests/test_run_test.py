@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+os.environ.setdefault("Quix__Deployment__Network__PublicUrl", "http://localhost")
+
+import main  # noqa: E402
+from runs import Run  # noqa: E402
+from sinks import FanoutSink  # noqa: E402
+
+
+class RecordingSink:
+    def __init__(self):
+        self.blocks = []
+        self.closed = False
+
+    def submit(self, test_id, block, final=False):
+        self.blocks.append((block, final))
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def summary_starts(self):
+        return [start for block, _ in self.blocks if getattr(block, "event", None) == "summary"
+                for start in block.window_starts.tolist()]
+
+    def sample_count(self):
+        return sum(len(block) for block, _ in self.blocks if getattr(block, "event", None) != "summary")
+
+
+class FakeUploader(RecordingSink):
+    def __init__(self):
+        super().__init__()
+        self.tracked = {}
+
+    def track(self, key, batcher):
+        self.tracked[key] = batcher
+        return self
+
+    def untrack(self, key):
+        self.tracked.pop(key, None)
+
+
+def run_params(duration_ms, **extra):
+    return main.parse_run_params(dict({"ramp_delay": duration_ms, "sample_rate_hz": 100, "speedup": "max",
+                                       "summary_window_ms": 100}, **extra))
+
+
+@pytest.mark.parametrize("duration_ms", [400, 450], ids=["on-chunk-boundary", "mid-chunk"])
+def test_streamed_run_ends_with_a_final_block_and_its_last_window(duration_ms):
+    sink = RecordingSink()
+    run = Run("T-1", run_params(duration_ms, send_interval=100), sink=sink)
+
+    main.run_test(run)
+
+    assert sink.sample_count() == duration_ms // 10
+    assert sink.summary_starts() == list(range(0, duration_ms, 100))
+    finals = [final for _, final in sink.blocks]
+    assert finals.count(True) == 2 and finals[-1]
+    assert sink.closed
+
+
+def test_adaptive_run_ending_on_a_chunk_boundary_sends_its_last_window(monkeypatch):
+    raw, summaries = FakeUploader(), RecordingSink()
+    monkeypatch.setattr(main, "uploader", raw)
+    monkeypatch.setattr(main, "default_sink", FanoutSink({"http": raw}))
+    monkeypatch.setattr(main, "summary_sink", summaries)
+    params = run_params(3000, summary_window_ms=1000)
+    params["adaptive_batching"] = True
+
+    main.run_test(Run("T-1", params))
+
+    assert summaries.summary_starts() == [0, 1000, 2000]
+    assert summaries.blocks[-1][1] and raw.blocks[-1][1]
+    assert raw.sample_count() == 300
+    assert main.uploader.tracked == {}
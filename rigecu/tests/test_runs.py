@@ -0,0 +1,40 @@
+import logging
+import threading
+
+import pytest
+
+from runs import CANCELLED, COMPLETED, RunScheduler, SchedulerFull
+
+
+def test_shutdown_lets_running_runs_finish_and_cancels_queued_ones():
+    release = threading.Event()
+    started = threading.Event()
+
+    def target(run):
+        started.set()
+        release.wait(5)
+
+    scheduler = RunScheduler(target, logging.getLogger("test"), max_workers=1)
+    running = scheduler.submit("RUNNING", {})
+    queued = scheduler.submit("QUEUED", {})
+    started.wait(5)
+    threading.Timer(0.1, release.set).start()
+
+    scheduler.shutdown(timeout=5)
+
+    assert running.status == COMPLETED and not running.cancelled
+    assert queued.status == CANCELLED
+    with pytest.raises(SchedulerFull):
+        scheduler.submit("LATE", {})
+
+
+def test_shutdown_cancels_runs_still_going_after_the_timeout():
+    def target(run):
+        run.cancel_event.wait(5)
+
+    scheduler = RunScheduler(target, logging.getLogger("test"), max_workers=1)
+    run = scheduler.submit("SLOW", {})
+
+    scheduler.shutdown(timeout=0.1)
+
+    assert run.status == CANCELLED
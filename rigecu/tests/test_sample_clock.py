@@ -0,0 +1,52 @@
+from sample_clock import SampleClock, VirtualTimer
+
+
+class SteppedTimer:
+    """Virtual time that the test moves forward by hand."""
+
+    skip_missed = True
+
+    def __init__(self):
+        self.time = 0.0
+        self.waited = 0.0
+
+    def now(self):
+        return self.time
+
+    def wait(self, seconds, cancel_event=None):
+        self.time += seconds
+        self.waited += seconds
+        return False
+
+
+def drain(clock):
+    ticks = []
+    while (tick := clock.wait_next()) is not None:
+        ticks.append(tick)
+    return ticks
+
+
+def test_run_ends_without_an_extra_tick_or_wait():
+    timer = VirtualTimer()
+    clock = SampleClock(50, timer, tick_limit=20)
+    assert drain(clock) == list(range(20))
+    assert clock.ticks == 20
+    # The last tick is due 19 intervals after the first; nothing waits past it
+    assert timer.now() == 19 * 0.05
+
+
+def test_missed_ticks_are_skipped_and_never_past_the_limit():
+    timer = SteppedTimer()
+    clock = SampleClock(10, timer, tick_limit=10)
+    assert clock.wait_next() == 0
+    timer.time += 0.035  # Tick 1 is 25 ms late: ticks 1 and 2 are missed
+    assert clock.wait_next() == 3
+    timer.time += 1.0
+    assert clock.wait_next() is None
+    assert clock.ticks == 2
+    assert clock.ticks + clock.missed_ticks == 10
+
+
+def test_without_a_limit_the_clock_keeps_ticking():
+    clock = SampleClock(1, VirtualTimer())
+    assert [clock.wait_next() for _ in range(5)] == [0, 1, 2, 3, 4]
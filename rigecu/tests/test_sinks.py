@@ -0,0 +1,107 @@
+import base64
+import json
+import logging
+
+import numpy as np
+import pytest
+
+from encoding import ChunkEncoder, decode_chunk
+from generator import BlockGenerator
+from sinks import FanoutSink, FileProducer, KafkaSink
+
+
+def make_block(start, count, interval_ms=10):
+    ticks = np.arange(start, start + count)
+    return BlockGenerator(5).generate((ticks * interval_ms).astype(np.int64), np.full(count, 0.5), ticks=ticks)
+
+
+def read_messages(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def decode_message(message):
+    headers = message["headers"]
+    return decode_chunk(base64.b64decode(message["value"]), headers["content-type"], headers.get("content-encoding"))
+
+
+@pytest.mark.parametrize("encoding", ["rows", "columnar", "columnar-msgpack+zstd"])
+def test_file_producer_records_what_the_sink_produces(tmp_path, encoding):
+    path = tmp_path / "topic.ndjson"
+    sink = KafkaSink(f"file://{path}", "ecu-data", logging.getLogger("test"), encoder=ChunkEncoder(encoding))
+    blocks = [make_block(0, 20), make_block(20, 5)]
+
+    for block in blocks:
+        assert sink.submit("T-1", block)
+    sink.close()
+
+    messages = read_messages(path)
+    assert [(message["topic"], message["key"]) for message in messages] == [("ecu-data", "T-1")] * 2
+    assert [decode_message(message) for message in messages] == [block.to_rows() for block in blocks]
+    assert sink.stats() == {"enqueued": 2, "sent": 2, "failed": 0, "dropped": 0, "topic": "ecu-data"}
+
+
+class FullQueueProducer(FileProducer):
+    """Raises BufferError for the first `full` produce calls, like a producer whose local queue is full."""
+
+    def __init__(self, path, full):
+        super().__init__(path)
+        self.full = full
+        self.polls = 0
+
+    def produce(self, *args, **kwargs):
+        if self.full:
+            self.full -= 1
+            raise BufferError("Local: Queue full")
+        super().produce(*args, **kwargs)
+
+    def poll(self, timeout=0):
+        self.polls += 1
+        return super().poll(timeout)
+
+
+def test_full_producer_queue_is_polled_then_retried_once(tmp_path):
+    path = tmp_path / "topic.ndjson"
+    sink = KafkaSink(f"file://{path}", "ecu-data", logging.getLogger("test"))
+    sink._producer = FullQueueProducer(str(path), full=1)
+
+    assert sink.submit("T-1", make_block(0, 10))
+    assert len(read_messages(path)) == 1
+    assert sink._producer.polls == 2  # once to make room, once after producing
+
+    sink._producer.full = 2
+    assert not sink.submit("T-1", make_block(10, 10))
+    assert len(read_messages(path)) == 1
+    assert sink.stats()["dropped"] == 1
+
+
+class RecordingSink:
+    def __init__(self, accept):
+        self.accept = accept
+        self.calls = []
+        self.closed = False
+
+    def submit(self, test_id, block, final=False):
+        self.calls.append((test_id, len(block), final))
+        return self.accept
+
+    def stats(self):
+        return {"calls": len(self.calls)}
+
+    def close(self):
+        self.closed = True
+
+
+def test_fanout_sends_every_block_to_every_sink(tmp_path):
+    path = tmp_path / "topic.ndjson"
+    rejecting = RecordingSink(accept=False)
+    fanout = FanoutSink({"http": rejecting, "kafka": KafkaSink(f"file://{path}", "ecu-data", logging.getLogger("test"))})
+
+    # Accepted as long as one sink takes the block
+    assert fanout.submit("T-1", make_block(0, 10), final=True)
+    fanout.close()
+
+    assert rejecting.calls == [("T-1", 10, True)] and rejecting.closed
+    assert len(read_messages(path)) == 1
+    assert fanout.stats()["http"] == {"calls": 1}
+    assert fanout.stats()["kafka"]["sent"] == 1
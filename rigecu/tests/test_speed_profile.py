@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+import pytest
+
+from speed_profile import ProfileStep, SetpointTable, SpeedProfile
+
+
+def reference_lag(setpoint, start_speed, interval_ms, time_constant):
+    """The per-tick recurrence the closed form replaces."""
+    alpha = 1 - math.exp(-interval_ms / time_constant)
+    response = []
+    value = start_speed
+    for target in setpoint:
+        value += alpha * (target - value)
+        response.append(value)
+    return np.array(response)
+
+
+def profile(time_constant):
+    steps = [
+        ProfileStep(0.8, hold=3000, ramp=2000),
+        ProfileStep(0.2, hold=4000, ramp=1500, shape="exponential"),
+        ProfileStep(0.6, hold=2500)
+    ]
+    return SpeedProfile(steps, time_constant=time_constant, start_speed=0.1)
+
+
+@pytest.mark.parametrize("interval_ms,time_constant", [(1, 250.0), (1, 0.05), (5, 2.0), (1, 1e6)])
+def test_lazy_table_matches_the_per_tick_recurrence(interval_ms, time_constant):
+    speed_profile = profile(time_constant)
+    table = speed_profile.compile(interval_ms)
+    ticks = np.arange(len(table))
+    setpoint, response = table.lookup(ticks)
+
+    assert len(table) == math.ceil(speed_profile.duration_ms / interval_ms)
+    assert np.allclose(setpoint, speed_profile.setpoint(0, len(table), interval_ms))
+    assert np.allclose(response, reference_lag(setpoint, 0.1, interval_ms, time_constant), rtol=1e-9, atol=1e-12)
+
+
+def test_out_of_order_lookups_match_and_stay_bounded():
+    table = profile(300.0).compile(1)
+    expected = table.lookup(np.arange(len(table)))
+    table = profile(300.0).compile(1)
+
+    # Jump straight to the end, then back to the start and across a block boundary
+    ticks = np.array([len(table) + 5, 3, SetpointTable.BLOCK_TICKS - 1, SetpointTable.BLOCK_TICKS, 7000])
+    clamped = np.minimum(ticks, len(table) - 1)
+    setpoint, response = table.lookup(ticks)
+
+    assert np.allclose(setpoint, expected[0][clamped])
+    assert np.allclose(response, expected[1][clamped])
+    assert len(table._blocks) <= SetpointTable.CACHED_BLOCKS
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from generator import BlockGenerator
+from summaries import SummarizingSink, WindowSummarizer
+
+
+WINDOW_MS = 100
+
+
+def make_block(ticks, interval_ms=10, seed=3):
+    ticks = np.asarray(ticks)
+    speed = np.linspace(0.2, 0.9, len(ticks))
+    return BlockGenerator(seed).generate((ticks * interval_ms).astype(np.int64), speed, ticks=ticks)
+
+
+def reference(block):
+    """Per-window statistics computed directly over the whole run."""
+    values = block.schema.summary_values(block.values)
+    windows = block.timestamps // WINDOW_MS
+    expected = {}
+    for window in np.unique(windows):
+        selected = values[:, windows == window]
+        expected[int(window) * WINDOW_MS] = (selected.shape[1], selected.min(axis=1), selected.max(axis=1),
+                                             selected.mean(axis=1), np.sqrt((selected ** 2).mean(axis=1)))
+    return expected
+
+
+def summarize(block, boundaries):
+    summarizer = WindowSummarizer(WINDOW_MS)
+    summaries = []
+    edges = [0] + list(boundaries) + [len(block)]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        summary = summarizer.add(block.take(np.arange(start, stop)), final=stop == len(block))
+        if summary is not None:
+            summaries.append(summary)
+    return summaries
+
+
+def flatten(summaries, names):
+    result = {}
+    for summary in summaries:
+        for index, window_start in enumerate(summary.window_starts.tolist()):
+            assert window_start not in result, "window emitted twice"
+            result[window_start] = (
+                int(summary.counts[index]),
+                *(np.array([summary.stats[name][stat][index] for name in names]) for stat in ("min", "max", "mean", "rms"))
+            )
+    return result
+
+
+def assert_matches(summaries, block):
+    expected = reference(block)
+    actual = flatten(summaries, block.schema.summary_names)
+    assert sorted(actual) == sorted(expected)
+    for window_start, (count, *stats) in expected.items():
+        assert actual[window_start][0] == count
+        for got, want in zip(actual[window_start][1:], stats):
+            assert np.allclose(got, want)
+
+
+@pytest.mark.parametrize("boundaries", [
+    [],
+    [3, 7],  # one window carried across three blocks
+    [10, 20, 30],  # blocks aligned with windows
+    [1, 2, 3, 4, 5],  # single-sample blocks
+    [15, 37, 38, 61]  # blocks spanning several windows, starting and ending mid-window
+], ids=["whole", "carried", "aligned", "single-samples", "spanning"])
+def test_splitting_into_blocks_gives_the_same_windows(boundaries):
+    block = make_block(np.arange(80))
+
+    assert_matches(summarize(block, boundaries), block)
+
+
+def test_a_window_is_only_emitted_once_a_later_sample_arrives():
+    summarizer = WindowSummarizer(WINDOW_MS)
+    block = make_block(np.arange(25))
+
+    assert summarizer.add(block.take(np.arange(0, 5))) is None
+    carried = summarizer.add(block.take(np.arange(5, 12)))
+    assert carried.window_starts.tolist() == [0] and carried.counts.tolist() == [10]
+    assert summarizer.add(block.take(np.arange(12, 18))) is None
+
+    closed = summarizer.add(block.take(np.arange(0, 0)), final=True)
+    assert closed.window_starts.tolist() == [100] and closed.counts.tolist() == [8]
+    assert summarizer.add(block.take(np.arange(0, 0)), final=True) is None
+
+
+def test_missed_ticks_leave_gaps_between_windows():
+    ticks = np.concatenate([np.arange(0, 14), np.arange(42, 55)])
+    block = make_block(ticks)
+
+    summaries = summarize(block, [8, 14, 20])
+
+    assert_matches(summaries, block)
+    assert sorted(flatten(summaries, block.schema.summary_names)) == [0, 100, 400, 500]
+
+
+class RecordingSink:
+    def __init__(self):
+        self.blocks = []
+
+    def submit(self, test_id, block, final=False):
+        self.blocks.append((block, final))
+        return True
+
+
+def test_sink_decimates_evenly_across_chunks():
+    raw, summaries = RecordingSink(), RecordingSink()
+    sink = SummarizingSink(raw, summaries, WINDOW_MS, decimation=4)
+    block = make_block(np.arange(30))
+
+    for start, stop in [(0, 3), (3, 10), (10, 11), (11, 30)]:
+        sink.submit("T", block.take(np.arange(start, stop)), final=stop == 30)
+
+    timestamps = np.concatenate([chunk.timestamps for chunk, _ in raw.blocks])
+    assert timestamps.tolist() == list(range(0, 300, 40))
+    assert raw.blocks[-1][1] and summaries.blocks[-1][1]
+    assert sum(len(chunk) for chunk, _ in summaries.blocks) == 3
+
+
+def test_empty_final_block_only_closes_the_summary_window():
+    raw, summaries = RecordingSink(), RecordingSink()
+    sink = SummarizingSink(raw, summaries, WINDOW_MS)
+    block = make_block(np.arange(15))
+
+    sink.submit("T", block)
+    sink.submit("T", block.take(np.arange(0, 0)), final=True)
+
+    assert [(len(chunk), final) for chunk, final in raw.blocks] == [(15, False)]
+    assert summaries.blocks[-1][0].window_starts.tolist() == [100] and summaries.blocks[-1][1]
@@ -0,0 +1,68 @@
+import logging
+import time
+
+import numpy as np
+
+from batching import AdaptiveBatcher
+from generator import BlockGenerator
+from uploader import ChunkUploader
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.ok = status_code < 400
+
+
+class FakeSession:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.posts = 0
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.posts += 1
+        return FakeResponse(self.status_code)
+
+    def close(self):
+        pass
+
+
+def make_block(count):
+    ticks = np.arange(count)
+    return BlockGenerator(5).generate((ticks * 10).astype(np.int64), np.full(count, 0.5), ticks=ticks)
+
+
+def upload(status_code, *runs):
+    uploader = ChunkUploader("http://data.invalid/api", logging.getLogger("test"), max_retries=0, workers=1)
+    uploader._session = FakeSession(status_code)
+    for run_id, batcher, count in runs:
+        uploader.track(run_id, batcher).submit("T-1", make_block(count))
+    deadline = time.monotonic() + 5
+    while uploader._session.posts < len(runs):
+        assert time.monotonic() < deadline, "chunks were not posted"
+        time.sleep(0.01)
+    uploader.close()
+    return uploader
+
+
+def make_batcher(**options):
+    return AdaptiveBatcher(10.0, min_samples=20, max_samples=500, **options)
+
+
+def test_rejected_chunks_shrink_their_batch():
+    batcher = make_batcher(max_bytes=10 ** 9)
+    batcher.target = 100
+
+    upload(413, ("run-1", batcher, 100))
+
+    assert batcher.target == 50
+    assert batcher.max_bytes < 10 ** 9
+
+
+def test_batchers_are_kept_per_run_not_per_test_id():
+    first, second = make_batcher(), make_batcher()
+
+    uploader = upload(202, ("run-1", first, 100), ("run-2", second, 30))
+
+    assert first.bytes_per_sample is not None and second.bytes_per_sample is not None
+    assert sorted(uploader.stats()["batching"]) == ["run-1", "run-2"]
@@ -0,0 +1,322 @@
+import base64
+import json
+import os
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from encoding import ChunkEncoder
+from metrics import Counter, Histogram
+
+
+BACKPRESSURE_POLICIES = ("drop", "block", "spill")
+
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+upload_seconds = Histogram("rigecu_upload_seconds", "Latency of chunk POSTs to the data API")
+upload_bytes = Histogram("rigecu_upload_bytes", "Encoded size of posted chunks",
+                         buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+upload_responses = Counter("rigecu_upload_responses_total", "Chunk POSTs by HTTP status (or error)", ("status",))
+
+
+def build_api_url(endpoint, test_id):
+    """Build the API URL by appending test_id to the endpoint, handling trailing slashes."""
+    if not endpoint:
+        return None
+
+    # Remove trailing slash from endpoint if present
+    endpoint = endpoint.rstrip('/')
+    return f"{endpoint}/{test_id}"
+
+
+class Chunk:
+    """A unit of upload work: either a block still to be encoded or an already encoded body."""
+
+    def __init__(self, test_id, block=None, final=False, body=None, headers=None, batcher=None):
+        self.test_id = test_id
+        self.block = block
+        self.final = final
+        self.body = body
+        self.headers = headers
+        self.batcher = batcher
+
+    def __len__(self):
+        return len(self.block) if self.block is not None else 0
+
+
+class TrackedUploads:
+    """The uploader as one run's sink: its chunks report their upload attempts to the run's batcher."""
+
+    def __init__(self, uploader, batcher):
+        self._uploader = uploader
+        self._batcher = batcher
+
+    def submit(self, test_id, block, final=False):
+        return self._uploader.submit(test_id, block, final=final, batcher=self._batcher)
+
+    def stats(self):
+        return self._uploader.stats()
+
+    def close(self):
+        # The shared uploader outlives the run
+        pass
+
+
+class ChunkUploader:
+    """Upload chunks to the data API from background workers.
+
+    The sampler only enqueues chunks; encoding and HTTP happen on worker
+    threads that share one pooled keep-alive session. When the queue is
+    full, `backpressure` decides what happens to new chunks:
+
+    - drop: discard the chunk immediately
+    - block: wait up to `block_timeout` seconds for room, then drop
+    - spill: append the encoded chunk to a file in `spill_dir`, to be
+      re-sent once the queue has drained
+
+    Every attempt of a chunk queued through the sink returned by `track`
+    is reported to that run's batcher, so each run sizes its chunks to what
+    the endpoint currently sustains at its own sample rate.
+    """
+
+    name = "http"
+
+    def __init__(self, endpoint, logger, encoder=None, max_queue=1000, backpressure="block",
+                 block_timeout=5.0, spill_dir=None, max_retries=3, backoff=0.5, timeout=10.0, workers=2):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"backpressure must be one of {', '.join(BACKPRESSURE_POLICIES)}")
+        if backpressure == "spill" and not spill_dir:
+            raise ValueError("spill_dir is required for the spill backpressure policy")
+
+        self.endpoint = endpoint
+        self._logger = logger
+        self._encoder = encoder or ChunkEncoder()
+        self._negotiate_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._backpressure = backpressure
+        self._block_timeout = block_timeout
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._timeout = timeout
+        self._batchers = {}  # run_id -> AdaptiveBatcher of the run
+        self._stop_event = threading.Event()
+
+        self._spill_lock = threading.Lock()
+        self._spill_path = None
+        self._has_spill = False
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._spill_path = os.path.join(spill_dir, "rigecu-spill.ndjson")
+            # Resend anything spilled before a restart
+            self._has_spill = os.path.exists(self._spill_path)
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._counters_lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "unspilled": 0
+        }
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"chunk-uploader-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, test_id, block, final=False, batcher=None):
+        """Queue a block for upload. Returns False if it was dropped."""
+        chunk = Chunk(test_id, block=block, final=final, batcher=batcher)
+        try:
+            if self._backpressure == "block":
+                self._queue.put(chunk, timeout=self._block_timeout)
+            else:
+                self._queue.put_nowait(chunk)
+        except queue.Full:
+            if self._backpressure == "spill":
+                self._spill(chunk)
+                return True
+            self._count("dropped")
+            self._logger.warning("Upload queue full, dropped chunk: %s :: %d items", test_id, len(chunk))
+            return False
+        self._count("enqueued")
+        return True
+
+    def stats(self):
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats["queued"] = self._queue.qsize()
+        stats["backpressure"] = self._backpressure
+        batchers = dict(self._batchers)
+        if batchers:
+            stats["batching"] = {run_id: batcher.stats() for run_id, batcher in batchers.items()}
+        return stats
+
+    def track(self, run_id, batcher):
+        """Return a sink for run `run_id` whose chunks report their upload attempts to `batcher`.
+
+        Runs sharing a test_id keep their own batchers; `untrack` drops the run from the stats.
+        """
+        self._batchers[run_id] = batcher
+        return TrackedUploads(self, batcher)
+
+    def untrack(self, run_id):
+        self._batchers.pop(run_id, None)
+
+    def batch_targets(self):
+        return [batcher.target for batcher in list(self._batchers.values())]
+
+    def close(self, timeout=10.0):
+        """Stop the workers after the queued chunks have been attempted."""
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._session.close()
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def _work(self):
+        while True:
+            try:
+                chunk = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                self._unspill()
+                continue
+            try:
+                self._upload(chunk)
+            except Exception as e:
+                self._count("failed")
+                self._logger.error(f"Failed to upload chunk: {chunk.test_id} :: {str(e)}")
+            finally:
+                self._queue.task_done()
+            if self._has_spill:
+                self._unspill()
+
+    def _encode(self, chunk):
+        if chunk.body is None:
+            chunk.body, chunk.headers = self._encoder(chunk.block)
+        return chunk.body, chunk.headers
+
+    def _negotiate(self, api_url):
+        if self._encoder.negotiated:
+            return
+        with self._negotiate_lock:
+            if not self._encoder.negotiated:
+                encoding = self._encoder.negotiate(self._session, api_url, timeout=self._timeout)
+                self._logger.info(f"Using {encoding} chunk encoding for {self.endpoint}")
+
+    def _upload(self, chunk):
+        items = len(chunk)
+        label = "final chunk" if chunk.final else "chunk"
+        if not self.endpoint:
+            self._count("sent")
+            self._logger.debug("Sent %s: %s :: %d items, Response: Not sent (no endpoint configured)", label, chunk.test_id, items)
+            return
+
+        api_url = build_api_url(self.endpoint, chunk.test_id)
+        self._negotiate(api_url)
+        body, headers = self._encode(chunk)
+        for attempt in range(self._max_retries + 1):
+            if attempt:
+                self._count("retried")
+                # Exponential backoff, cut short if the uploader is shutting down
+                if self._stop_event.wait(self._backoff * 2 ** (attempt - 1)):
+                    break
+            started = time.perf_counter()
+            try:
+                response = self._session.post(api_url, data=body, headers=headers, timeout=self._timeout)
+            except requests.exceptions.RequestException as e:
+                self._observe(chunk, body, started, False)
+                upload_responses.labels("error").inc()
+                self._logger.warning("Upload attempt %d for %s failed: %s", attempt + 1, chunk.test_id, e)
+                continue
+            # Any non-2xx answer counts against the batch size; 413 also caps its encoded size
+            self._observe(chunk, body, started, 200 <= response.status_code < 300, too_large=response.status_code == 413)
+            upload_seconds.observe(time.perf_counter() - started)
+            upload_bytes.observe(len(body))
+            upload_responses.labels(response.status_code).inc()
+            if response.status_code == 415 and chunk.block is not None and self._encoder.fallback():
+                # The endpoint rejected the negotiated encoding; resend as row JSON
+                self._logger.warning(f"{self.endpoint} rejected {headers.get('Content-Type')}, falling back to row JSON")
+                chunk.body = None
+                body, headers = self._encode(chunk)
+                continue
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                self._logger.warning("Upload attempt %d for %s returned %d", attempt + 1, chunk.test_id, response.status_code)
+                continue
+            if response.ok:
+                self._count("sent")
+            else:
+                self._count("failed")
+            self._logger.debug("Sent %s with %d %s, Response: %d", label, items or len(body), "items" if items else "bytes",
+                               response.status_code)
+            return
+
+        self._count("failed")
+        self._logger.error(f"Giving up on {label} for {chunk.test_id} after {self._max_retries + 1} attempts")
+
+    def _observe(self, chunk, body, started, ok, too_large=False):
+        if chunk.batcher is not None:
+            chunk.batcher.observe(len(chunk), len(body), time.perf_counter() - started, ok, self._queue.qsize(),
+                                  too_large=too_large)
+
+    def _spill(self, chunk):
+        body, headers = self._encode(chunk)
+        chunk.block = None
+        record = {
+            "test_id": chunk.test_id,
+            "final": chunk.final,
+            "headers": headers,
+            "body": base64.b64encode(body).decode("ascii")
+        }
+        with self._spill_lock:
+            with open(self._spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self._has_spill = True
+        self._count("spilled")
+
+    def _unspill(self):
+        """Move spilled chunks back into the queue while it has room."""
+        if not self._has_spill or self._queue.qsize() > self._queue.maxsize // 2:
+            return
+        with self._spill_lock:
+            if not os.path.exists(self._spill_path):
+                self._has_spill = False
+                return
+            with open(self._spill_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            room = max(0, self._queue.maxsize - self._queue.qsize())
+            take, keep = lines[:room], lines[room:]
+            if keep:
+                with open(self._spill_path, "w", encoding="utf-8") as f:
+                    f.writelines(keep)
+            else:
+                os.remove(self._spill_path)
+                self._has_spill = False
+
+        for line in take:
+            record = json.loads(line)
+            chunk = Chunk(record["test_id"], final=record["final"], headers=record["headers"],
+                          body=base64.b64decode(record["body"]))
+            try:
+                self._queue.put_nowait(chunk)
+            except queue.Full:
+                self._spill(chunk)
+                continue
+            self._count("unspilled")